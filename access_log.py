@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Asynchronous log writers - requests enqueue, a background thread does the disk I/O
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """Write text to a file from a background thread through a bounded queue.
+
+    Callers never block: when the queue is full the entry is dropped and
+    counted. Queued entries are written in batches with one flush per batch,
+    and the file is rotated once it grows past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=3,
+                 queue_size=10000, batch_size=256, mode='a', on_drop=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.mode = mode
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='async-log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return self
+
+    def write(self, item):
+        """Queue an entry without blocking; returns False if it was dropped"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self._count_dropped(1)
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5.0):
+        """Flush queued entries and stop the writer thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def format(self, item):
+        return item
+
+    def _count_dropped(self, count):
+        with self._drop_lock:
+            self.dropped += count
+        if self.on_drop:
+            self.on_drop(count)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            text = ''.join(self.format(item) for item in batch if item is not _STOP)
+            if text:
+                try:
+                    self._write_text(text)
+                except OSError:
+                    # Disk trouble must never reach request threads
+                    self._count_dropped(len(batch))
+            if stop:
+                self._close_file()
+                return
+
+    def _write_text(self, text):
+        if self._file is None:
+            self._open_file()
+        elif self.max_bytes and self._size + len(text.encode('utf-8')) > self.max_bytes:
+            self._rotate()
+        self._file.write(text)
+        self._file.flush()
+        self._size = self._file.tell()  # Bytes on disk: non-ASCII text and Windows newlines take more than len()
+
+    def _open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, self.mode, encoding='utf-8')
+        self._size = self._file.tell()
+        self.mode = 'a'  # Only truncate on the very first open
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self):
+        self._close_file()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f'{self.path}.{index}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.path}.{index + 1}')
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open_file()
+
+
+class AccessLog(AsyncLogWriter):
+    """Structured JSON-lines access and event log"""
+
+    def access(self, **fields):
+        return self.write(dict({'ts': time.time(), 'type': 'access'}, **fields))
+
+    def event(self, name, **fields):
+        return self.write(dict({'ts': time.time(), 'type': 'event', 'event': name}, **fields))
+
+    def format(self, item):
+        ts = item['ts']
+        item['ts'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ts)) + f'.{int(ts % 1 * 1000):03d}'
+        return json.dumps(item, default=str, ensure_ascii=False) + '\n'
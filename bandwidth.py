@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Bandwidth shaping for downloads and media streams - token buckets with weighted fair queueing
+and concurrent stream limits
+"""
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+_sequence = itertools.count()
+
+
+class _FairBucket:
+    """Token bucket whose waiters are served in weighted fair order.
+
+    Each request gets a virtual finish tag of start + bytes / weight, and only
+    the waiter with the smallest tag may take tokens. Streams with a higher
+    weight therefore get a proportionally larger share while the bucket is
+    contended, and any spare capacity still goes to whoever is waiting.
+    """
+
+    def __init__(self, cond, rate):
+        self.cond = cond  # Shared with the scheduler; held by every caller
+        self.rate = 0
+        self.burst = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.vtime = 0.0
+        self.waiting = []  # heap of [tag, sequence]
+        self.users = 0  # Streams holding this bucket
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        self.refill(time.monotonic())
+        self.rate = max(0, int(rate or 0))
+        self.burst = max(self.rate // 4, 64 * 1024)  # A quarter second, never less than one large chunk
+        self.tokens = min(self.tokens, self.burst) if self.rate else self.burst
+
+    def refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, stream, nbytes):
+        if not self.rate:
+            return
+        tag = max(self.vtime, stream.tags.get(id(self), 0.0)) + nbytes / stream.weight
+        stream.tags[id(self)] = tag
+        entry = [tag, next(_sequence)]
+        heapq.heappush(self.waiting, entry)
+        try:
+            while self.rate:
+                if self.waiting[0] is entry:
+                    now = time.monotonic()
+                    self.refill(now)
+                    # Chunks larger than the burst go once the bucket is full, leaving it in debt
+                    needed = min(nbytes, self.burst)
+                    if self.tokens >= needed:
+                        self.tokens -= nbytes
+                        self.vtime = tag
+                        return
+                    self.cond.wait((needed - self.tokens) / self.rate)
+                else:
+                    self.cond.wait()
+        finally:
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            self.cond.notify_all()
+
+
+class Stream:
+    """One download or media stream registered with the scheduler"""
+
+    def __init__(self, user, ip, kind, weight, label=''):
+        self.user = user
+        self.ip = ip
+        self.kind = kind
+        self.weight = weight
+        self.label = label
+        self.started = time.time()
+        self.bytes_sent = 0
+        self.throttled = 0.0  # Seconds spent waiting for tokens
+        self.tags = {}  # id(bucket) -> last virtual finish tag
+        self.buckets = ()
+
+
+class BandwidthScheduler:
+    """Global, per-user and per-IP byte rate caps shared fairly between streams.
+
+    Rates are bytes per second, and 0 means unlimited. With every cap at 0,
+    acquire() only counts bytes. Callers register a stream with open(), call
+    acquire() before writing each chunk and close() when done.
+    """
+
+    def __init__(self, global_rate=0, user_rate=0, ip_rate=0, weights=None):
+        self.weights = dict(weights or {'media': 4, 'bulk': 1})
+        self.global_rate = global_rate
+        self.user_rate = user_rate
+        self.ip_rate = ip_rate
+        self._cond = threading.Condition()
+        self._global = _FairBucket(self._cond, global_rate)
+        self._user_buckets = {}
+        self._ip_buckets = {}
+        self._streams = set()
+
+    @property
+    def limited(self):
+        return bool(self.global_rate or self.user_rate or self.ip_rate)
+
+    def configure(self, global_rate=None, user_rate=None, ip_rate=None, weights=None):
+        """Change caps live; waiting streams pick up the new rates immediately"""
+        with self._cond:
+            if weights is not None:
+                self.weights.update(weights)
+                for stream in self._streams:
+                    stream.weight = self.weights.get(stream.kind, 1)
+            if global_rate is not None:
+                self.global_rate = global_rate
+                self._global.set_rate(global_rate)
+            if user_rate is not None:
+                self.user_rate = user_rate
+                for bucket in self._user_buckets.values():
+                    bucket.set_rate(user_rate)
+            if ip_rate is not None:
+                self.ip_rate = ip_rate
+                for bucket in self._ip_buckets.values():
+                    bucket.set_rate(ip_rate)
+            self._cond.notify_all()
+
+    def open(self, user, ip, kind, label=''):
+        stream = Stream(user, ip, kind, self.weights.get(kind, 1), label)
+        with self._cond:
+            buckets = [self._attach(self._ip_buckets, ip, self.ip_rate)]
+            if user:
+                buckets.append(self._attach(self._user_buckets, user, self.user_rate))
+            buckets.append(self._global)
+            stream.buckets = tuple(buckets)
+            self._streams.add(stream)
+        return stream
+
+    def close(self, stream):
+        with self._cond:
+            self._streams.discard(stream)
+            self._detach(self._ip_buckets, stream.ip)
+            if stream.user:
+                self._detach(self._user_buckets, stream.user)
+
+    def acquire(self, stream, nbytes):
+        """Block until nbytes may be sent on this stream"""
+        stream.bytes_sent += nbytes
+        if not self.limited:
+            return
+        started = time.monotonic()
+        with self._cond:
+            # Narrowest cap first so a capped user never holds the global queue
+            for bucket in stream.buckets:
+                bucket.take(stream, nbytes)
+        stream.throttled += time.monotonic() - started
+
+    def active_streams(self):
+        with self._cond:
+            return list(self._streams)
+
+    def _attach(self, buckets, key, rate):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _FairBucket(self._cond, rate)
+        bucket.users += 1
+        return bucket
+
+    def _detach(self, buckets, key):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.users -= 1
+            if bucket.users <= 0:
+                del buckets[key]
+
+
+class StreamLimits:
+    """Count concurrent streams per session, per IP, per file and in total.
+
+    A cap of 0 disables that check. The per-file count is kept per client
+    IP, since it exists to stop download managers from opening many
+    connections to one file.
+    """
+
+    def __init__(self, per_session=0, per_ip=0, per_file=0, total=0):
+        self.per_session = per_session
+        self.per_ip = per_ip
+        self.per_file = per_file
+        self.total = total
+        self._lock = threading.Lock()
+        self.sessions = collections.Counter()
+        self.ips = collections.Counter()
+        self.files = collections.Counter()  # (ip, path) -> streams
+        self.active = 0
+
+    def try_acquire(self, session, ip, path):
+        """Return (slot, None) on success or (None, reason) naming the cap that was hit"""
+        file_key = (ip, path)
+        with self._lock:
+            if self.total and self.active >= self.total:
+                return None, 'total'
+            if self.per_session and session and self.sessions[session] >= self.per_session:
+                return None, 'session'
+            if self.per_ip and self.ips[ip] >= self.per_ip:
+                return None, 'ip'
+            if self.per_file and self.files[file_key] >= self.per_file:
+                return None, 'file'
+            self.active += 1
+            if session:
+                self.sessions[session] += 1
+            self.ips[ip] += 1
+            self.files[file_key] += 1
+        return (session, ip, file_key), None
+
+    def release(self, slot):
+        session, ip, file_key = slot
+        with self._lock:
+            self.active -= 1
+            for counter, key in ((self.sessions, session), (self.ips, ip), (self.files, file_key)):
+                if key is None:
+                    continue
+                counter[key] -= 1
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def session_count(self, session):
+        return self.sessions.get(session, 0)
+
+    def ip_count(self, ip):
+        return self.ips.get(ip, 0)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark send_file_body's client-paced chunks against the fixed-size loops it replaced
+
+Sends a page-cached file over a local socketpair, once with each of the
+old loops (8 KB preads for streams, 64 KB reads for downloads) and once
+through AuthFileHandler.send_file_body with fixed and adaptive chunk
+sizes. Reports wall-clock MB/s and MB per CPU-second of the sending
+thread, which is what bounds how many transfers one core can carry:
+
+    python3 benchmarks/buffer_bench.py
+    python3 benchmarks/buffer_bench.py --size-mb 512 --repeat 5 --json
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_workdir = tempfile.TemporaryDirectory(prefix='fileshare-buffers-')
+os.environ.setdefault('FILESHARE_DB_PATH', os.path.join(_workdir.name, 'bench.db'))
+os.environ.setdefault('FILESHARE_ACCESS_LOG', os.path.join(_workdir.name, 'access.log'))
+os.environ.setdefault('FILESHARE_SEARCH_INDEX', os.path.join(_workdir.name, 'search.db'))
+os.environ.setdefault('FILESHARE_FOLDER_SIZES', os.path.join(_workdir.name, 'sizes.db'))
+os.environ.setdefault('FILESHARE_DUPLICATES', os.path.join(_workdir.name, 'duplicates.db'))
+os.environ.setdefault('FILESHARE_CHECKSUMS', os.path.join(_workdir.name, 'checksums.db'))
+sys.path.insert(0, REPO_DIR)
+os.chdir(REPO_DIR)
+
+from main import BANDWIDTH, FD_CACHE, AuthFileHandler, ChunkSizer, Config, Prefetcher  # noqa: E402
+
+
+class SocketSink:
+    """Minimal response stream: sendall() like http.server's writer"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+
+def drain(sock):
+    buffer = bytearray(1024 * 1024)
+    while sock.recv_into(buffer):
+        pass
+
+
+def old_stream(path, size, sink):
+    """serve_video_stream's loop before send_file_body, per-chunk bookkeeping included"""
+    timing = AuthFileHandler.timing
+    stream = BANDWIDTH.open('bench', '127.0.0.1', 'media')
+    try:
+        with FD_CACHE.open(path) as handle:
+            prefetch = Prefetcher(handle.fd, 0, size, 0)
+            offset = 0
+            while True:
+                with timing.phase('fs'):
+                    chunk = handle.read(8192, offset)
+                if not chunk:
+                    break
+                BANDWIDTH.acquire(stream, len(chunk))
+                sink.write(chunk)
+                offset += len(chunk)
+                prefetch.advance(offset)
+    finally:
+        BANDWIDTH.close(stream)
+    return offset
+
+
+def old_download(path, size, sink):
+    """serve_download's loop before send_file_body"""
+    timing = AuthFileHandler.timing
+    stream = BANDWIDTH.open('bench', '127.0.0.1', 'bulk')
+    try:
+        with open(path, 'rb') as f:
+            prefetch = Prefetcher(f.fileno(), 0, size, 0)
+            position = 0
+            while True:
+                with timing.phase('fs'):
+                    chunk = f.read(65536)
+                if not chunk:
+                    break
+                position += len(chunk)
+                prefetch.advance(position)
+                BANDWIDTH.acquire(stream, len(chunk))
+                sink.write(chunk)
+    finally:
+        BANDWIDTH.close(stream)
+    return position
+
+
+def make_handler(sink):
+    handler = AuthFileHandler.__new__(AuthFileHandler)
+    handler.wfile = sink
+    handler.stream_chunk_sizer = None
+    return handler
+
+
+def paced_stream(chunks):
+    def run(path, size, sink):
+        handler = make_handler(sink)
+        stream = BANDWIDTH.open('bench', '127.0.0.1', 'media')
+        try:
+            with FD_CACHE.open(path) as handle:
+                return handler.send_file_body(handle.read, 0, size, stream, chunks(), Prefetcher(handle.fd, 0, size, 0))
+        finally:
+            BANDWIDTH.close(stream)
+    return run
+
+
+def paced_download(chunks):
+    def run(path, size, sink):
+        handler = make_handler(sink)
+        stream = BANDWIDTH.open('bench', '127.0.0.1', 'bulk')
+        try:
+            with open(path, 'rb') as f:
+                return handler.send_file_body(lambda length, offset: f.read(length), 0, size, stream, chunks(),
+                                              Prefetcher(f.fileno(), 0, size, 0))
+        finally:
+            BANDWIDTH.close(stream)
+    return run
+
+
+def measure(func, path, size, repeat):
+    """Best wall MB/s and best MB per sender CPU-second over repeat runs"""
+    best_wall = best_cpu = 0.0
+    for _ in range(repeat):
+        sender, receiver = socket.socketpair()
+        reader = threading.Thread(target=drain, args=(receiver,), daemon=True)
+        reader.start()
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        sent = func(path, size, SocketSink(sender))
+        wall, cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+        sender.close()
+        reader.join()
+        receiver.close()
+        if sent != size:
+            raise RuntimeError(f'{func.__name__} sent {sent} of {size} bytes')
+        megabytes = size / (1024 * 1024)
+        best_wall = max(best_wall, megabytes / wall)
+        best_cpu = max(best_cpu, megabytes / max(cpu, 1e-9))
+    return {'mbps': round(best_wall, 1), 'mb_per_cpu_second': round(best_cpu, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark client-paced transfer chunks')
+    parser.add_argument('--size-mb', type=int, default=256, help='Test file size')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best is reported')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    small, large = Config.SMALL_CHUNK_SIZE, Config.MAX_CHUNK_SIZE
+    cases = [
+        ('stream: 8KB bytes per chunk (old)', old_stream),
+        ('stream: send_file_body, 8KB', paced_stream(lambda: ChunkSizer(small, small))),
+        ('stream: send_file_body, adaptive', paced_stream(lambda: ChunkSizer(small, large))),
+        ('download: 64KB bytes per chunk (old)', old_download),
+        ('download: send_file_body, 64KB', paced_download(lambda: ChunkSizer(65536, 65536))),
+        ('download: send_file_body, adaptive', paced_download(lambda: ChunkSizer(small, large, 65536))),
+    ]
+
+    path = os.path.join(_workdir.name, 'media.bin')
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        for _ in range(args.size_mb):
+            f.write(block)
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while f.read(1024 * 1024):  # Warm the page cache
+            pass
+
+    results = {name: measure(func, path, size, args.repeat) for name, func in cases}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'case':40} {'MB/s':>10} {'MB/cpu-s':>10}")
+    for name, result in results.items():
+        print(f"{name:40} {result['mbps']:10.1f} {result['mb_per_cpu_second']:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Load-test benchmark for the file server
+
+Starts main.create_server() in a child process on a temporary database and a
+generated dataset, drives concurrent scenarios from a local client pool and
+prints the results as JSON:
+
+    python3 benchmarks/load_test.py --concurrency 8 --duration 5 --output results.json
+    python3 benchmarks/load_test.py --scenarios deep_listing,video_seeks --compare results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_USER = 'benchuser'
+BENCH_PASSWORD = 'benchpass123'
+MOBILE_USER_AGENT = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148 Safari/604.1'
+SCENARIOS = ('login_storm', 'deep_listing', 'wide_listing', 'sequential_download', 'video_seeks', 'mixed_mobile')
+
+
+def generate_dataset(root, depth=20, wide_entries=1000, download_mb=64, video_mb=32):
+    """Create the directory trees and media files the scenarios read"""
+    block = os.urandom(1024 * 1024)
+
+    deep = os.path.join(root, 'deep')
+    current = deep
+    for level in range(depth):
+        current = os.path.join(current, f'level_{level:02d}')
+        os.makedirs(current, exist_ok=True)
+        for index in range(5):
+            with open(os.path.join(current, f'notes_{index}.txt'), 'wb') as f:
+                f.write(block[:2048])
+
+    wide = os.path.join(root, 'wide')
+    os.makedirs(wide, exist_ok=True)
+    extensions = ('jpg', 'txt', 'mp4', 'mp3', 'pdf')
+    for index in range(wide_entries):
+        with open(os.path.join(wide, f'file_{index:04d}.{extensions[index % len(extensions)]}'), 'wb') as f:
+            f.write(block[:512])
+
+    media = os.path.join(root, 'media')
+    os.makedirs(media, exist_ok=True)
+    for name, size_mb in (('archive.bin', download_mb), ('movie.mp4', video_mb)):
+        with open(os.path.join(media, name), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(block)
+    for index in range(20):
+        with open(os.path.join(media, f'thumb_{index:02d}.jpg'), 'wb') as f:
+            f.write(block[:20 * 1024])
+    with open(os.path.join(media, 'style.css'), 'w') as f:
+        f.write('body { font-family: sans-serif; }\n' * 100)
+
+    return {'deep_dir': current, 'wide_dir': wide, 'media_dir': media}
+
+
+def serve(data_dir, port):
+    """Child process entry point: run the real server against the dataset"""
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(REPO_DIR)
+    import main
+
+    db_path = os.environ['FILESHARE_DB_PATH']
+    main.AuthFileHandler.DB_FILE = db_path
+    main.AuthFileHandler.init_db()
+    conn = sqlite3.connect(db_path)
+    conn.execute('DELETE FROM shared_paths')
+    conn.execute('INSERT INTO shared_paths (path, shared_by, is_file) VALUES (?, ?, 0)', (data_dir, 'admin'))
+    conn.commit()
+    conn.close()
+    main.AuthFileHandler.create_user(BENCH_USER, BENCH_PASSWORD)
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE users SET is_approved = 1 WHERE username = ?', (BENCH_USER,))
+    conn.commit()
+    conn.close()
+
+    # Every virtual client shares one IP and session, so per-client stream caps would only measure 429s
+    main.STREAM_LIMITS.per_session = main.STREAM_LIMITS.per_ip = main.STREAM_LIMITS.per_file = 0
+
+    server = main.create_server(port, '127.0.0.1')
+    print(json.dumps({'ready': True, 'pid': os.getpid()}), flush=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def stop_server(server):
+    """Stop a server started in its own session, together with the worker processes it forked"""
+    try:
+        os.killpg(server.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError):
+        server.terminate()  # No process groups (Windows), or already gone
+    server.wait(timeout=10)
+
+
+def process_usage(pid):
+    """CPU seconds and RSS bytes of a process, from /proc where available"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        with open(f'/proc/{pid}/status') as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+        return cpu, rss
+    except (OSError, StopIteration, ValueError):
+        return None, None
+
+
+class Client:
+    """Minimal HTTP client issuing one request per connection like browsers on HTTP/1.0"""
+
+    def __init__(self, port, user_agent='fileshare-load-test'):
+        self.port = port
+        self.user_agent = user_agent
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            all_headers = {'User-Agent': self.user_agent}
+            all_headers.update(headers or {})
+            if body is not None:
+                all_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            conn.request(method, path, body=body, headers=all_headers)
+            response = conn.getresponse()
+            received = 0
+            while True:
+                chunk = response.read(256 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+            return response.status, received, response.getheader('Location')
+        finally:
+            conn.close()
+
+    def login(self, username=BENCH_USER, password=BENCH_PASSWORD):
+        body = urllib.parse.urlencode({'username': username, 'password': password})
+        status, _, location = self.request('POST', '/login', body=body)
+        if status != 302 or not location:
+            raise RuntimeError(f'Login failed with status {status}')
+        return location.split('token=', 1)[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name, make_request, concurrency, duration, server_pid):
+    """Call make_request(worker_random) from a pool until the duration elapses"""
+    latencies = []
+    errors = 0
+    received = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        nonlocal errors, received
+        rng = random.Random(seed)
+        local_latencies = []
+        local_errors = 0
+        local_bytes = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok, size = make_request(rng)
+            except (OSError, http.client.HTTPException):
+                ok, size = False, 0
+            local_latencies.append(time.perf_counter() - started)
+            local_bytes += size
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+            received += local_bytes
+
+    cpu_before, _ = process_usage(server_pid)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seed in range(concurrency):
+            pool.submit(worker, seed)
+    elapsed = time.perf_counter() - started
+    cpu_after, rss = process_usage(server_pid)
+
+    latencies.sort()
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(elapsed, 3),
+        'req_per_s': round(len(latencies) / elapsed, 2),
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+        'mb_per_s': round(received / elapsed / (1024 * 1024), 2),
+        'server_cpu_s': round(cpu_after - cpu_before, 3) if cpu_before is not None else None,
+        'server_rss_mb': round(rss / (1024 * 1024), 1) if rss is not None else None,
+    }
+
+
+def build_scenarios(port, paths, token):
+    quote = urllib.parse.quote
+    client = Client(port)
+    mobile = Client(port, MOBILE_USER_AGENT)
+    movie = os.path.join(paths['media_dir'], 'movie.mp4')
+    movie_size = os.path.getsize(movie)
+    thumbs = [os.path.join(paths['media_dir'], f'thumb_{i:02d}.jpg') for i in range(20)]
+
+    def login_storm(rng):
+        status, size, _ = client.request('POST', '/login', body=urllib.parse.urlencode(
+            {'username': BENCH_USER, 'password': BENCH_PASSWORD}))
+        return status == 302, size
+
+    def deep_listing(rng):
+        status, size, _ = client.request('GET', f"{quote(paths['deep_dir'])}?token={token}")
+        return status == 200, size
+
+    def wide_listing(rng):
+        status, size, _ = client.request('GET', f"{quote(paths['wide_dir'])}?token={token}")
+        return status == 200, size
+
+    def sequential_download(rng):
+        archive = os.path.join(paths['media_dir'], 'archive.bin')
+        status, size, _ = client.request('GET', f"/download/{quote(archive)}?token={token}")
+        return status == 200, size
+
+    def range_seek(http_client, rng):
+        start = rng.randrange(0, movie_size - 1)
+        status, size, _ = http_client.request('GET', f"{quote(movie)}?token={token}",
+                                              headers={'Range': f'bytes={start}-'})
+        return status == 206, size
+
+    def video_seeks(rng):
+        return range_seek(client, rng)
+
+    def mixed_mobile(rng):
+        roll = rng.random()
+        if roll < 0.3:
+            status, size, _ = mobile.request('GET', f"{quote(paths['media_dir'])}?token={token}")
+        elif roll < 0.7:
+            status, size, _ = mobile.request('GET', f"{quote(rng.choice(thumbs))}?token={token}")
+        elif roll < 0.8:
+            status, size, _ = mobile.request('GET', f"{quote(os.path.join(paths['media_dir'], 'style.css'))}?token={token}")
+        else:
+            return range_seek(mobile, rng)
+        return status == 200, size
+
+    return {
+        'login_storm': login_storm,
+        'deep_listing': deep_listing,
+        'wide_listing': wide_listing,
+        'sequential_download': sequential_download,
+        'video_seeks': video_seeks,
+        'mixed_mobile': mixed_mobile,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Return human-readable regressions against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {entry['scenario']: entry for entry in json.load(f)['results']}
+    regressions = []
+    for entry in results:
+        previous = baseline.get(entry['scenario'])
+        if not previous:
+            continue
+        if previous['req_per_s'] and entry['req_per_s'] < previous['req_per_s'] * (1 - tolerance):
+            regressions.append(f"{entry['scenario']}: req/s {previous['req_per_s']} -> {entry['req_per_s']}")
+        if previous['p95_ms'] and entry['p95_ms'] and entry['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{entry['scenario']}: p95 {previous['p95_ms']}ms -> {entry['p95_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the file server')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenario names')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per scenario')
+    parser.add_argument('--depth', type=int, default=20, help='Depth of the deep listing tree')
+    parser.add_argument('--download-mb', type=int, default=64)
+    parser.add_argument('--video-mb', type=int, default=32)
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Previous results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative regression')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix='fileshare-bench-') as workdir:
+        data_dir = os.path.join(workdir, 'data')
+        paths = generate_dataset(data_dir, args.depth, 1000, args.download_mb, args.video_mb)
+        port = free_port()
+        env = dict(os.environ,
+                   FILESHARE_DB_PATH=os.path.join(workdir, 'bench.db'),
+                   FILESHARE_ACCESS_LOG=os.path.join(workdir, 'access.log'),
+                   FILESHARE_SEARCH_INDEX=os.path.join(workdir, 'search.db'),
+                   FILESHARE_FOLDER_SIZES=os.path.join(workdir, 'sizes.db'),
+                   FILESHARE_DUPLICATES=os.path.join(workdir, 'duplicates.db'),
+                   FILESHARE_CHECKSUMS=os.path.join(workdir, 'checksums.db'))
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', data_dir, '--port', str(port)],
+            cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, text=True, start_new_session=True)
+        try:
+            for line in server.stdout:
+                if line.startswith('{') and json.loads(line).get('ready'):
+                    break
+            else:
+                raise RuntimeError('Server exited before becoming ready')
+            # Drain the server's console output so it can never block on a full pipe
+            threading.Thread(target=server.stdout.read, daemon=True).start()
+
+            token = Client(port).login()
+            scenarios = build_scenarios(port, paths, token)
+            results = [run_scenario(name, scenarios[name], args.concurrency, args.duration, server.pid)
+                       for name in selected]
+        finally:
+            stop_server(server)
+
+    report = {
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
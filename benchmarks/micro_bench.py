@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for AuthFileHandler hot functions
+
+Runs the per-request helpers against synthetic fixtures (100k sessions,
+10/1k/10k shared paths, deep and wide directory trees) without opening any
+sockets, then compares each timing with a stored baseline:
+
+    python3 benchmarks/micro_bench.py                    # compare with micro_baseline.json
+    python3 benchmarks/micro_bench.py --save-baseline    # record a new baseline
+    python3 benchmarks/micro_bench.py --filter is_path_accessible
+
+On shared or single-CPU machines a case can vary by 30% or more from one
+run to the next, so a single flagged regression is worth re-running, and
+a baseline is best taken as the fastest of several runs.
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import timeit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'micro_baseline.json')
+
+_workdir = tempfile.TemporaryDirectory(prefix='fileshare-micro-')
+os.environ.setdefault('FILESHARE_DB_PATH', os.path.join(_workdir.name, 'micro.db'))
+os.environ.setdefault('FILESHARE_ACCESS_LOG', os.path.join(_workdir.name, 'access.log'))
+os.environ.setdefault('FILESHARE_SEARCH_INDEX', os.path.join(_workdir.name, 'search.db'))
+os.environ.setdefault('FILESHARE_FOLDER_SIZES', os.path.join(_workdir.name, 'sizes.db'))
+os.environ.setdefault('FILESHARE_DUPLICATES', os.path.join(_workdir.name, 'duplicates.db'))
+os.environ.setdefault('FILESHARE_CHECKSUMS', os.path.join(_workdir.name, 'checksums.db'))
+sys.path.insert(0, REPO_DIR)
+os.chdir(REPO_DIR)  # Templates are resolved relative to the repository
+
+from main import AuthFileHandler, CountingWriter  # noqa: E402
+
+
+def make_handler(path='/', user_agent='micro-bench'):
+    """Build a handler without a socket, writing responses into memory"""
+    handler = AuthFileHandler.__new__(AuthFileHandler)
+    handler.path = path
+    handler.command = 'GET'
+    handler.request_version = 'HTTP/1.1'
+    handler.requestline = f'GET {path} HTTP/1.1'
+    handler.client_address = ('127.0.0.1', 50000)
+    handler.headers = {'User-Agent': user_agent}
+    handler.wfile = CountingWriter(io.BytesIO())
+    handler.close_connection = True
+    handler.route_label = None
+    handler.auth_user = None
+    return handler
+
+
+def reset_output(handler):
+    handler.wfile = CountingWriter(io.BytesIO())
+    handler._headers_buffer = []
+
+
+def install_sessions(count):
+    now = time.time()
+    AuthFileHandler.VALID_TOKENS = {f'token-{i}': {'user': f'user{i % 500}', 'expires': now + 3600}
+                                    for i in range(count)}
+    AuthFileHandler.ACTIVE_USERS = {f'token-{i}': {'user': f'user{i % 500}', 'last_activity': now,
+                                                   'ip': '10.0.0.1', 'user_agent': 'bench'}
+                                    for i in range(count)}
+
+
+def install_shared_paths(count, root='/srv/share'):
+    """Fill the shared-path cache directly and pin it so it never expires"""
+    shared = {f'{root}/folder_{i:05d}': False for i in range(count)}
+    AuthFileHandler.SHARED_PATHS_CACHE = shared
+    AuthFileHandler.CACHE_TIMESTAMP = float('inf')
+    return shared
+
+
+def build_tree(root, depth=30, wide_entries=1000):
+    deep = root
+    for level in range(depth):
+        deep = os.path.join(deep, f'level_{level:02d}')
+        os.makedirs(deep)
+        for index in range(5):
+            open(os.path.join(deep, f'doc_{index}.txt'), 'w').close()
+    wide = os.path.join(root, 'wide')
+    os.makedirs(wide)
+    extensions = ('jpg', 'txt', 'mp4', 'mp3', 'html', 'pdf')
+    for index in range(wide_entries):
+        with open(os.path.join(wide, f'file_{index:04d}.{extensions[index % len(extensions)]}'), 'wb') as f:
+            f.write(b'x' * 128)
+    for index in range(20):
+        os.makedirs(os.path.join(wide, f'dir_{index:02d}'))
+    return deep, wide
+
+
+def bench(func, min_time=0.2, repeat=5):
+    """Best-of-N seconds per call, auto-scaling the loop count like timeit"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def fixed(func):
+    """Wrap a callable that needs no per-benchmark fixture setup"""
+    return lambda: func
+
+
+def collect_benchmarks(tree_root):
+    """Return {name: setup}, where setup() installs fixtures and returns the callable to time"""
+    benchmarks = {}
+
+    # Token auth and session sweeps against 100k sessions
+    handler = make_handler()
+
+    def with_sessions(func):
+        def setup():
+            install_sessions(100_000)
+            return func
+        return setup
+
+    def check_token_auth():
+        handler.path = '/srv/share/folder?token=token-77777'
+        handler.check_token_auth()
+    benchmarks['check_token_auth[100k sessions]'] = with_sessions(check_token_auth)
+
+    def check_token_auth_miss():
+        handler.path = '/srv/share/folder?token=not-a-token'
+        handler.check_token_auth()
+    benchmarks['check_token_auth_miss[100k sessions]'] = with_sessions(check_token_auth_miss)
+    benchmarks['cleanup_expired_tokens[100k sessions]'] = with_sessions(handler.cleanup_expired_tokens)
+
+    # Access checks scale with the number of shared folders
+    for count in (10, 1_000, 10_000):
+        def accessible(count=count):
+            install_shared_paths(count)
+            last = f'/srv/share/folder_{count - 1:05d}/sub/file.txt'
+            return lambda: handler.is_path_accessible(last, 'user1')
+        def denied(count=count):
+            install_shared_paths(count)
+            return lambda: handler.is_path_accessible('/etc/passwd', 'user1')
+        benchmarks[f'is_path_accessible_last[{count} shared]'] = accessible
+        benchmarks[f'is_path_accessible_denied[{count} shared]'] = denied
+
+    # Shared-path loading, cached and straight from SQLite
+    def shared_paths_db(count):
+        db_path = os.path.join(tree_root, f'shared_{count}.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE shared_paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, '
+                     'shared_by TEXT NOT NULL, is_file BOOLEAN DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+        conn.executemany('INSERT INTO shared_paths (path, shared_by, is_file) VALUES (?, ?, 0)',
+                         [(f'/srv/share/folder_{i:05d}', 'admin') for i in range(count)])
+        conn.commit()
+        conn.close()
+        return db_path
+
+    for count in (10, 1_000, 10_000):
+        def uncached(count=count):
+            AuthFileHandler.DB_FILE = shared_paths_db(count)
+            def run():
+                AuthFileHandler.invalidate_shared_paths_cache()
+                AuthFileHandler.get_shared_paths()
+            return run
+        benchmarks[f'get_shared_paths_uncached[{count} shared]'] = uncached
+
+    def cached():
+        install_shared_paths(1_000)
+        return AuthFileHandler.get_shared_paths
+    benchmarks['get_shared_paths_cached'] = cached
+
+    benchmarks['format_size'] = fixed(lambda: handler.format_size(123_456_789))
+    benchmarks['get_content_type'] = fixed(lambda: handler.get_content_type('/srv/share/Movies/Holiday.Clip.MP4'))
+
+    # Directory rendering over real trees
+    deep, wide = build_tree(tree_root)
+    render_handler = make_handler()
+
+    def render(path, user, shared_root=None):
+        def setup():
+            install_sessions(1_000)
+            AuthFileHandler.VALID_TOKENS['admin-token'] = {'user': 'admin', 'expires': time.time() + 3600}
+            if shared_root:
+                AuthFileHandler.SHARED_PATHS_CACHE = {shared_root: False}
+                AuthFileHandler.CACHE_TIMESTAMP = float('inf')
+            def run():
+                reset_output(render_handler)
+                render_handler.show_directory(path, user)
+            return run
+        return setup
+    benchmarks['show_directory[1000 entries, admin]'] = render(wide, 'admin')
+    benchmarks['show_directory[1000 entries, shared user]'] = render(wide, 'user1', tree_root)
+    benchmarks['show_directory[depth 30, shared user]'] = render(deep, 'user1', tree_root)
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark AuthFileHandler hot functions')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this text')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Approximate seconds per repeat')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='fileshare-tree-') as tree_root:
+        for name, setup in collect_benchmarks(tree_root).items():
+            if args.filter not in name:
+                continue
+            results[name] = bench(setup(), args.min_time) * 1e6
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results_us', {})
+
+    regressions = []
+    if args.json:
+        print(json.dumps({'results_us': results}, indent=2))
+    else:
+        print(f"{'benchmark':55} {'us/call':>12} {'baseline':>12} {'ratio':>7}")
+    for name, micros in results.items():
+        previous = baseline.get(name)
+        ratio = micros / previous if previous else None
+        if ratio and ratio > 1 + args.tolerance:
+            regressions.append(name)
+        if not args.json:
+            print(f"{name:55} {micros:12.2f} {previous if previous else float('nan'):12.2f} "
+                  f"{(f'{ratio:.2f}x' if ratio else '-'):>7}{'  REGRESSION' if name in regressions else ''}")
+
+    if args.save_baseline:
+        merged = dict(baseline, **results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results_us': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
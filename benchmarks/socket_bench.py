@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Compare socket tuning profiles under the load-test scenarios
+
+Starts the real server once per profile (see socket_tuning.PROFILES) on the
+load-test dataset and runs small pages, a burst of new connections, media
+seeks and a bulk download against each, printing one row per profile and
+scenario:
+
+    python3 benchmarks/socket_bench.py
+    python3 benchmarks/socket_bench.py --profiles default,balanced --duration 5 --json
+
+Over loopback the round trip is microseconds, so Nagle and send-buffer
+effects are much smaller than across a real LAN. Listen-backlog effects
+show in the burst p99 either way.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import load_test  # noqa: E402
+
+
+def serve(data_dir, port, profile):
+    """Child process entry point: the load-test server with the given socket profile"""
+    sys.path.insert(0, REPO_DIR)
+    import main
+    main.SOCKET_PROFILE = main.get_socket_profile(profile)
+    load_test.serve(data_dir, port)
+
+
+def run_profile(profile, paths, data_dir, workdir, args):
+    port = load_test.free_port()
+    env = dict(os.environ,
+               FILESHARE_DB_PATH=os.path.join(workdir, f'{profile}.db'),
+               FILESHARE_ACCESS_LOG=os.path.join(workdir, f'{profile}-access.log'),
+               FILESHARE_SEARCH_INDEX=os.path.join(workdir, f'{profile}-search.db'),
+               FILESHARE_FOLDER_SIZES=os.path.join(workdir, f'{profile}-sizes.db'),
+               FILESHARE_DUPLICATES=os.path.join(workdir, f'{profile}-duplicates.db'),
+               FILESHARE_CHECKSUMS=os.path.join(workdir, f'{profile}-checksums.db'))
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', data_dir, '--port', str(port), '--profiles', profile],
+        cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, text=True, start_new_session=True)
+    try:
+        for line in server.stdout:
+            if line.startswith('{') and json.loads(line).get('ready'):
+                break
+        else:
+            raise RuntimeError('Server exited before becoming ready')
+        threading.Thread(target=server.stdout.read, daemon=True).start()
+
+        token = load_test.Client(port).login()
+        scenarios = load_test.build_scenarios(port, paths, token)
+        client = load_test.Client(port)
+        small_path = f"{urllib.parse.quote(os.path.join(paths['media_dir'], 'style.css'))}?token={token}"
+
+        def small_page(rng):
+            status, size, _ = client.request('GET', small_path)
+            return status == 200, size
+
+        plan = [
+            ('small_page', small_page, args.concurrency),
+            ('connection_burst', small_page, args.burst_concurrency),
+            ('video_seeks', scenarios['video_seeks'], args.concurrency),
+            ('sequential_download', scenarios['sequential_download'], min(args.concurrency, 4)),
+        ]
+        results = []
+        for name, make_request, concurrency in plan:
+            result = load_test.run_scenario(name, make_request, concurrency, args.duration, server.pid)
+            result['profile'] = profile
+            results.append(result)
+        return results
+    finally:
+        load_test.stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare socket tuning profiles')
+    parser.add_argument('--profiles', default='default,balanced,lan', help='Comma-separated profile names')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--burst-concurrency', type=int, default=64, help='Clients in the connection burst')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per scenario')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.profiles)
+        return
+
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    with tempfile.TemporaryDirectory(prefix='fileshare-sockets-') as workdir:
+        data_dir = os.path.join(workdir, 'data')
+        paths = load_test.generate_dataset(data_dir, depth=2, wide_entries=10)
+        results = [result for profile in profiles for result in run_profile(profile, paths, data_dir, workdir, args)]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'profile':10} {'scenario':20} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'MB/s':>9} {'errors':>7}")
+    for result in results:
+        print(f"{result['profile']:10} {result['scenario']:20} {result['req_per_s']:9.1f} {result['p50_ms']:8.2f} "
+              f"{result['p99_ms']:8.2f} {result['mb_per_s']:9.1f} {result['errors']:7d}")
+
+
+if __name__ == '__main__':
+    main()
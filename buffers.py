@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Transfer chunks - client-paced chunk sizes for the stream and download copy loops
+"""
+
+
+class ChunkSizer:
+    """Chunk size that follows how fast the client takes the data.
+
+    observe() is told how long each chunk took to send, including any
+    bandwidth throttling. When the client would take a chunk at least
+    twice as large within target_seconds, the size doubles; when it
+    could not take half of one, it halves. Fast LAN clients soon get
+    large chunks and few syscalls, while slow or throttled ones keep
+    small chunks and a short time between writes.
+    """
+
+    def __init__(self, minimum=8192, maximum=1024 * 1024, initial=None, target_seconds=0.05):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.size = min(max(initial or minimum, minimum), maximum)
+
+    def observe(self, nbytes, seconds):
+        if nbytes < self.size:
+            return  # Short final chunk; says little about the client
+        if seconds <= 0:
+            self.size = min(self.size * 2, self.maximum)
+            return
+        ideal = nbytes / seconds * self.target_seconds
+        if ideal >= self.size * 2:
+            self.size = min(self.size * 2, self.maximum)
+        elif ideal < self.size / 2:
+            self.size = max(self.size // 2, self.minimum)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Checksum service - file digests computed once on a process pool and cached in SQLite
+"""
+import base64
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import threading
+
+try:
+    from app.worker_pool import WorkerPool
+except ImportError:
+    from worker_pool import WorkerPool
+
+try:
+    from app.sqlite_readers import ReadConnections
+except ImportError:
+    from sqlite_readers import ReadConnections
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS checksums (
+        path TEXT NOT NULL,
+        algo TEXT NOT NULL,
+        inode INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (path, algo)
+    );
+'''
+
+ALGORITHMS = ('sha256', 'sha512', 'sha1', 'md5')
+# Names registered for the Digest and Repr-Digest fields; others are served from /checksum only
+DIGEST_FIELD_NAMES = {'sha256': 'sha-256', 'sha512': 'sha-512'}
+CHUNK_BYTES = 1024 * 1024
+
+
+def hash_file(path, algo, version):
+    """Worker task: hex digest of a whole file, which must still be at version (inode, size, mtime_ns)"""
+    digest = hashlib.new(algo)
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if (st.st_ino, st.st_size, st.st_mtime_ns) != version:
+            raise OSError(f'{path} changed before it could be hashed')
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+        st = os.fstat(f.fileno())
+        if (st.st_ino, st.st_size, st.st_mtime_ns) != version:
+            raise OSError(f'{path} changed while being hashed')
+    return digest.hexdigest()
+
+
+def digest_fields(algo, hex_digest):
+    """(Repr-Digest, Digest) header values for a digest, or None for algorithms without a field name"""
+    name = DIGEST_FIELD_NAMES.get(algo)
+    if name is None:
+        return None
+    encoded = base64.b64encode(bytes.fromhex(hex_digest)).decode('ascii')
+    return f'{name}=:{encoded}:', f'{name.upper()}={encoded}'
+
+
+class ChecksumCache:
+    """Digests of shared files, each computed once per version of the file.
+
+    A stored digest is valid while the file's inode, size and mtime match.
+    Digests are computed in worker processes so a large file never holds
+    the GIL; concurrent requests for the same file version share one job.
+    """
+
+    def __init__(self, db_path, workers=2):
+        self.db_path = db_path
+        self.workers = workers
+        self.pool = WorkerPool(workers)
+        self._jobs = {}  # (path, algo, inode, size, mtime_ns) -> Future
+        self._lock = threading.Lock()
+        self.readers = ReadConnections(db_path)  # Digest lookups made on every download
+        self._schema_ready = False
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        if not self._schema_ready:
+            conn.execute('PRAGMA journal_mode=WAL')  # Kept by the file; downloads look digests up while others are stored
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def start(self):
+        """Fork the workers now, before the server has sockets or threads for them to inherit"""
+        self.pool.start()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def lookup(self, path, algos, st=None):
+        """{algo: stored digest} for the current version of path, in one query; never hashes.
+
+        st may be a recent stat of path to validate against instead of a fresh one.
+        """
+        algos = tuple(algos)
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return {}
+        if not self._schema_ready:
+            self.connect().close()
+        placeholders = ', '.join('?' * len(algos))
+        with self.readers.connection() as conn:
+            return dict(conn.execute(f'SELECT algo, digest FROM checksums WHERE path = ? AND algo IN ({placeholders}) '
+                                     f'AND inode = ? AND size = ? AND mtime_ns = ?',
+                                     (path,) + algos + (st.st_ino, st.st_size, st.st_mtime_ns)))
+
+    def cached(self, path, algo):
+        """The stored digest for the current version of path, or None; never hashes"""
+        return self.lookup(path, (algo,)).get(algo)
+
+    def checksum(self, path, algo, timeout=None):
+        """Digest of path, computing it if needed; raises TimeoutError if not ready within timeout.
+
+        A computation that times out keeps running, so a later call picks
+        up its result. Raises OSError if the file can't be read.
+        """
+        st = os.stat(path)
+        digest = self.lookup(path, (algo,), st).get(algo)
+        if digest is not None:
+            return digest
+        key = (path, algo, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            future = self._jobs.get(key)
+            submitted = future is None
+            if submitted:
+                pool = self.pool.get()
+                try:
+                    future = pool.submit(hash_file, path, algo, key[2:])
+                except concurrent.futures.process.BrokenProcessPool:
+                    self.pool.discard(pool)  # A worker died; start a fresh pool
+                    future = self.pool.get().submit(hash_file, path, algo, key[2:])
+                self._jobs[key] = future
+        if submitted:
+            # Outside the lock: a job that already finished runs the callback right here
+            future.add_done_callback(lambda done: self._finished(key, done))
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f'{algo} of {path} is still being computed')
+        except concurrent.futures.process.BrokenProcessPool as e:
+            raise OSError(f'Checksum worker failed: {e}')
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._jobs.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        conn = self.connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO checksums (path, algo, inode, size, mtime_ns, digest) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', key + (future.result(),))
+            conn.commit()
+        except sqlite3.Error:
+            pass  # Computed again next time
+        finally:
+            conn.close()
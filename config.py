@@ -24,6 +24,102 @@ class Config:
     INACTIVE_USER_TIMEOUT_MINUTES = 5
     MAX_CHUNK_SIZE = 1024 * 1024  # 1MB for video streaming
     SMALL_CHUNK_SIZE = 8192       # 8KB for regular files
+    CHUNK_TARGET_SECONDS = 0.05   # Chunk sizes adapt between the two so each send takes about this long
+    
+    # Bandwidth Limits (bytes per second, 0 = unlimited; adjustable live from the admin panel)
+    BANDWIDTH_GLOBAL_LIMIT = 0
+    BANDWIDTH_USER_LIMIT = 0
+    BANDWIDTH_IP_LIMIT = 0
+    BANDWIDTH_WEIGHTS = {'media': 4, 'bulk': 1}  # Fair-share weights when a cap is contended
+    
+    # Concurrent Stream Limits (0 = unlimited)
+    MAX_STREAMS_PER_SESSION = 8
+    MAX_STREAMS_PER_IP = 16
+    MAX_STREAMS_PER_FILE = 4  # Per client IP, to rein in multi-connection download managers
+    MAX_STREAMS_TOTAL = 100  # Server-wide; beyond this clients get 503
+    STREAM_RETRY_AFTER_SECONDS = 5
+    
+    # Request Lanes - downloads and streams are admitted separately from pages and logins
+    LANE_LIMITS = {'interactive': 64, 'bulk': 32}  # Concurrent requests per lane, 0 = unlimited
+    LANE_QUEUE_SECONDS = {'interactive': 10.0, 'bulk': 5.0}  # Wait for a slot before answering 503
+    BULK_LANE_NICE = 10  # Added to the nice value of threads serving bulk transfers (Linux only)
+    
+    # Request Body Limits
+    POST_BODY_LIMITS = {'/login': 4096, '/register': 4096}  # Max form body bytes per route
+    POST_BODY_TIMEOUT_SECONDS = 10  # Deadline for receiving a whole form body
+    
+    # Connection Timeouts (0 = no limit)
+    IDLE_TIMEOUT_SECONDS = 15  # Keep-alive wait for the next request to start
+    HEADER_TIMEOUT_SECONDS = 10  # Deadline for the request line and headers once they start
+    MIN_SEND_RATE_BYTES = 1024  # Abort responses the client reads slower than this per second...
+    SEND_STALL_GRACE_SECONDS = 60  # ...after allowing this much extra time per write
+    
+    # Socket Tuning ('default' = Python's defaults, 'balanced', or 'lan' for fast wired networks)
+    SOCKET_PROFILE = 'balanced'
+    SOCKET_OPTIONS = {}  # Overrides for the profile, e.g. {'send_buffer': 2 * 1024 * 1024, 'backlog': 512}
+    
+    # Search Index
+    SEARCH_INDEX_INTERVAL_SECONDS = 60  # Between incremental passes over the shared folders
+    SEARCH_INDEX_ADMIN_ROOTS = ()  # Extra folders indexed for admin searches only
+    SEARCH_RESULTS_LIMIT = 100
+    
+    # Folder Sizes
+    FOLDER_SIZES_INTERVAL_SECONDS = 300  # Between full passes; the watcher keeps totals current in between
+    STORAGE_REPORT_LIMIT = 20  # Largest folders and files shown on the storage report
+    
+    # Duplicate Finder
+    DUPLICATES_WORKERS = 0  # Hashing processes; 0 means one per CPU
+    DUPLICATES_MIN_BYTES = 1024  # Smaller files aren't worth reporting
+    DUPLICATES_REPORT_LIMIT = 100  # Groups shown, most reclaimable first
+    
+    # Filesystem Watcher (inotify on Linux, polling elsewhere)
+    WATCHER_ENABLED = True
+    WATCHER_INTERVAL_SECONDS = 5  # Re-read the shared paths, and the polling period without inotify
+    WATCHER_DEBOUNCE_SECONDS = 0.5  # Changes are collected this long before being published
+    CHANGE_FEED_CAPACITY = 10000  # Events kept for /api/changes; older cursors must re-list
+    CHANGE_FEED_PAGE_SIZE = 1000
+    
+    # Content Search (/grep)
+    GREP_WORKERS = 0  # Worker processes, 0 = one per CPU
+    GREP_TIME_BUDGET_SECONDS = 10  # Wall-clock limit per query
+    GREP_CPU_BUDGET_SECONDS = 20  # Worker CPU time limit per query, summed over processes
+    GREP_MAX_MATCHES = 1000
+    GREP_MMAP_THRESHOLD = 1024 * 1024  # Larger files are memory-mapped instead of read
+    
+    # Stat Cache (shared by every handler; the watcher invalidates changed paths sooner)
+    STAT_CACHE_TTL_SECONDS = 1.0  # 0 disables the shared cache; each request still stats a path once
+    STAT_CACHE_MAX_ENTRIES = 10000
+    
+    # File Body Cache (small files served by serve_file)
+    FILE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Total memory for cached bodies
+    FILE_CACHE_MAX_FILE_BYTES = 256 * 1024  # Larger files are always read from disk
+    
+    # File Descriptor Cache (media Range requests)
+    FD_CACHE_MAX_OPEN = 256  # Idle fds kept open; capped at a quarter of RLIMIT_NOFILE
+    
+    # Readahead Hints (posix_fadvise where available)
+    # 0 turns hints off for a route; downloads stay off until a measurement shows them gaining
+    READAHEAD_WINDOW_BYTES = {'stream': 4 * 1024 * 1024, 'download': 0}
+    READAHEAD_SEQUENTIAL = {'stream': True, 'download': True}  # Mark the range served as read front to back
+    READAHEAD_DROP_AFTER = {'stream': False, 'download': True}  # Evict the pages a finished transfer read
+    
+    # Checksums (/checksum and download Digest headers)
+    CHECKSUM_WORKERS = 2  # Hashing processes; each reads one file start to end
+    CHECKSUM_WAIT_SECONDS = 30  # Longer computations answer 202 and keep running
+    CHECKSUM_DIGEST_HEADERS = True  # Add Repr-Digest/Digest to downloads whose checksum is already stored
+    
+    # Logging Configuration
+    ACCESS_LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the access log at 10MB
+    ACCESS_LOG_BACKUPS = 3
+    ACCESS_LOG_QUEUE_SIZE = 10000  # Entries beyond this are dropped, never blocking requests
+    
+    # Diagnostics Configuration
+    SERVER_TIMING_SAMPLE_RATE = 0.0  # Fraction of requests that get a Server-Timing header
+    SERVER_TIMING_ADMIN = False  # Always time requests made by the admin
+    SLOW_REQUEST_SECONDS = 5.0  # Capture the stack of requests running longer than this
+    SLOW_REQUEST_CHECK_INTERVAL = 1.0
+    SLOW_REQUEST_HISTORY = 50  # Captures kept for the admin page
+    SLOW_REQUEST_IGNORE_ROUTES = ('stream', 'download', 'grep')  # Long by design
     
     # UI Configuration
     MAX_ADMIN_NOTIFICATIONS = 5
@@ -33,4 +129,39 @@ class Config:
         """Get database path - home directory for packaged apps, current dir for development"""
         if getattr(sys, 'frozen', False):  # Packaged app
             return os.path.expanduser('~/fileShare_users.db')
-        return os.environ.get('FILESHARE_DB_PATH', 'users.db')  # Development
\ No newline at end of file
+        return os.environ.get('FILESHARE_DB_PATH', 'users.db')  # Development
+    
+    @classmethod
+    def get_access_log_path(cls):
+        """Get access log path - home directory for packaged apps, current dir for development"""
+        if getattr(sys, 'frozen', False):  # Packaged app
+            return os.path.expanduser('~/fileShare_access.log')
+        return os.environ.get('FILESHARE_ACCESS_LOG', 'access.log')  # Development
+    
+    @classmethod
+    def get_search_index_path(cls):
+        """Get search index path - home directory for packaged apps, current dir for development"""
+        if getattr(sys, 'frozen', False):  # Packaged app
+            return os.path.expanduser('~/fileShare_search.db')
+        return os.environ.get('FILESHARE_SEARCH_INDEX', 'search_index.db')  # Development
+    
+    @classmethod
+    def get_folder_sizes_path(cls):
+        """Get folder sizes database path - home directory for packaged apps, current dir for development"""
+        if getattr(sys, 'frozen', False):  # Packaged app
+            return os.path.expanduser('~/fileShare_sizes.db')
+        return os.environ.get('FILESHARE_FOLDER_SIZES', 'folder_sizes.db')  # Development
+    
+    @classmethod
+    def get_duplicates_path(cls):
+        """Get duplicate finder hash cache path - home directory for packaged apps, current dir for development"""
+        if getattr(sys, 'frozen', False):  # Packaged app
+            return os.path.expanduser('~/fileShare_duplicates.db')
+        return os.environ.get('FILESHARE_DUPLICATES', 'duplicates.db')  # Development
+    
+    @classmethod
+    def get_checksums_path(cls):
+        """Get checksum cache path - home directory for packaged apps, current dir for development"""
+        if getattr(sys, 'frozen', False):  # Packaged app
+            return os.path.expanduser('~/fileShare_checksums.db')
+        return os.environ.get('FILESHARE_CHECKSUMS', 'checksums.db')  # Development
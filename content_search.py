@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Content search - grep inside shared text files across a process pool, within time and CPU budgets
+"""
+import concurrent.futures
+import mmap
+import os
+import re
+import time
+
+try:
+    from app.worker_pool import WorkerPool
+except ImportError:
+    from worker_pool import WorkerPool
+
+SNIFF_BYTES = 8192  # A NUL byte in this much of the head marks a file as binary
+WINDOW_BYTES = 8 * 1024 * 1024  # Budgets are checked between windows of a mapped file
+MAX_LINE_CHARS = 300
+BATCH_FILES = 32
+BATCH_BYTES = 16 * 1024 * 1024
+
+
+def _scan(data, regex, line_no, matches, limit):
+    """Append (line number, text) for each matching line in data, which starts at a line boundary.
+
+    Returns the number of lines passed and whether the match limit was reached.
+    """
+    position = 0
+    for match in regex.finditer(data):
+        line_start = data.rfind(b'\n', 0, match.start()) + 1
+        if line_start < position:
+            continue  # Another match on a line already reported
+        line_no += data.count(b'\n', position, line_start)
+        line_end = data.find(b'\n', match.end())
+        if line_end == -1:
+            line_end = len(data)
+        text = data[line_start:min(line_end, line_start + MAX_LINE_CHARS * 4)]
+        matches.append((line_no + 1, text.decode('utf-8', 'replace')[:MAX_LINE_CHARS]))
+        position = line_end + 1
+        line_no += 1
+        if len(matches) >= limit:
+            return line_no, True
+    return line_no + data.count(b'\n', position), False
+
+
+def grep_files(paths, pattern, flags, limit, deadline, cpu_budget, mmap_threshold):
+    """Worker task: search a batch of files.
+
+    Returns (results, files searched, binaries skipped, cpu seconds, stopped)
+    where results is [(path, [(line, text), ...])] and stopped names the
+    budget that cut the batch short, if any.
+    """
+    cpu_started = time.process_time()
+    regex = re.compile(pattern, flags)
+    results, searched, binary = [], 0, 0
+    for path in paths:
+        if time.time() >= deadline:
+            return results, searched, binary, time.process_time() - cpu_started, 'time'
+        if time.process_time() - cpu_started >= cpu_budget:
+            return results, searched, binary, time.process_time() - cpu_started, 'cpu'
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(SNIFF_BYTES)
+                if b'\0' in head:
+                    binary += 1
+                    continue
+                size = os.fstat(f.fileno()).st_size
+                if size <= len(head):
+                    data, mapped = head, None
+                elif size < mmap_threshold:
+                    data, mapped = head + f.read(), None
+                else:
+                    data = mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            continue
+        searched += 1
+        matches, line_no, full, stopped = [], 0, False, None
+        try:
+            start = 0
+            while start < len(data) and not full:
+                end = len(data)
+                if mapped is not None and end - start > WINDOW_BYTES:
+                    end = data.find(b'\n', start + WINDOW_BYTES) + 1 or len(data)
+                # Windows of a mapped file are copied out, so only one is resident at a time
+                window = data[start:end] if mapped is not None else data
+                line_no, full = _scan(window, regex, line_no, matches, limit)
+                start = end
+                if start < len(data):
+                    if time.time() >= deadline:
+                        stopped = 'time'
+                    elif time.process_time() - cpu_started >= cpu_budget:
+                        stopped = 'cpu'
+                    if stopped:
+                        break
+        finally:
+            if mapped is not None:
+                mapped.close()
+        if matches:
+            results.append((path, matches))
+            limit -= len(matches)
+        if stopped or limit <= 0:
+            return results, searched, binary, time.process_time() - cpu_started, stopped or 'matches'
+    return results, searched, binary, time.process_time() - cpu_started, None
+
+
+class ContentSearch:
+    """Fan grep queries out over a shared process pool.
+
+    Files are walked lazily in the request thread and handed to workers in
+    batches, keeping only a few batches in flight so a query that stops
+    early never enumerated the whole tree. Each query is bounded by wall
+    time, total worker CPU time and match count.
+    """
+
+    def __init__(self, workers=0, time_budget=10.0, cpu_budget=20.0, max_matches=1000, mmap_threshold=1024 * 1024):
+        self.workers = workers or os.cpu_count() or 2
+        self.time_budget = time_budget
+        self.cpu_budget = cpu_budget
+        self.max_matches = max_matches
+        self.mmap_threshold = mmap_threshold
+        self.pool = WorkerPool(self.workers)
+
+    def start(self):
+        """Fork the workers now, before the server has sockets or threads for them to inherit"""
+        self.pool.start()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    @staticmethod
+    def compile(query, regex=False, ignore_case=True):
+        """Return (pattern bytes, flags) after checking the pattern compiles; raises re.error"""
+        pattern = (query if regex else re.escape(query)).encode('utf-8')
+        flags = re.IGNORECASE if ignore_case else 0
+        re.compile(pattern, flags)
+        return pattern, flags
+
+    @staticmethod
+    def batches(root):
+        """Yield lists of file paths below root, sized by count and bytes"""
+        if os.path.isfile(root):
+            yield [root]
+            return
+        batch, size = [], 0
+        for folder, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(folder, name)
+                try:
+                    size += os.path.getsize(path)
+                except OSError:
+                    continue
+                batch.append(path)
+                if len(batch) >= BATCH_FILES or size >= BATCH_BYTES:
+                    yield batch
+                    batch, size = [], 0
+        if batch:
+            yield batch
+
+    def search(self, root, pattern, flags):
+        """Yield ('match', path, [(line, text), ...]) as found, then ('done', summary)"""
+        started = time.time()
+        deadline = started + self.time_budget
+        pool = self.pool.get()
+        batches = self.batches(root)
+        pending = set()
+        summary = {'files': 0, 'binary': 0, 'matches': 0, 'cpu_seconds': 0.0, 'stopped': None}
+        try:
+            while True:
+                while not summary['stopped'] and len(pending) < self.workers * 2:
+                    paths = next(batches, None)
+                    if paths is None:
+                        break
+                    remaining = self.max_matches - summary['matches']
+                    # Batches in flight split what is left of the CPU budget
+                    cpu_share = (self.cpu_budget - summary['cpu_seconds']) / (len(pending) + 1)
+                    try:
+                        pending.add(pool.submit(grep_files, paths, pattern, flags, remaining, deadline, cpu_share,
+                                                self.mmap_threshold))
+                    except concurrent.futures.process.BrokenProcessPool:
+                        self.pool.discard(pool)  # A worker died; start a fresh pool next query
+                        summary['stopped'] = 'error'
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, timeout=max(0.0, deadline - time.time()),
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    summary['stopped'] = summary['stopped'] or 'time'
+                    break
+                for future in done:
+                    try:
+                        results, searched, binary, cpu, stopped = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        self.pool.discard(pool)  # A worker died; start a fresh pool next query
+                        summary['stopped'] = 'error'
+                        continue
+                    summary['files'] += searched
+                    summary['binary'] += binary
+                    summary['cpu_seconds'] += cpu
+                    for path, matches in results:
+                        matches = matches[:self.max_matches - summary['matches']]
+                        if matches:
+                            summary['matches'] += len(matches)
+                            yield 'match', path, matches
+                    if summary['matches'] >= self.max_matches:
+                        stopped = 'matches'
+                    elif summary['cpu_seconds'] >= self.cpu_budget:
+                        stopped = 'cpu'
+                    if stopped and not summary['stopped']:
+                        summary['stopped'] = stopped
+                if summary['stopped']:
+                    break
+        finally:
+            # Queued batches are dropped; running ones stop at their own deadline
+            for future in pending:
+                future.cancel()
+        summary['cpu_seconds'] = round(summary['cpu_seconds'], 3)
+        summary['seconds'] = round(time.time() - started, 3)
+        yield 'done', summary
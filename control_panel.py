@@ -27,6 +27,15 @@ except ImportError:
         print("❌ Main server module not found")
         main_server = None
 
+# Import background log writer (optional)
+try:
+    from app.access_log import AsyncLogWriter
+except ImportError:
+    try:
+        from access_log import AsyncLogWriter
+    except ImportError:
+        AsyncLogWriter = None
+
 class ControlPanelHandler(BaseHTTPRequestHandler):
     server_thread = None
     server_instance = None
@@ -143,10 +152,11 @@ class ControlPanelHandler(BaseHTTPRequestHandler):
             ControlPanelHandler.server_instance.shutdown()
             ControlPanelHandler.server_instance = None
             ControlPanelHandler.server_thread = None
-            # Clean up admin password file
+            # Clean up admin password file and worker processes
             if main_server is not None:
                 try:
                     main_server.cleanup_admin_password()
+                    main_server.shutdown_workers()
                 except AttributeError:
                     pass  # Function may not exist in all versions
             message = "Server stopped successfully!"
@@ -225,11 +235,14 @@ def main():
         class Logger:
             def __init__(self, filename):
                 self.terminal = sys.stdout
-                self.log = open(filename, 'w')
+                if AsyncLogWriter:
+                    # Disk writes happen on a background thread, batched
+                    self.log = AsyncLogWriter(filename, mode='w').start()
+                else:
+                    self.log = open(filename, 'w', buffering=1)
             def write(self, message):
                 self.terminal.write(message)
                 self.log.write(message)
-                self.log.flush()
             def flush(self):
                 pass
         sys.stdout = Logger(log_file)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Runtime diagnostics for the file server - CPU profiling, memory inspection, request timing and slow-request capture
+"""
+import cProfile
+import collections
+import contextlib
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+
+
+def collapse_stack(frame):
+    """Render a frame chain root-first as a collapsed flame-graph stack"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class RequestProfiler:
+    """Profile request threads on demand, either by stack sampling or with cProfile.
+
+    Sampling mode runs a background thread that reads sys._current_frames()
+    at a fixed interval and counts collapsed stacks, prefixed with the route
+    each thread is serving. cProfile mode instruments the next N requests
+    that finish on the chosen route. When neither is running the request
+    path only pays for one attribute check.
+    """
+
+    def __init__(self):
+        self.mode = None  # 'sample' or 'cprofile' while a session is running
+        self.route = None  # Only profile this route when set
+        self.started_at = None
+        self.result = ''  # Text of the last finished session
+        self.result_mode = None
+        self.cprofile_armed = False
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()  # Held by the one request being profiled
+        self._stop = threading.Event()
+        self._sampler = None
+        self._stacks = collections.Counter()
+        self._samples = 0
+        self._stats = None
+        self._remaining = 0
+
+    def status(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'route': self.route,
+                'running_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0,
+                'samples': self._samples,
+                'remaining_requests': self._remaining,
+                'has_result': bool(self.result),
+                'result_mode': self.result_mode,
+            }
+
+    def start_sampling(self, thread_routes, route=None, interval=0.005, duration=30.0):
+        """Sample request threads; thread_routes() returns {thread id: route}"""
+        with self._lock:
+            if self.mode:
+                return False
+            self.mode = 'sample'
+            self.route = route
+            self.started_at = time.time()
+            self._stacks = collections.Counter()
+            self._samples = 0
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler',
+                                             args=(thread_routes, interval, duration), daemon=True)
+            self._sampler.start()
+        return True
+
+    def start_cprofile(self, route=None, requests=10):
+        """Instrument the next `requests` requests that finish on `route`"""
+        with self._lock:
+            if self.mode:
+                return False
+            self.mode = 'cprofile'
+            self.route = route
+            self.started_at = time.time()
+            self._stats = None
+            self._remaining = max(1, requests)
+            self.cprofile_armed = True
+        return True
+
+    def stop(self):
+        """Stop the running session and return its result text"""
+        sampler = self._sampler
+        if self.mode == 'sample' and sampler is not None:
+            self._stop.set()
+            sampler.join(5.0)
+        with self._lock:
+            if self.mode == 'cprofile':
+                self._finish_cprofile()
+        return self.result
+
+    def begin_request(self):
+        """Return an enabled cProfile.Profile if this request should be profiled.
+
+        Requests are profiled one at a time: from Python 3.12 only one
+        profiler can be active per process, so concurrent requests go
+        unprofiled rather than failing.
+        """
+        if not self.cprofile_armed or not self._profiling.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self._profiling.release()  # Some other profiler or debugger is attached
+            return None
+        return profile
+
+    def end_request(self, profile, route):
+        profile.disable()
+        self._profiling.release()
+        with self._lock:
+            if self.mode != 'cprofile' or (self.route and route != self.route):
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._finish_cprofile()
+
+    def _finish_cprofile(self):
+        self.cprofile_armed = False
+        if self._stats is None:
+            self.result = f'# cProfile: no requests captured for route {self.route or "*"}\n'
+        else:
+            buffer = io.StringIO()
+            self._stats.stream = buffer
+            self._stats.sort_stats('cumulative').print_stats(60)
+            self.result = f'# cProfile route={self.route or "*"}\n' + buffer.getvalue()
+        self.result_mode = 'cprofile'
+        self.mode = None
+        self.started_at = None
+        self._remaining = 0
+
+    def _sample_loop(self, thread_routes, interval, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            routes = thread_routes()
+            frames = sys._current_frames()
+            for thread_id, route in routes.items():
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_id:
+                    continue
+                if self.route and route != self.route:
+                    continue
+                self._stacks[f'{route};{collapse_stack(frame)}'] += 1
+            self._samples += 1
+            del frames
+        with self._lock:
+            lines = [f'{stack} {count}' for stack, count in self._stacks.most_common()]
+            self.result = '\n'.join(lines) + '\n' if lines else ''
+            self.result_mode = 'sample'
+            self.mode = None
+            self.started_at = None
+            self._sampler = None
+
+
+class SlowRequestWatchdog:
+    """Capture the stack of any request thread that runs past a threshold.
+
+    A background thread polls in_flight() - {thread id: (started, route,
+    user, path)} with perf_counter start times - and keeps one capture per
+    slow request in a bounded ring buffer, newest last.
+    """
+
+    def __init__(self, in_flight, threshold=5.0, interval=1.0, capacity=50,
+                 ignore_routes=(), on_capture=None):
+        self.in_flight = in_flight
+        self.threshold = threshold
+        self.interval = interval
+        self.ignore_routes = frozenset(ignore_routes)
+        self.on_capture = on_capture
+        self.captures = collections.deque(maxlen=capacity)
+        self._seen = set()  # (thread id, started) already captured
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='slow-request-watchdog', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def recent(self):
+        """Captures newest first"""
+        with self._lock:
+            return list(reversed(self.captures))
+
+    def clear(self):
+        with self._lock:
+            self.captures.clear()
+
+    def check(self):
+        """Capture stacks of requests over the threshold; returns the new captures"""
+        now = time.perf_counter()
+        requests = self.in_flight()
+        frames = None
+        captured = []
+        for thread_id, (started, route, user, path) in requests.items():
+            elapsed = now - started
+            if elapsed < self.threshold or route in self.ignore_routes or (thread_id, started) in self._seen:
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            self._seen.add((thread_id, started))
+            captured.append({
+                'captured_at': time.time(),
+                'thread_id': thread_id,
+                'route': route,
+                'user': user,
+                'path': path,
+                'elapsed': round(elapsed, 3),
+                'stack': ''.join(traceback.format_stack(frame)),
+            })
+        del frames
+        # Forget requests that have finished so the set stays small
+        live = {(thread_id, entry[0]) for thread_id, entry in requests.items()}
+        self._seen &= live
+        if captured:
+            with self._lock:
+                self.captures.extend(captured)
+            if self.on_capture:
+                for capture in captured:
+                    self.on_capture(capture)
+        return captured
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                pass  # Diagnostics must never take the server down
+
+
+class _Phase:
+    __slots__ = ('_timing', '_name', '_start')
+
+    def __init__(self, timing, name):
+        self._timing = timing
+        self._name = name
+
+    def __enter__(self):
+        self._timing._children.append(0.0)
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self._start
+        timing = self._timing
+        nested = timing._children.pop()
+        timing.phases[self._name] = timing.phases.get(self._name, 0.0) + elapsed - nested
+        if timing._children:
+            timing._children[-1] += elapsed
+
+
+class ServerTiming:
+    """Per-request phase durations for the Server-Timing header and access log.
+
+    Phases may nest; time spent in an inner phase is subtracted from the
+    outer one, so the phases add up to no more than the request total.
+    """
+    enabled = True
+
+    def __init__(self, sampled=True):
+        self.sampled = sampled  # False when only timing because of the admin flag
+        self.phases = {}  # phase name -> exclusive seconds, in first-seen order
+        self._children = []
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def header(self, total=None):
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items()]
+        if total is not None:
+            entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+
+
+class _NoTiming:
+    """Stand-in used when a request is not being timed"""
+    enabled = False
+    sampled = False
+    _phase = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+
+NO_TIMING = _NoTiming()
+_current = threading.local()
+
+
+def current_timing():
+    """The ServerTiming of the request running on this thread, for code without a handler"""
+    return getattr(_current, 'timing', NO_TIMING)
+
+
+def set_current_timing(timing):
+    _current.timing = timing
+
+
+def deep_sizeof(obj, max_objects=200000):
+    """Approximate bytes held by obj and everything reachable through containers"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < max_objects:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type):
+            stack.append(item.__dict__)
+    return total
+
+
+def process_rss():
+    """Resident set size in bytes, or None where it cannot be read"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Peak, not current
+    except (ImportError, OSError):
+        return None
+
+
+class MemoryDiagnostics:
+    """tracemalloc snapshots and diffs plus a per-thread view of referenced memory"""
+
+    def __init__(self, max_snapshots=5):
+        self.max_snapshots = max_snapshots
+        self.snapshots = collections.deque(maxlen=max_snapshots)  # (label, taken_at, snapshot)
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        import tracemalloc
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        import tracemalloc
+        with self._lock:
+            self.snapshots.clear()
+        tracemalloc.stop()
+
+    def take_snapshot(self, label=None):
+        """Record a filtered snapshot; returns False while tracemalloc is off"""
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return False
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        with self._lock:
+            self.snapshots.append((label or f'#{len(self.snapshots) + 1}', time.time(), snapshot))
+        return True
+
+    def traced_memory(self):
+        import tracemalloc
+        return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+
+    def top_allocations(self, limit=25):
+        """Top allocation sites in the newest snapshot"""
+        with self._lock:
+            if not self.snapshots:
+                return []
+            _, _, snapshot = self.snapshots[-1]
+        return [(str(stat.traceback), stat.size, stat.count) for stat in snapshot.statistics('lineno')[:limit]]
+
+    def diff(self, limit=25):
+        """Allocation sites that grew most between the two newest snapshots"""
+        with self._lock:
+            if len(self.snapshots) < 2:
+                return []
+            (_, _, older), (_, _, newer) = self.snapshots[-2], self.snapshots[-1]
+        stats = newer.compare_to(older, 'lineno')
+        return [(str(stat.traceback), stat.size_diff, stat.size, stat.count_diff) for stat in stats[:limit]]
+
+    def thread_breakdown(self, thread_routes=None):
+        """Per-thread stack depth and approximate bytes referenced by frame locals.
+
+        CPython does not attribute heap allocations to threads, so this reports
+        what each thread's live frames keep reachable instead.
+        """
+        routes = thread_routes() if thread_routes else {}
+        frames = sys._current_frames()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        breakdown = []
+        for thread_id, frame in frames.items():
+            depth = 0
+            referenced = 0
+            current = frame
+            while current is not None:
+                depth += 1
+                referenced += deep_sizeof(current.f_locals, max_objects=20000)
+                current = current.f_back
+            breakdown.append({
+                'thread': names.get(thread_id, str(thread_id)),
+                'route': routes.get(thread_id),
+                'stack_depth': depth,
+                'referenced_bytes': referenced,
+            })
+        del frames
+        breakdown.sort(key=lambda entry: entry['referenced_bytes'], reverse=True)
+        return breakdown
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Duplicate finder - group identical files under the shared paths by size, partial hash and full hash
+"""
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from app.worker_pool import WorkerPool
+except ImportError:
+    from worker_pool import WorkerPool
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS hashes (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        partial TEXT,
+        full TEXT
+    );
+    CREATE INDEX IF NOT EXISTS hashes_full ON hashes (size, full);
+'''
+
+EDGE_BYTES = 64 * 1024  # Partial hashes cover this much from each end of a file
+CHUNK_BYTES = 1024 * 1024
+BATCH_FILES = 64
+BATCH_BYTES = 256 * 1024 * 1024  # Bytes read per full-hash batch
+
+
+def _digest():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_files(files, full):
+    """Worker task: hash (path, size) pairs; returns [(path, hex digest or None)].
+
+    Partial hashes read the first and last EDGE_BYTES; files no larger than
+    that pair are read whole, so their partial hash is already the full one.
+    """
+    results = []
+    for path, size in files:
+        digest = _digest()
+        try:
+            with open(path, 'rb') as f:
+                if full or size <= 2 * EDGE_BYTES:
+                    for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+                        digest.update(chunk)
+                else:
+                    digest.update(f.read(EDGE_BYTES))
+                    f.seek(size - EDGE_BYTES)
+                    digest.update(f.read(EDGE_BYTES))
+        except OSError:
+            results.append((path, None))
+            continue
+        results.append((path, digest.hexdigest()))
+    return results
+
+
+class DuplicateFinder:
+    """Find groups of identical files, one scan at a time in a background thread.
+
+    Files are bucketed by size; only sizes shared by several files get a
+    partial hash, and only files whose size and partial hash still collide
+    are read in full. Hashes are stored with each file's size and mtime and
+    reused by later scans while both still match. Hard links to the same
+    inode count once, since removing one reclaims nothing.
+    """
+
+    def __init__(self, db_path, roots, workers=0, min_size=1):
+        self.db_path = db_path
+        self.roots = roots  # Callable returning {path: is_file}
+        self.workers = workers or os.cpu_count() or 2
+        self.min_size = min_size
+        self.progress = None  # (stage, done, total) while a scan runs
+        self.last_scan = None  # (finished, seconds, files seen, hashes computed)
+        self.error = None
+        self.pool = WorkerPool(self.workers)  # Forked for each scan and shut down after it
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # Hashes can always be recomputed
+        conn.executescript(SCHEMA)
+        return conn
+
+    def shutdown(self):
+        """Stop a running scan's hashing workers; the scan ends with an error"""
+        self._stopping.set()
+        self.pool.shutdown()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start_scan(self):
+        """Start a scan unless one is already running; returns whether one started"""
+        with self._lock:
+            if self.running:
+                return False
+            self.progress = ('listing', 0, 0)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='duplicate-finder', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self):
+        try:
+            self.error = None
+            self.scan()
+        except (OSError, sqlite3.Error, concurrent.futures.process.BrokenProcessPool) as e:
+            self.error = str(e)
+        except concurrent.futures.CancelledError:
+            self.error = 'Scan stopped'  # Workers shut down with the server
+        finally:
+            self.progress = None
+
+    def _files(self):
+        """{path: (size, mtime_ns)} for regular files under the roots, one path per inode"""
+        files, inodes = {}, set()
+
+        def add(path, st):
+            if st.st_size >= self.min_size and (st.st_dev, st.st_ino) not in inodes:
+                inodes.add((st.st_dev, st.st_ino))
+                files[path] = (st.st_size, st.st_mtime_ns)
+
+        for root, is_file in self.roots().items():
+            if is_file:
+                try:
+                    st = os.stat(root)
+                except OSError:
+                    continue
+                add(root, st)
+                continue
+            pending = [root]
+            while pending:
+                try:
+                    scan = list(os.scandir(pending.pop()))
+                except OSError:
+                    continue
+                for entry in scan:
+                    try:
+                        entry.path.encode('utf-8')
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            add(entry.path, entry.stat(follow_symlinks=False))
+                    except (OSError, UnicodeEncodeError):
+                        continue
+            self.progress = ('listing', len(files), 0)
+        return files
+
+    def _hash(self, pool, stage, files, full):
+        """Hash [(path, size)] across the pool in batches; returns {path: digest}"""
+        batches, batch, batch_bytes = [], [], 0
+        for path, size in files:
+            batch.append((path, size))
+            batch_bytes += size if full else min(size, 2 * EDGE_BYTES)
+            if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            batches.append(batch)
+        digests = {}
+        done = 0
+        self.progress = (stage, 0, len(files))
+        pending = {pool.submit(hash_files, batch, full) for batch in batches}
+        while pending:
+            # Futures cancelled by shutdown() never complete, so the stop is checked between waits
+            finished, pending = concurrent.futures.wait(pending, timeout=1.0,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+            if self._stopping.is_set():
+                raise concurrent.futures.CancelledError()
+            for future in finished:
+                results = future.result()
+                digests.update((path, digest) for path, digest in results if digest is not None)
+                done += len(results)
+                self.progress = (stage, done, len(files))
+        return digests
+
+    def scan(self):
+        started = time.perf_counter()
+        files = self._files()
+        by_size = {}
+        for path, (size, _) in files.items():
+            by_size.setdefault(size, []).append(path)
+        candidates = {path for paths in by_size.values() if len(paths) > 1 for path in paths}
+        conn = self.connect()
+        try:
+            cached = {}
+            for path, size, mtime_ns, partial, full in conn.execute('SELECT path, size, mtime_ns, partial, full FROM hashes'):
+                if files.get(path) == (size, mtime_ns):
+                    cached[path] = (partial, full)
+            partial = {path: cached[path][0] for path in candidates if path in cached and cached[path][0]}
+            full = {path: cached[path][1] for path in candidates if path in cached and cached[path][1]}
+            hashed = 0
+            pool = self.pool.get()
+            try:
+                missing = [(path, files[path][0]) for path in candidates if path not in partial]
+                partial.update(self._hash(pool, 'partial hashes', missing, full=False))
+                hashed += len(missing)
+                for path in partial:
+                    if files[path][0] <= 2 * EDGE_BYTES:
+                        full[path] = partial[path]  # Read whole already
+                by_partial = {}
+                for path, digest in partial.items():
+                    by_partial.setdefault((files[path][0], digest), []).append(path)
+                missing = [(path, files[path][0]) for paths in by_partial.values() if len(paths) > 1
+                           for path in paths if path not in full]
+                full.update(self._hash(pool, 'full hashes', missing, full=True))
+                hashed += len(missing)
+            finally:
+                self.pool.shutdown()
+            self.progress = ('saving', 0, 0)
+            # Only collisions keep a full hash; a file that became unique drops its stale one
+            still_colliding = {path for paths in by_partial.values() if len(paths) > 1 for path in paths}
+            conn.execute('DELETE FROM hashes')
+            conn.executemany('INSERT INTO hashes (path, size, mtime_ns, partial, full) VALUES (?, ?, ?, ?, ?)',
+                             [(path, files[path][0], files[path][1], digest,
+                               full.get(path) if path in still_colliding else None)
+                              for path, digest in partial.items()])
+            conn.commit()
+        finally:
+            conn.close()
+        self.last_scan = (time.time(), time.perf_counter() - started, len(files), hashed)
+
+    def groups(self, limit=100):
+        """(groups, total reclaimable bytes) from the last scan, largest waste first.
+
+        Each group is (size, [paths]); keeping one copy reclaims size * (copies - 1).
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute('SELECT size, full, path FROM hashes WHERE full IS NOT NULL AND (size, full) IN '
+                                '(SELECT size, full FROM hashes WHERE full IS NOT NULL GROUP BY size, full HAVING COUNT(*) > 1) '
+                                'ORDER BY path').fetchall()
+        finally:
+            conn.close()
+        grouped = {}
+        for size, digest, path in rows:
+            grouped.setdefault((size, digest), []).append(path)
+        groups = sorted(((size, paths) for (size, _), paths in grouped.items()),
+                        key=lambda group: group[0] * (len(group[1]) - 1), reverse=True)
+        return groups[:limit], sum(size * (len(paths) - 1) for size, paths in groups)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+File descriptor cache - keep media files open across the many Range requests of one playback
+"""
+import collections
+import contextlib
+import os
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not on Windows
+
+# Without pread, concurrent readers would race on a shared offset, so each request gets its own fd
+SHARED_READS = hasattr(os, 'pread')
+
+
+def fd_ceiling(requested):
+    """Cap the cache below the process fd limit, leaving most of it for sockets and databases"""
+    if resource is None:
+        return requested
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (OSError, ValueError):
+        return requested
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft // 4))
+
+
+class FileHandle:
+    """An open file shared by every request reading the same version of it"""
+
+    __slots__ = ('version', 'fd', 'size', 'refs', 'stale')
+
+    def __init__(self, version, fd, size):
+        self.version = version
+        self.fd = fd
+        self.size = size
+        self.refs = 1
+        self.stale = False  # Closed once the last reader releases it
+
+    def read(self, length, offset):
+        if SHARED_READS:
+            return os.pread(self.fd, length, offset)
+        os.lseek(self.fd, offset, os.SEEK_SET)  # Private fd; nobody else moves the offset
+        return os.read(self.fd, length)
+
+
+class FdCache:
+    """Reference-counted LRU of read-only file descriptors keyed by path, inode, mtime and size.
+
+    Each acquire stats the path; if the file changed, the cached fd is
+    retired and closed when its last reader releases it. Only idle fds
+    are evicted, oldest first, once more than max_open are cached.
+    """
+
+    def __init__(self, max_open=256, on_evict=None):
+        self.max_open = fd_ceiling(max_open)
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()  # path -> FileHandle
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    @contextlib.contextmanager
+    def open(self, path):
+        handle, _ = self.acquire(path)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    def acquire(self, path, st=None):
+        """Return (FileHandle with a reference held, hit); raises OSError like open() would.
+
+        st may be a recent stat of path to validate against instead of a fresh one.
+        """
+        st = st or os.stat(path)
+        version = (st.st_ino, st.st_mtime_ns, st.st_size)
+        to_close = []
+        with self._lock:
+            handle = self._entries.get(path)
+            if handle is not None:
+                if handle.version == version:
+                    handle.refs += 1
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return handle, True
+                self._retire(path, to_close)  # Changed on disk
+            self.misses += 1
+        self._close(to_close)
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0))
+        try:
+            st = os.fstat(fd)
+        except OSError:
+            os.close(fd)
+            raise
+        # Versioned by what was opened, in case the path changed since the stat
+        handle = FileHandle((st.st_ino, st.st_mtime_ns, st.st_size), fd, st.st_size)
+        if not SHARED_READS or self.max_open <= 0:
+            handle.stale = True
+            return handle, False
+        evicted = 0
+        with self._lock:
+            if path in self._entries:
+                self._retire(path, to_close)  # Another request opened it meanwhile
+            self._entries[path] = handle
+            excess = len(self._entries) - self.max_open
+            if excess > 0:
+                # Oldest idle fds go first; ones being read stay until released
+                for idle_path in [p for p, h in self._entries.items() if h.refs == 0][:excess]:
+                    self._retire(idle_path, to_close)
+                    evicted += 1
+            self.evictions += evicted
+        self._close(to_close)
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+        return handle, False
+
+    def release(self, handle):
+        with self._lock:
+            handle.refs -= 1
+            close = handle.refs == 0 and handle.stale
+        if close:
+            os.close(handle.fd)
+
+    def _retire(self, path, to_close):
+        handle = self._entries.pop(path)
+        handle.stale = True
+        if handle.refs == 0:
+            to_close.append(handle.fd)
+
+    @staticmethod
+    def _close(fds):
+        for fd in fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def clear(self):
+        to_close = []
+        with self._lock:
+            for path in list(self._entries):
+                self._retire(path, to_close)
+        self._close(to_close)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+File body cache - keep small, frequently served files in memory
+"""
+import collections
+import os
+import threading
+
+
+class FileBodyCache:
+    """LRU cache of whole file bodies, bounded by total bytes.
+
+    Entries are validated against the file's (inode, size, mtime) on every
+    lookup, so a hit costs one stat and a replaced or edited file is read
+    again. Files larger than max_file_bytes are read but never cached.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_file_bytes=256 * 1024, on_evict=None):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.on_evict = on_evict
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()  # path -> (version, body)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def read(self, path, st=None):
+        """Return (memoryview of the body, hit); raises OSError like open() would.
+
+        st may be a recent stat of path to validate against instead of a fresh one.
+        """
+        st = st or os.stat(path)
+        version = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return memoryview(entry[1]), True
+                self._drop(path)  # Changed on disk since it was cached
+            self.misses += 1
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            body = f.read()
+        # Versioned by what was read, so a file changed between stat and open is cached correctly
+        version = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if len(body) == st.st_size and 0 < len(body) <= self.max_file_bytes <= self.max_bytes:
+            self._store(path, version, body)
+        return memoryview(body), False
+
+    def _store(self, path, version, body):
+        evicted = 0
+        with self._lock:
+            if path in self._entries:
+                self._drop(path)
+            self._entries[path] = (version, body)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                evicted += 1
+            self.evictions += evicted
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+
+    def _drop(self, path):
+        _, body = self._entries.pop(path)
+        self.bytes -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Folder sizes - recursive sizes and file counts of shared trees, aggregated in the background in SQLite
+"""
+import heapq
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+try:
+    from app.sqlite_readers import ReadConnections
+except ImportError:
+    from sqlite_readers import ReadConnections
+
+try:
+    from app.tree_paths import roots_top_level, subtree_condition
+except ImportError:
+    from tree_paths import roots_top_level, subtree_condition
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS folders (
+        path TEXT PRIMARY KEY,
+        parent TEXT NOT NULL,
+        inode INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        files INTEGER NOT NULL,
+        total_size INTEGER NOT NULL DEFAULT 0,
+        total_files INTEGER NOT NULL DEFAULT 0,
+        total_folders INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+    CREATE INDEX IF NOT EXISTS folders_total_size ON folders (total_size);
+    CREATE TABLE IF NOT EXISTS large_files (
+        path TEXT PRIMARY KEY,
+        parent TEXT NOT NULL,
+        size INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS large_files_parent ON large_files (parent);
+    CREATE INDEX IF NOT EXISTS large_files_size ON large_files (size);
+    CREATE TABLE IF NOT EXISTS roots (
+        path TEXT PRIMARY KEY
+    );
+'''
+
+COMMIT_EVERY = 2000  # Folders written per transaction while aggregating
+
+
+class FolderSizes:
+    """Recursive size, file and folder counts for every folder under the shared paths.
+
+    Each folder row keeps what sits directly inside it, keyed by the
+    folder's (inode, mtime), plus the totals of its whole subtree. A pass
+    only re-lists folders whose key changed, then recomputes totals for
+    those folders and their ancestors, deepest first. Files grown or shrunk
+    in place don't touch their folder's mtime; a watcher reports them
+    through changed(). The largest files of each folder are kept for the
+    storage report.
+    """
+
+    def __init__(self, db_path, roots, interval=300.0, keep_largest=20):
+        self.db_path = db_path
+        self.roots = roots  # Callable returning {path: is_file}; only folders are aggregated
+        self.interval = interval
+        self.keep_largest = keep_largest
+        self.last_pass = None  # (finished, seconds, folders listed)
+        self.aggregating = False
+        self._full = True
+        self._dirty = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.readers = ReadConnections(db_path)  # Listings; no PRAGMAs, which only the writer needs
+        self._thread = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')  # Listings keep reading while totals are written
+        conn.execute('PRAGMA synchronous=NORMAL')  # Sizes can always be recomputed from disk
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                conn = self.connect()
+                try:
+                    conn.executescript(SCHEMA)
+                finally:
+                    conn.close()
+                self._thread = threading.Thread(target=self._run, name='folder-sizes', daemon=True)
+                self._thread.start()
+        return self
+
+    def refresh(self):
+        """Run a full pass now instead of waiting for the interval"""
+        self._full = True
+        self._wake.set()
+
+    def changed(self, folders):
+        """Re-list these folders soon, even if their mtime looks unchanged"""
+        with self._lock:
+            self._dirty.update(folders)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                if self._full:
+                    self._full = False
+                    self.update()
+                else:
+                    self.update_changed()
+            except (OSError, sqlite3.Error):
+                pass  # Try again next interval
+            if not self._wake.wait(self.interval):
+                self._full = True
+            self._wake.clear()
+
+    def update(self):
+        """Bring every folder's totals in line with the current roots and the filesystem"""
+        started = time.perf_counter()
+        self.aggregating = True
+        conn = self.connect()
+        try:
+            roots = [path for path, is_file in roots_top_level(self.roots()).items() if not is_file]
+            stored = {row[0] for row in conn.execute('SELECT path FROM roots')}
+            for path in stored - set(roots):
+                self._forget(conn, path)
+                conn.execute('DELETE FROM roots WHERE path = ?', (path,))
+            listed = 0
+            for root in roots:
+                if root not in stored:
+                    conn.execute('INSERT INTO roots (path) VALUES (?)', (root,))
+                changed = self._walk(conn, root, [root], deep=True)
+                self._total(conn, root, changed)
+                listed += len(changed)
+            conn.commit()
+        finally:
+            conn.close()
+            self.aggregating = False
+        self.last_pass = (time.time(), time.perf_counter() - started, listed)
+
+    def update_changed(self):
+        """Re-list the folders reported through changed() and fix up totals above them"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        conn = self.connect()
+        try:
+            roots = [row[0] for row in conn.execute('SELECT path FROM roots')]
+            by_root = {}
+            for path in dirty:
+                for root in roots:
+                    if path == root or path.startswith(root.rstrip('/') + '/'):
+                        by_root.setdefault(root, []).append(path)
+                        break
+            for root, folders in by_root.items():
+                # Clearing the key forces a re-list even when the mtime didn't move
+                conn.executemany('UPDATE folders SET mtime_ns = -1 WHERE path = ?', [(path,) for path in folders])
+                self._total(conn, root, self._walk(conn, root, folders, deep=False))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _walk(self, conn, root, pending, deep=True):
+        """Re-list folders in pending and below whose key changed; returns the paths whose contents changed.
+
+        Folders with an unchanged key are only descended into when deep.
+        """
+        changed = set()
+        uncommitted = 0
+        while pending:
+            path = pending.pop()
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            known = conn.execute('SELECT inode, mtime_ns FROM folders WHERE path = ?', (path,)).fetchone()
+            if st is None or not stat.S_ISDIR(st.st_mode):
+                if known:
+                    self._forget(conn, path)
+                    changed.add(os.path.dirname(path) if path != root else path)
+                continue
+            if known == (st.st_ino, st.st_mtime_ns):
+                if deep:
+                    pending.extend(row[0] for row in conn.execute('SELECT path FROM folders WHERE parent = ?', (path,)))
+                continue
+            pending.extend(self._list(conn, path, st))
+            changed.add(path)
+            uncommitted += 1
+            if uncommitted >= COMMIT_EVERY:
+                conn.commit()
+                uncommitted = 0
+        return changed
+
+    def _list(self, conn, path, st):
+        """Store what sits directly in one folder; returns its subfolders"""
+        size = files = 0
+        folders, largest = [], []
+        try:
+            scan = list(os.scandir(path))
+        except OSError:
+            scan = []  # Unreadable now; counts as empty
+        for entry in scan:
+            try:
+                entry.path.encode('utf-8')  # Undecodable names can't be listed either
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                    continue
+                entry_size = entry.stat(follow_symlinks=False).st_size
+            except (OSError, UnicodeEncodeError):
+                continue
+            size += entry_size
+            files += 1
+            largest.append((entry_size, entry.path))
+        found = set(folders)
+        for (child,) in conn.execute('SELECT path FROM folders WHERE parent = ?', (path,)).fetchall():
+            if child not in found:
+                self._forget(conn, child)
+        conn.execute('INSERT INTO folders (path, parent, inode, mtime_ns, size, files) VALUES (?, ?, ?, ?, ?, ?) '
+                     'ON CONFLICT (path) DO UPDATE SET inode = excluded.inode, mtime_ns = excluded.mtime_ns, '
+                     'size = excluded.size, files = excluded.files',
+                     (path, os.path.dirname(path), st.st_ino, st.st_mtime_ns, size, files))
+        conn.execute('DELETE FROM large_files WHERE parent = ?', (path,))
+        conn.executemany('INSERT INTO large_files (path, parent, size) VALUES (?, ?, ?)',
+                         [(file_path, path, file_size) for file_size, file_path in
+                          heapq.nlargest(self.keep_largest, largest)])
+        return folders
+
+    @staticmethod
+    def _total(conn, root, changed):
+        """Recompute totals of the changed folders and every ancestor up to root, deepest first"""
+        affected = set()
+        for path in changed:
+            while path not in affected:
+                affected.add(path)
+                if path == root or not path.startswith(root.rstrip('/') + '/'):
+                    break
+                path = os.path.dirname(path)
+        for path in sorted(affected, key=lambda path: path.count('/'), reverse=True):
+            conn.execute('UPDATE folders SET '
+                         'total_size = size + (SELECT COALESCE(SUM(total_size), 0) FROM folders AS child WHERE child.parent = folders.path), '
+                         'total_files = files + (SELECT COALESCE(SUM(total_files), 0) FROM folders AS child WHERE child.parent = folders.path), '
+                         'total_folders = (SELECT COUNT(*) + COALESCE(SUM(total_folders), 0) FROM folders AS child WHERE child.parent = folders.path) '
+                         'WHERE path = ?', (path,))
+
+    @staticmethod
+    def _forget(conn, path):
+        condition, params = subtree_condition(path)
+        conn.execute(f'DELETE FROM folders WHERE {condition}', params)
+        conn.execute(f'DELETE FROM large_files WHERE {condition}', params)
+
+    def children(self, folder):
+        """{subfolder path: (total size, total files)} for the folders directly inside folder"""
+        with self.readers.connection() as conn:
+            return {path: (size, files) for path, size, files in
+                    conn.execute('SELECT path, total_size, total_files FROM folders WHERE parent = ?', (folder,))}
+
+    def report(self, limit=20):
+        """(roots, largest folders, largest files); roots and folders as (path, size, files, folders) tuples"""
+        conn = self.connect()
+        try:
+            columns = 'path, total_size, total_files, total_folders'
+            roots = conn.execute(f'SELECT {columns} FROM folders WHERE path IN (SELECT path FROM roots) '
+                                 f'ORDER BY total_size DESC').fetchall()
+            folders = conn.execute(f'SELECT {columns} FROM folders WHERE path NOT IN (SELECT path FROM roots) '
+                                   f'ORDER BY total_size DESC LIMIT ?', (limit,)).fetchall()
+            files = conn.execute('SELECT path, size FROM large_files ORDER BY size DESC LIMIT ?', (limit,)).fetchall()
+            return roots, folders, files
+        finally:
+            conn.close()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Request lanes - keep interactive pages responsive while bulk transfers saturate the server
+"""
+import os
+import sys
+import threading
+import time
+
+_thread_state = threading.local()
+
+
+class Lane:
+    """Admission control for one class of requests.
+
+    At most `limit` requests run at once (0 = unlimited); others wait up to
+    `queue_seconds` for a slot and are refused after that. Threads admitted
+    to a lane with a positive `nice` are deprioritised by the OS scheduler.
+    """
+
+    def __init__(self, name, limit=0, queue_seconds=5.0, nice=0):
+        self.name = name
+        self.limit = limit
+        self.queue_seconds = queue_seconds
+        self.nice = nice
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a slot; returns False if none freed up in time"""
+        with self._cond:
+            if self.limit and self.active >= self.limit:
+                deadline = time.monotonic() + self.queue_seconds
+                self.waiting += 1
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            return False
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+        if self.nice:
+            lower_thread_priority(self.nice)
+        return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+def lower_thread_priority(nice):
+    """Raise the calling thread's nice value where the OS supports per-thread priorities.
+
+    Only Linux applies setpriority() to a single thread. An unprivileged
+    process cannot lower a nice value again, so the setting sticks to the
+    connection thread; connections that carried a bulk transfer nearly
+    always carry more of the same.
+    """
+    if getattr(_thread_state, 'nice', 0) >= nice or not sys.platform.startswith('linux'):
+        return
+    try:
+        thread_id = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, thread_id, os.getpriority(os.PRIO_PROCESS, thread_id) + nice)
+        _thread_state.nice = nice
+    except (AttributeError, OSError):
+        _thread_state.nice = nice  # Not supported here; don't retry on every request
+
+
+class RequestLanes:
+    """The interactive and bulk lanes, each with independent limits"""
+
+    def __init__(self, limits, queue_seconds, bulk_nice=0):
+        self.lanes = {
+            'interactive': Lane('interactive', limits.get('interactive', 0), queue_seconds.get('interactive', 10.0)),
+            'bulk': Lane('bulk', limits.get('bulk', 0), queue_seconds.get('bulk', 5.0), bulk_nice),
+        }
+
+    def get(self, name):
+        return self.lanes[name]
+
+    def status(self):
+        return [(lane.name, lane.active, lane.limit, lane.waiting, lane.rejected) for lane in self.lanes.values()]
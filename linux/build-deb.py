@@ -39,6 +39,27 @@ def build_deb_package():
         ('../control_panel.py', f'{build_dir}/usr/share/fileshare/control_panel.py'),
         ('../config.py', f'{build_dir}/usr/share/fileshare/config.py'),
         ('../remote_control.py', f'{build_dir}/usr/share/fileshare/remote_control.py'),
+        ('../metrics.py', f'{build_dir}/usr/share/fileshare/metrics.py'),
+        ('../access_log.py', f'{build_dir}/usr/share/fileshare/access_log.py'),
+        ('../diagnostics.py', f'{build_dir}/usr/share/fileshare/diagnostics.py'),
+        ('../bandwidth.py', f'{build_dir}/usr/share/fileshare/bandwidth.py'),
+        ('../lanes.py', f'{build_dir}/usr/share/fileshare/lanes.py'),
+        ('../timeouts.py', f'{build_dir}/usr/share/fileshare/timeouts.py'),
+        ('../search_index.py', f'{build_dir}/usr/share/fileshare/search_index.py'),
+        ('../content_search.py', f'{build_dir}/usr/share/fileshare/content_search.py'),
+        ('../watcher.py', f'{build_dir}/usr/share/fileshare/watcher.py'),
+        ('../folder_sizes.py', f'{build_dir}/usr/share/fileshare/folder_sizes.py'),
+        ('../duplicates.py', f'{build_dir}/usr/share/fileshare/duplicates.py'),
+        ('../checksums.py', f'{build_dir}/usr/share/fileshare/checksums.py'),
+        ('../file_cache.py', f'{build_dir}/usr/share/fileshare/file_cache.py'),
+        ('../fd_cache.py', f'{build_dir}/usr/share/fileshare/fd_cache.py'),
+        ('../stat_cache.py', f'{build_dir}/usr/share/fileshare/stat_cache.py'),
+        ('../readahead.py', f'{build_dir}/usr/share/fileshare/readahead.py'),
+        ('../buffers.py', f'{build_dir}/usr/share/fileshare/buffers.py'),
+        ('../socket_tuning.py', f'{build_dir}/usr/share/fileshare/socket_tuning.py'),
+        ('../worker_pool.py', f'{build_dir}/usr/share/fileshare/worker_pool.py'),
+        ('../sqlite_readers.py', f'{build_dir}/usr/share/fileshare/sqlite_readers.py'),
+        ('../tree_paths.py', f'{build_dir}/usr/share/fileshare/tree_paths.py'),
     ]
     
     for src, dst in source_files:
@@ -43,6 +43,27 @@ def build_rpm_package():
         ('../control_panel.py', f'{source_dir}/control_panel.py'),
         ('../config.py', f'{source_dir}/config.py'),
         ('../remote_control.py', f'{source_dir}/remote_control.py'),
+        ('../metrics.py', f'{source_dir}/metrics.py'),
+        ('../access_log.py', f'{source_dir}/access_log.py'),
+        ('../diagnostics.py', f'{source_dir}/diagnostics.py'),
+        ('../bandwidth.py', f'{source_dir}/bandwidth.py'),
+        ('../lanes.py', f'{source_dir}/lanes.py'),
+        ('../timeouts.py', f'{source_dir}/timeouts.py'),
+        ('../search_index.py', f'{source_dir}/search_index.py'),
+        ('../content_search.py', f'{source_dir}/content_search.py'),
+        ('../watcher.py', f'{source_dir}/watcher.py'),
+        ('../folder_sizes.py', f'{source_dir}/folder_sizes.py'),
+        ('../duplicates.py', f'{source_dir}/duplicates.py'),
+        ('../checksums.py', f'{source_dir}/checksums.py'),
+        ('../file_cache.py', f'{source_dir}/file_cache.py'),
+        ('../fd_cache.py', f'{source_dir}/fd_cache.py'),
+        ('../stat_cache.py', f'{source_dir}/stat_cache.py'),
+        ('../readahead.py', f'{source_dir}/readahead.py'),
+        ('../buffers.py', f'{source_dir}/buffers.py'),
+        ('../socket_tuning.py', f'{source_dir}/socket_tuning.py'),
+        ('../worker_pool.py', f'{source_dir}/worker_pool.py'),
+        ('../sqlite_readers.py', f'{source_dir}/sqlite_readers.py'),
+        ('../tree_paths.py', f'{source_dir}/tree_paths.py'),
     ]
     
     for src, dst in source_files:
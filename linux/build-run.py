@@ -22,6 +22,27 @@ def build_run_installer():
         '../control_panel.py': 'control_panel.py',
         '../config.py': 'config.py', 
         '../remote_control.py': 'remote_control.py',
+        '../metrics.py': 'metrics.py',
+        '../access_log.py': 'access_log.py',
+        '../diagnostics.py': 'diagnostics.py',
+        '../bandwidth.py': 'bandwidth.py',
+        '../lanes.py': 'lanes.py',
+        '../timeouts.py': 'timeouts.py',
+        '../search_index.py': 'search_index.py',
+        '../content_search.py': 'content_search.py',
+        '../watcher.py': 'watcher.py',
+        '../folder_sizes.py': 'folder_sizes.py',
+        '../duplicates.py': 'duplicates.py',
+        '../checksums.py': 'checksums.py',
+        '../file_cache.py': 'file_cache.py',
+        '../fd_cache.py': 'fd_cache.py',
+        '../stat_cache.py': 'stat_cache.py',
+        '../readahead.py': 'readahead.py',
+        '../buffers.py': 'buffers.py',
+        '../socket_tuning.py': 'socket_tuning.py',
+        '../worker_pool.py': 'worker_pool.py',
+        '../sqlite_readers.py': 'sqlite_readers.py',
+        '../tree_paths.py': 'tree_paths.py',
         '../templates/admin.html': 'templates/admin.html',
         '../templates/control_panel.html': 'templates/control_panel.html',
         '../templates/directory.html': 'templates/directory.html',
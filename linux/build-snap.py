@@ -28,6 +28,27 @@ def build_snap_package():
         ('../control_panel.py', f'{app_dir}/control_panel.py'),
         ('../config.py', f'{app_dir}/config.py'),
         ('../remote_control.py', f'{app_dir}/remote_control.py'),
+        ('../metrics.py', f'{app_dir}/metrics.py'),
+        ('../access_log.py', f'{app_dir}/access_log.py'),
+        ('../diagnostics.py', f'{app_dir}/diagnostics.py'),
+        ('../bandwidth.py', f'{app_dir}/bandwidth.py'),
+        ('../lanes.py', f'{app_dir}/lanes.py'),
+        ('../timeouts.py', f'{app_dir}/timeouts.py'),
+        ('../search_index.py', f'{app_dir}/search_index.py'),
+        ('../content_search.py', f'{app_dir}/content_search.py'),
+        ('../watcher.py', f'{app_dir}/watcher.py'),
+        ('../folder_sizes.py', f'{app_dir}/folder_sizes.py'),
+        ('../duplicates.py', f'{app_dir}/duplicates.py'),
+        ('../checksums.py', f'{app_dir}/checksums.py'),
+        ('../file_cache.py', f'{app_dir}/file_cache.py'),
+        ('../fd_cache.py', f'{app_dir}/fd_cache.py'),
+        ('../stat_cache.py', f'{app_dir}/stat_cache.py'),
+        ('../readahead.py', f'{app_dir}/readahead.py'),
+        ('../buffers.py', f'{app_dir}/buffers.py'),
+        ('../socket_tuning.py', f'{app_dir}/socket_tuning.py'),
+        ('../worker_pool.py', f'{app_dir}/worker_pool.py'),
+        ('../sqlite_readers.py', f'{app_dir}/sqlite_readers.py'),
+        ('../tree_paths.py', f'{app_dir}/tree_paths.py'),
     ]
     
     for src, dst in source_files:
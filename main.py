@@ -9,28 +9,282 @@ import secrets
 import hashlib
 import time
 import sqlite3
+import threading
+import json
+import math
+import random
+import re
+import signal
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from socketserver import ThreadingMixIn
 import urllib.parse
+from html import escape as html_escape
 
 # Import configuration
 try:
     from app.config import Config
 except ImportError:
-    # Fallback configuration if config.py not found
-    class Config:
-        DEFAULT_PORT = 8000
-        TOKEN_EXPIRY_HOURS = 1
-        RATE_LIMIT_ATTEMPTS = 5
-        RATE_LIMIT_WINDOW_MINUTES = 2
-        SHARED_PATHS_CACHE_SECONDS = 30
-        HOST = '0.0.0.0'
-        
-        @classmethod
-        def get_db_path(cls):
-            if getattr(sys, 'frozen', False):
-                return os.path.expanduser('~/fileShare_users.db')
-            return os.environ.get('FILESHARE_DB_PATH', 'users.db')
+    try:
+        from config import Config
+    except ImportError:
+        # Fallback configuration if config.py not found
+        class Config:
+            DEFAULT_PORT = 8000
+            TOKEN_EXPIRY_HOURS = 1
+            RATE_LIMIT_ATTEMPTS = 5
+            RATE_LIMIT_WINDOW_MINUTES = 2
+            SHARED_PATHS_CACHE_SECONDS = 30
+            HOST = '0.0.0.0'
+            POST_BODY_LIMITS = {'/login': 4096, '/register': 4096}
+            POST_BODY_TIMEOUT_SECONDS = 10
+            IDLE_TIMEOUT_SECONDS = 15
+            HEADER_TIMEOUT_SECONDS = 10
+            MIN_SEND_RATE_BYTES = 1024
+            SEND_STALL_GRACE_SECONDS = 60
+            SOCKET_PROFILE = 'balanced'
+            SOCKET_OPTIONS = {}
+            ACCESS_LOG_MAX_BYTES = 10 * 1024 * 1024
+            ACCESS_LOG_BACKUPS = 3
+            ACCESS_LOG_QUEUE_SIZE = 10000
+            SERVER_TIMING_SAMPLE_RATE = 0.0
+            SERVER_TIMING_ADMIN = False
+            SLOW_REQUEST_SECONDS = 5.0
+            SLOW_REQUEST_CHECK_INTERVAL = 1.0
+            SLOW_REQUEST_HISTORY = 50
+            SLOW_REQUEST_IGNORE_ROUTES = ('stream', 'download', 'grep')
+            BANDWIDTH_GLOBAL_LIMIT = 0
+            BANDWIDTH_USER_LIMIT = 0
+            BANDWIDTH_IP_LIMIT = 0
+            BANDWIDTH_WEIGHTS = {'media': 4, 'bulk': 1}
+            MAX_STREAMS_PER_SESSION = 8
+            MAX_STREAMS_PER_IP = 16
+            MAX_STREAMS_PER_FILE = 4
+            MAX_STREAMS_TOTAL = 100
+            STREAM_RETRY_AFTER_SECONDS = 5
+            LANE_LIMITS = {'interactive': 64, 'bulk': 32}
+            LANE_QUEUE_SECONDS = {'interactive': 10.0, 'bulk': 5.0}
+            BULK_LANE_NICE = 10
+            SEARCH_INDEX_INTERVAL_SECONDS = 60
+            SEARCH_INDEX_ADMIN_ROOTS = ()
+            SEARCH_RESULTS_LIMIT = 100
+            FOLDER_SIZES_INTERVAL_SECONDS = 300
+            STORAGE_REPORT_LIMIT = 20
+            DUPLICATES_WORKERS = 0
+            DUPLICATES_MIN_BYTES = 1024
+            DUPLICATES_REPORT_LIMIT = 100
+            WATCHER_ENABLED = True
+            WATCHER_INTERVAL_SECONDS = 5
+            WATCHER_DEBOUNCE_SECONDS = 0.5
+            CHANGE_FEED_CAPACITY = 10000
+            CHANGE_FEED_PAGE_SIZE = 1000
+            GREP_WORKERS = 0
+            GREP_TIME_BUDGET_SECONDS = 10
+            GREP_CPU_BUDGET_SECONDS = 20
+            GREP_MAX_MATCHES = 1000
+            GREP_MMAP_THRESHOLD = 1024 * 1024
+            STAT_CACHE_TTL_SECONDS = 1.0
+            STAT_CACHE_MAX_ENTRIES = 10000
+            FILE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+            FILE_CACHE_MAX_FILE_BYTES = 256 * 1024
+            FD_CACHE_MAX_OPEN = 256
+            READAHEAD_WINDOW_BYTES = {'stream': 4 * 1024 * 1024, 'download': 0}
+            READAHEAD_SEQUENTIAL = {'stream': True, 'download': True}
+            READAHEAD_DROP_AFTER = {'stream': False, 'download': True}
+            MAX_CHUNK_SIZE = 1024 * 1024
+            SMALL_CHUNK_SIZE = 8192
+            CHUNK_TARGET_SECONDS = 0.05
+            CHECKSUM_WORKERS = 2
+            CHECKSUM_WAIT_SECONDS = 30
+            CHECKSUM_DIGEST_HEADERS = True
+            
+            @classmethod
+            def get_db_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_users.db')
+                return os.environ.get('FILESHARE_DB_PATH', 'users.db')
+            
+            @classmethod
+            def get_access_log_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_access.log')
+                return os.environ.get('FILESHARE_ACCESS_LOG', 'access.log')
+            
+            @classmethod
+            def get_search_index_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_search.db')
+                return os.environ.get('FILESHARE_SEARCH_INDEX', 'search_index.db')
+            
+            @classmethod
+            def get_folder_sizes_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_sizes.db')
+                return os.environ.get('FILESHARE_FOLDER_SIZES', 'folder_sizes.db')
+            
+            @classmethod
+            def get_duplicates_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_duplicates.db')
+                return os.environ.get('FILESHARE_DUPLICATES', 'duplicates.db')
+            
+            @classmethod
+            def get_checksums_path(cls):
+                if getattr(sys, 'frozen', False):
+                    return os.path.expanduser('~/fileShare_checksums.db')
+                return os.environ.get('FILESHARE_CHECKSUMS', 'checksums.db')
+
+# Import metrics registry
+try:
+    from app import metrics
+except ImportError:
+    import metrics
+
+# Import structured access log
+try:
+    from app.access_log import AccessLog
+except ImportError:
+    from access_log import AccessLog
+
+ACCESS_LOG = AccessLog(Config.get_access_log_path(),
+                       max_bytes=Config.ACCESS_LOG_MAX_BYTES,
+                       backup_count=Config.ACCESS_LOG_BACKUPS,
+                       queue_size=Config.ACCESS_LOG_QUEUE_SIZE,
+                       on_drop=metrics.LOG_EVENTS_DROPPED.inc)
+
+# Import runtime diagnostics
+try:
+    from app.diagnostics import (MemoryDiagnostics, NO_TIMING, RequestProfiler, ServerTiming, SlowRequestWatchdog,
+                                 current_timing, deep_sizeof, process_rss, set_current_timing)
+except ImportError:
+    from diagnostics import (MemoryDiagnostics, NO_TIMING, RequestProfiler, ServerTiming, SlowRequestWatchdog,
+                             current_timing, deep_sizeof, process_rss, set_current_timing)
+
+PROFILER = RequestProfiler()
+MEMORY = MemoryDiagnostics()
+
+# Import bandwidth shaping
+try:
+    from app.bandwidth import BandwidthScheduler, StreamLimits
+except ImportError:
+    from bandwidth import BandwidthScheduler, StreamLimits
+
+BANDWIDTH = BandwidthScheduler(global_rate=Config.BANDWIDTH_GLOBAL_LIMIT,
+                               user_rate=Config.BANDWIDTH_USER_LIMIT,
+                               ip_rate=Config.BANDWIDTH_IP_LIMIT,
+                               weights=Config.BANDWIDTH_WEIGHTS)
+STREAM_LIMITS = StreamLimits(per_session=Config.MAX_STREAMS_PER_SESSION,
+                             per_ip=Config.MAX_STREAMS_PER_IP,
+                             per_file=Config.MAX_STREAMS_PER_FILE,
+                             total=Config.MAX_STREAMS_TOTAL)
+
+# Import request lanes
+try:
+    from app.lanes import RequestLanes
+except ImportError:
+    from lanes import RequestLanes
+
+LANES = RequestLanes(Config.LANE_LIMITS, Config.LANE_QUEUE_SECONDS, bulk_nice=Config.BULK_LANE_NICE)
+
+# Import connection deadlines
+try:
+    from app.timeouts import DeadlineReaper
+except ImportError:
+    from timeouts import DeadlineReaper
+
+REAPER = DeadlineReaper(on_expire=lambda phase: metrics.CONNECTION_TIMEOUTS.labels(phase).inc())
+
+# Import filename search index
+try:
+    from app.search_index import SearchIndex
+except ImportError:
+    from search_index import SearchIndex
+
+# Import folder size aggregator
+try:
+    from app.folder_sizes import FolderSizes
+except ImportError:
+    from folder_sizes import FolderSizes
+
+# Import duplicate finder
+try:
+    from app.duplicates import DuplicateFinder
+except ImportError:
+    from duplicates import DuplicateFinder
+
+# Import filesystem watcher
+try:
+    from app.watcher import FileWatcher
+except ImportError:
+    from watcher import FileWatcher
+
+# Import content search
+try:
+    from app.content_search import ContentSearch
+except ImportError:
+    from content_search import ContentSearch
+
+GREP = ContentSearch(workers=Config.GREP_WORKERS,
+                     time_budget=Config.GREP_TIME_BUDGET_SECONDS,
+                     cpu_budget=Config.GREP_CPU_BUDGET_SECONDS,
+                     max_matches=Config.GREP_MAX_MATCHES,
+                     mmap_threshold=Config.GREP_MMAP_THRESHOLD)
+
+# Import stat cache
+try:
+    from app.stat_cache import StatCache
+except ImportError:
+    from stat_cache import StatCache
+
+STAT_CACHE = StatCache(ttl=Config.STAT_CACHE_TTL_SECONDS, max_entries=Config.STAT_CACHE_MAX_ENTRIES)
+metrics.STAT_CACHE_ENTRIES.callback = lambda: len(STAT_CACHE)
+
+# Import file body cache
+try:
+    from app.file_cache import FileBodyCache
+except ImportError:
+    from file_cache import FileBodyCache
+
+FILE_CACHE = FileBodyCache(max_bytes=Config.FILE_CACHE_MAX_BYTES,
+                           max_file_bytes=Config.FILE_CACHE_MAX_FILE_BYTES,
+                           on_evict=metrics.FILE_CACHE_EVICTIONS.inc)
+metrics.FILE_CACHE_BYTES.callback = lambda: FILE_CACHE.bytes
+
+# Import file descriptor cache
+try:
+    from app.fd_cache import FdCache
+except ImportError:
+    from fd_cache import FdCache
+
+FD_CACHE = FdCache(max_open=Config.FD_CACHE_MAX_OPEN, on_evict=metrics.FD_CACHE_EVICTIONS.inc)
+metrics.FD_CACHE_OPEN.callback = lambda: len(FD_CACHE)
+
+# Import readahead hints
+try:
+    from app.readahead import Prefetcher
+except ImportError:
+    from readahead import Prefetcher
+
+# Import transfer chunk sizing
+try:
+    from app.buffers import ChunkSizer
+except ImportError:
+    from buffers import ChunkSizer
+
+# Import socket tuning
+try:
+    from app.socket_tuning import get_profile as get_socket_profile, set_cork, set_nodelay
+except ImportError:
+    from socket_tuning import get_profile as get_socket_profile, set_cork, set_nodelay
+
+SOCKET_PROFILE = get_socket_profile(Config.SOCKET_PROFILE, Config.SOCKET_OPTIONS)
+
+# Import checksum service
+try:
+    from app.checksums import ChecksumCache, ALGORITHMS as CHECKSUM_ALGORITHMS, DIGEST_FIELD_NAMES, digest_fields
+except ImportError:
+    from checksums import ChecksumCache, ALGORITHMS as CHECKSUM_ALGORITHMS, DIGEST_FIELD_NAMES, digest_fields
+
+CHECKSUMS = ChecksumCache(Config.get_checksums_path(), workers=Config.CHECKSUM_WORKERS)
 
 # Import remote control (optional)
 try:
@@ -41,6 +295,85 @@ except ImportError:
     except ImportError:
         RemoteControl = None
 
+class UrlEncodedFormParser:
+    """Incremental application/x-www-form-urlencoded parser fed one chunk at a time"""
+    
+    def __init__(self, max_fields=16):
+        self.max_fields = max_fields
+        self.fields = {}
+        self._pending = b''
+        self._field_count = 0
+    
+    def feed(self, data):
+        """Parse every complete name=value pair received so far"""
+        self._pending += data
+        *pairs, self._pending = self._pending.split(b'&')
+        for pair in pairs:
+            self._add_pair(pair)
+    
+    def close(self):
+        """Parse the trailing pair and return the collected fields"""
+        self._add_pair(self._pending)
+        self._pending = b''
+        return self.fields
+    
+    def _add_pair(self, pair):
+        if not pair:
+            return
+        self._field_count += 1
+        if self._field_count > self.max_fields:
+            raise ValueError("Too many form fields")
+        name, _, value = pair.decode('latin-1').partition('=')
+        name = urllib.parse.unquote_plus(name, errors='replace')
+        # Keep the first value like parse_qs(...)[0] did
+        self.fields.setdefault(name, urllib.parse.unquote_plus(value, errors='replace'))
+
+class CountingWriter:
+    """Wrap a response stream, count the bytes written and enforce a minimum send rate"""
+    
+    def __init__(self, raw, sock=None, min_rate=0, grace=0):
+        self.raw = raw
+        self.sock = sock
+        self.min_rate = min_rate
+        self.grace = grace
+        self.bytes_written = 0
+        self.timing = NO_TIMING
+        self.corked = False
+        self.uncork_on_write = False  # Set once the headers are out; the first body write releases them
+    
+    def cork(self):
+        """Hold partial segments back (TCP_CORK) so the headers can share a segment with the body"""
+        if self.sock is not None and not self.corked:
+            self.corked = set_cork(self.sock, True)
+        return self.corked
+    
+    def uncork(self):
+        self.uncork_on_write = False
+        if self.corked:
+            self.corked = False
+            set_cork(self.sock, False)
+    
+    def write(self, data):
+        if self.sock is not None and self.min_rate:
+            # sendall() applies the socket timeout to the whole call, so this is a floor on the rate
+            self.sock.settimeout(len(data) / self.min_rate + self.grace)
+        try:
+            with self.timing.phase('write'):
+                written = self.raw.write(data)
+        except TimeoutError:
+            metrics.CONNECTION_TIMEOUTS.labels('send').inc()
+            raise
+        self.bytes_written += written
+        if self.uncork_on_write:
+            self.uncork()
+        return written
+    
+    def flush(self):
+        self.raw.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
 class AuthFileHandler(SimpleHTTPRequestHandler):
     VALID_TOKENS = {}  # token -> {user, expires}
     FAILED_ATTEMPTS = {}
@@ -50,6 +383,232 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
     ACTIVE_USERS = {}  # token -> {user, last_activity, ip, user_agent}
     SHARED_PATHS_CACHE = None  # Cache shared paths to avoid repeated DB queries
     CACHE_TIMESTAMP = 0  # Track when cache was last updated
+    TEMPLATE_CACHE = {}  # template path -> (mtime, contents)
+    IN_FLIGHT = {}  # thread id -> handler currently serving a request
+    SERVER_TIMING_RATE = Config.SERVER_TIMING_SAMPLE_RATE  # Adjustable from the profiler page
+    SERVER_TIMING_ADMIN = Config.SERVER_TIMING_ADMIN
+    timing = NO_TIMING  # ServerTiming while the current request is being timed
+    
+    def setup(self):
+        super().setup()
+        self.stream_chunk_sizer = None
+        self.nodelay = None  # TCP_NODELAY as last set on this connection
+        self.wfile = CountingWriter(self.wfile, self.connection,
+                                    Config.MIN_SEND_RATE_BYTES, Config.SEND_STALL_GRACE_SECONDS)
+    
+    def handle_one_request(self):
+        self.request_started = None
+        self.response_status = None
+        self.route_label = None
+        self.auth_user = None
+        self.auth_token = None
+        self.profile = None
+        self.timing = NO_TIMING
+        self.lane = None
+        self.wfile.bytes_written = 0
+        if not self.wait_for_request():
+            self.close_connection = True
+            return
+        try:
+            super().handle_one_request()
+        except (TimeoutError, ConnectionError):
+            self.close_connection = True  # Send deadline passed or client went away mid-response
+        finally:
+            REAPER.disarm(self)
+            self.wfile.uncork()  # Responses without a body
+            if self.lane is not None:
+                self.lane.release()
+                metrics.LANE_ACTIVE.labels(self.lane.name).dec()
+            if self.request_started is not None:
+                self.IN_FLIGHT.pop(threading.get_ident(), None)
+                STAT_CACHE.end_request()
+                if self.profile is not None:
+                    PROFILER.end_request(self.profile, self.route_label or self.classify_route())
+                self.record_request()
+            if self.timing.enabled:
+                self.wfile.timing = NO_TIMING
+                set_current_timing(NO_TIMING)
+    
+    def parse_request(self):
+        # Start the clock once a request line has arrived, not while idling on keep-alive
+        self.request_started = time.perf_counter()
+        self.IN_FLIGHT[threading.get_ident()] = self
+        STAT_CACHE.begin_request()
+        self.profile = PROFILER.begin_request()
+        sampled = self.SERVER_TIMING_RATE > 0 and random.random() < self.SERVER_TIMING_RATE
+        if sampled or self.SERVER_TIMING_ADMIN:
+            self.timing = ServerTiming(sampled)
+            self.wfile.timing = self.timing
+            set_current_timing(self.timing)
+        parsed = super().parse_request()
+        self.raw_path = self.path
+        if REAPER.disarm(self):
+            # Headers were cut off at the deadline, so whatever was parsed is incomplete
+            self.close_connection = True
+            if parsed:
+                self.send_error(408, "Request header timeout")
+            return False
+        if parsed:
+            return self.enter_lane()
+        return parsed
+    
+    def wait_for_request(self):
+        """Wait out keep-alive idle time, then give the request line and headers a deadline.
+        
+        Returns False if the client closed the connection or stayed idle too long.
+        """
+        self.connection.settimeout(Config.IDLE_TIMEOUT_SECONDS or None)
+        try:
+            if not self.rfile.peek(1):
+                return False  # Client closed the connection
+        except TimeoutError:
+            metrics.CONNECTION_TIMEOUTS.labels('idle').inc()
+            return False
+        except OSError:
+            return False
+        self.connection.settimeout(Config.HEADER_TIMEOUT_SECONDS or None)
+        REAPER.arm(self, self.connection, Config.HEADER_TIMEOUT_SECONDS, 'header')
+        return True
+    
+    def classify_lane(self):
+        """Route downloads, media streams and content searches to the bulk lane, everything else is interactive"""
+        path = self.path.split('?', 1)[0]
+        if path.startswith(('/download/', '/checksum/')) or path == '/grep':
+            return 'bulk'
+        if self.command == 'GET' and not path.startswith(('/admin', '/raw/')):
+            if path.rsplit('.', 1)[-1].lower() in self.STREAMABLE_EXTENSIONS:
+                return 'bulk'
+        return 'interactive'
+    
+    def enter_lane(self):
+        """Wait for a slot in this request's lane; answers 503 and returns False if it stays full"""
+        lane = LANES.get(self.classify_lane())
+        started = time.perf_counter()
+        if not lane.acquire():
+            metrics.LANE_REJECTED.labels(lane.name).inc()
+            ACCESS_LOG.event('lane_rejected', lane=lane.name, ip=self.client_address[0])
+            self.close_connection = True  # Any request body is still unread
+            self.send_retry_later(503, 'Server is busy - try again shortly')
+            return False
+        self.lane = lane
+        metrics.LANE_ACTIVE.labels(lane.name).inc()
+        nodelay = lane.name in SOCKET_PROFILE.nodelay_lanes
+        if nodelay != self.nodelay:
+            set_nodelay(self.connection, nodelay)
+            self.nodelay = nodelay
+        metrics.LANE_WAIT.labels(lane.name).observe(time.perf_counter() - started)
+        return True
+    
+    def send_retry_later(self, code, message):
+        """Refuse the request with a Retry-After hint"""
+        body = f"{message}\n".encode('utf-8')
+        self.send_response(code)
+        self.send_header('Retry-After', str(Config.STREAM_RETRY_AFTER_SECONDS))
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def get_query_params(self):
+        """Query parameters from the original request path, wherever the token sat"""
+        query = self.raw_path.partition('?')[2].replace('?', '&')
+        return {name: values[0] for name, values in urllib.parse.parse_qs(query).items()}
+    
+    @classmethod
+    def in_flight_routes(cls):
+        """Map each busy request thread to the route it is serving"""
+        return {thread_id: handler.route_label or handler.classify_route()
+                for thread_id, handler in list(cls.IN_FLIGHT.items())}
+    
+    @classmethod
+    def in_flight_requests(cls):
+        """Map each busy request thread to (started, route, user, path) for the watchdog"""
+        requests = {}
+        for thread_id, handler in list(cls.IN_FLIGHT.items()):
+            started = handler.request_started
+            if started is None:
+                continue
+            path = getattr(handler, 'path', '').split('?', 1)[0]  # Never record the token
+            requests[thread_id] = (started, handler.route_label or handler.classify_route(), handler.auth_user, path)
+        return requests
+    
+    @classmethod
+    def registry_sizes(cls):
+        """Entry counts and approximate deep sizes of the in-process registries and caches"""
+        registries = [
+            ('VALID_TOKENS', cls.VALID_TOKENS),
+            ('ACTIVE_USERS', cls.ACTIVE_USERS),
+            ('FAILED_ATTEMPTS', cls.FAILED_ATTEMPTS),
+            ('ADMIN_NOTIFICATIONS', cls.ADMIN_NOTIFICATIONS),
+            ('SHARED_PATHS_CACHE', cls.SHARED_PATHS_CACHE or {}),
+            ('TEMPLATE_CACHE', cls.TEMPLATE_CACHE),
+            ('IN_FLIGHT', cls.IN_FLIGHT),
+        ]
+        sizes = []
+        for name, registry in registries:
+            snapshot = registry.copy()  # Other threads keep mutating the live object
+            if name == 'IN_FLIGHT':
+                snapshot = {thread_id: None for thread_id in snapshot}  # Handlers drag sockets along
+            sizes.append((name, len(snapshot), deep_sizeof(snapshot)))
+        sizes.append(('metrics series', metrics.REGISTRY.series_count(), None))
+        sizes.append(('access log queue', ACCESS_LOG.pending(), None))
+        sizes.append(('stat cache', len(STAT_CACHE), None))
+        sizes.append(('file body cache', len(FILE_CACHE), FILE_CACHE.bytes))
+        sizes.append(('open fd cache', len(FD_CACHE), None))
+        return sizes
+    
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def end_headers(self):
+        # Only phases finished so far fit in the header; the log entry gets the body write too
+        if self.timing.enabled and (self.timing.sampled or self.auth_user == 'admin'):
+            self.send_header('Server-Timing', self.timing.header(time.perf_counter() - self.request_started))
+        corked = SOCKET_PROFILE.cork and self.wfile.cork()
+        super().end_headers()
+        self.wfile.uncork_on_write = corked
+    
+    def classify_route(self):
+        """Map the request path onto a bounded set of route names for metrics"""
+        path = self.path.split('?', 1)[0]
+        if path in ('/login', '/register', '/favicon.ico'):
+            return path[1:]
+        if path.startswith('/admin'):
+            return 'admin'
+        if path.startswith('/download/'):
+            return 'download'
+        if path.startswith('/raw/'):
+            return 'raw'
+        if path == '/':
+            return 'root'
+        if path in ('/search', '/grep'):
+            return path[1:]
+        if path == '/api/changes':
+            return 'changes'
+        if path.startswith('/checksum/'):
+            return 'checksum'
+        return 'other'
+    
+    def record_request(self):
+        """Record metrics and the access log entry for the finished request"""
+        route = self.route_label or self.classify_route()
+        duration = time.perf_counter() - self.request_started
+        status = self.response_status or 0
+        metrics.REQUEST_DURATION.labels(route).observe(duration)
+        metrics.REQUESTS.labels(route, str(status)).inc()
+        metrics.RESPONSE_BYTES.labels(route).inc(self.wfile.bytes_written)
+        fields = {'timing_ms': self.timing.as_dict()} if self.timing.enabled else {}
+        ACCESS_LOG.access(method=self.command, route=route, path=self.path.split('?', 1)[0],
+                          status=status, bytes=self.wfile.bytes_written,
+                          duration_ms=round(duration * 1000, 3),
+                          user=self.auth_user, ip=self.client_address[0], **fields)
+    
+    def log_request(self, code='-', size='-'):
+        pass  # Requests are written to the access log once they finish
+    
+    def log_message(self, format, *args):
+        ACCESS_LOG.event('http', ip=self.client_address[0], message=format % args)
     
     def add_security_headers(self):
         """Add security headers to response"""
@@ -68,6 +627,21 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             # Running as script
             return os.path.join('templates', template_name)
     
+    def load_template(self, template_name):
+        """Read a template, reusing the cached copy while the file is unchanged"""
+        template_path = self.get_template_path(template_name)
+        mtime = os.stat(template_path).st_mtime_ns
+        cached = self.TEMPLATE_CACHE.get(template_path)
+        if cached and cached[0] == mtime:
+            metrics.TEMPLATE_CACHE_HITS.inc()
+            return cached[1]
+        
+        metrics.TEMPLATE_CACHE_MISSES.inc()
+        with open(template_path, 'r', encoding='utf-8') as f:
+            contents = f.read()
+        self.TEMPLATE_CACHE[template_path] = (mtime, contents)
+        return contents
+    
     @classmethod
     def get_admin_password(cls):
         """Get current admin password from memory"""
@@ -151,20 +725,25 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         current_time = time.time()
         # Cache for configured seconds to improve performance
         if cls.SHARED_PATHS_CACHE is None or (current_time - cls.CACHE_TIMESTAMP) > Config.SHARED_PATHS_CACHE_SECONDS:
+            metrics.SHARED_PATHS_CACHE_MISSES.inc()
             try:
                 conn = sqlite3.connect(cls.DB_FILE, timeout=5.0)
                 cursor = conn.cursor()
-                cursor.execute('SELECT path, is_file FROM shared_paths')
-                cls.SHARED_PATHS_CACHE = {row[0]: bool(row[1]) for row in cursor.fetchall()}
+                with metrics.DB_QUERY_DURATION.labels('get_shared_paths').time(), current_timing().phase('db'):
+                    cursor.execute('SELECT path, is_file FROM shared_paths')
+                    rows = cursor.fetchall()
+                cls.SHARED_PATHS_CACHE = {row[0]: bool(row[1]) for row in rows}
                 cls.CACHE_TIMESTAMP = current_time
             except sqlite3.Error as e:
-                print(f"Database error in get_shared_paths: {e}")
+                ACCESS_LOG.event('db_error', query='get_shared_paths', error=str(e))
                 cls.SHARED_PATHS_CACHE = {}
             finally:
                 try:
                     conn.close()
                 except:
                     pass
+        else:
+            metrics.SHARED_PATHS_CACHE_HITS.inc()
         return cls.SHARED_PATHS_CACHE
     
     @classmethod
@@ -176,21 +755,23 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
     @classmethod
     def create_user(cls, username, password):
         salt = secrets.token_hex(16)
-        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
+        with metrics.LOGIN_KDF_DURATION.time(), current_timing().phase('kdf'):
+            password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
         
         try:
             conn = sqlite3.connect(cls.DB_FILE, timeout=5.0)
             cursor = conn.cursor()
             # Explicitly set is_approved=0 to ensure user needs admin approval
-            cursor.execute('INSERT INTO users (username, password_hash, salt, is_approved) VALUES (?, ?, ?, 0)',
-                         (username, password_hash.hex(), salt))
-            conn.commit()
-            print(f"Created user '{username}' - waiting for admin approval")
+            with metrics.DB_QUERY_DURATION.labels('create_user').time(), current_timing().phase('db'):
+                cursor.execute('INSERT INTO users (username, password_hash, salt, is_approved) VALUES (?, ?, ?, 0)',
+                             (username, password_hash.hex(), salt))
+                conn.commit()
+            ACCESS_LOG.event('user_registered', user=username)
             return True
         except sqlite3.IntegrityError:
             return False
         except sqlite3.Error as e:
-            print(f"Database error creating user: {e}")
+            ACCESS_LOG.event('db_error', query='create_user', error=str(e))
             return False
         finally:
             try:
@@ -203,8 +784,9 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         try:
             conn = sqlite3.connect(cls.DB_FILE, timeout=5.0)  # Add timeout
             cursor = conn.cursor()
-            cursor.execute('SELECT password_hash, salt, is_approved FROM users WHERE username = ?', (username,))
-            result = cursor.fetchone()
+            with metrics.DB_QUERY_DURATION.labels('verify_user').time(), current_timing().phase('db'):
+                cursor.execute('SELECT password_hash, salt, is_approved FROM users WHERE username = ?', (username,))
+                result = cursor.fetchone()
             conn.close()
             
             if not result:
@@ -217,14 +799,15 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 return False, 'Account pending approval'
             
             # Then verify password
-            password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
+            with metrics.LOGIN_KDF_DURATION.time(), current_timing().phase('kdf'):
+                password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
             
             if password_hash.hex() != stored_hash:
                 return False, 'Invalid password'
             
             return True, 'Success'
         except sqlite3.Error as e:
-            print(f"Database error during login: {e}")
+            ACCESS_LOG.event('db_error', query='verify_user', error=str(e))
             return False, 'Database error - please try again'
     
     def generate_token(self, username):
@@ -254,31 +837,26 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             attempts, _ = self.FAILED_ATTEMPTS[client_ip]
             new_attempts = attempts + 1
             self.FAILED_ATTEMPTS[client_ip] = (new_attempts, now)
-            print(f"DEBUG: Recorded failed attempt for {client_ip}: {new_attempts} total attempts")
         else:
-            self.FAILED_ATTEMPTS[client_ip] = (1, now)
-            print(f"DEBUG: First failed attempt recorded for {client_ip}")
+            new_attempts = 1
+            self.FAILED_ATTEMPTS[client_ip] = (new_attempts, now)
+        ACCESS_LOG.event('failed_attempt_recorded', ip=client_ip, attempts=new_attempts)
     
     @classmethod
     def clear_rate_limit(cls, client_ip=None):
         """Clear rate limiting for specific IP or all IPs"""
-        print(f"DEBUG: clear_rate_limit called with client_ip={client_ip}")
-        print(f"DEBUG: Current FAILED_ATTEMPTS: {cls.FAILED_ATTEMPTS}")
-        
         if client_ip:
             if client_ip in cls.FAILED_ATTEMPTS:
                 del cls.FAILED_ATTEMPTS[client_ip]
-                print(f"✅ Rate limit cleared for {client_ip}")
-                print(f"DEBUG: After clearing, FAILED_ATTEMPTS: {cls.FAILED_ATTEMPTS}")
+                ACCESS_LOG.event('rate_limit_cleared', ip=client_ip)
                 cls.ADMIN_NOTIFICATIONS.append(f"Rate limit cleared for {client_ip}")
             else:
-                print(f"⚠️  No rate limit found for {client_ip}")
+                ACCESS_LOG.event('rate_limit_not_found', ip=client_ip)
                 cls.ADMIN_NOTIFICATIONS.append(f"No rate limit found for {client_ip}")
         else:
             count = len(cls.FAILED_ATTEMPTS)
             cls.FAILED_ATTEMPTS.clear()
-            print(f"✅ All rate limits cleared ({count} IPs)")
-            print(f"DEBUG: After clearing all, FAILED_ATTEMPTS: {cls.FAILED_ATTEMPTS}")
+            ACCESS_LOG.event('rate_limits_cleared', count=count)
             cls.ADMIN_NOTIFICATIONS.append(f"All rate limits cleared ({count} IPs)")
     
     def check_token_auth(self):
@@ -291,6 +869,8 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 if token in self.VALID_TOKENS:
                     token_data = self.VALID_TOKENS[token]
                     if time.time() < token_data['expires']:
+                        self.auth_user = token_data['user']
+                        self.auth_token = token
                         # Update active user tracking
                         self.ACTIVE_USERS[token] = {
                             'user': token_data['user'],
@@ -347,9 +927,7 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                         error_msg = '🚫 Too many failed login attempts. Please contact admin to clear rate limits.'
         
         try:
-            template_path = self.get_template_path('login.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html = f.read()
+            html = self.load_template('login.html')
             
             if error_msg:
                 if '🚫' in error_msg:  # Rate limit message
@@ -370,9 +948,7 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
     def send_welcome_page(self):
         try:
             # Handle both development and packaged app paths
-            template_path = self.get_template_path('welcome.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html = f.read()
+            html = self.load_template('welcome.html')
             
             self.send_response(200)
             self.send_header('Content-type', 'text/html; charset=utf-8')
@@ -383,9 +959,7 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
     
     def send_register_page(self, error_msg=''):
         try:
-            template_path = self.get_template_path('register.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html = f.read()
+            html = self.load_template('register.html')
             
             if error_msg:
                 html = html.replace('<div class="requirements">',
@@ -436,73 +1010,135 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(html.encode('utf-8'))
     
+    POST_ROUTES = {
+        '/login': 'handle_login_post',
+        '/register': 'handle_register_post',
+    }
+    
     def do_POST(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length).decode()
+        # Route first so unknown paths never cost a body read
+        handler_name = self.POST_ROUTES.get(self.path)
+        if handler_name is None:
+            self.send_error(404)
+            return
+        
+        params = self.read_form_body(Config.POST_BODY_LIMITS.get(self.path, 4096))
+        if params is None:
+            return  # Error response already sent
+        getattr(self, handler_name)(params)
+    
+    def read_form_body(self, max_bytes):
+        """Stream a urlencoded form body within size and time limits.
+        
+        Returns the parsed fields, or None once an error response has been sent.
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411, "Length Required")
+            return None
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.send_error(400, "Invalid Content-Length")
+            return None
+        
+        # Reject oversized bodies before reading a single byte
+        if content_length > max_bytes:
+            self.send_error(413, "Request body too large")
+            return None
+        
+        content_type = self.headers.get('Content-Type', 'application/x-www-form-urlencoded')
+        if content_type.split(';')[0].strip().lower() != 'application/x-www-form-urlencoded':
+            self.send_error(415, "Unsupported form encoding")
+            return None
+        
+        parser = UrlEncodedFormParser()
+        remaining = content_length
+        deadline = time.monotonic() + Config.POST_BODY_TIMEOUT_SECONDS
+        previous_timeout = self.connection.gettimeout()
+        error = None
+        try:
+            while remaining > 0:
+                time_left = deadline - time.monotonic()
+                if time_left <= 0:
+                    raise socket.timeout()
+                # Bound every socket read by what is left of the deadline
+                self.connection.settimeout(time_left)
+                chunk = self.rfile.read1(min(remaining, 1024))
+                if not chunk:
+                    break  # Client closed the connection early
+                remaining -= len(chunk)
+                parser.feed(chunk)
+            params = parser.close()
+        except socket.timeout:
+            metrics.CONNECTION_TIMEOUTS.labels('body').inc()
+            error = (408, "Request body timed out")
+        except ValueError as e:
+            error = (413, str(e))
+        finally:
+            self.connection.settimeout(previous_timeout)
+        
+        if error is None and remaining > 0:
+            error = (400, "Incomplete request body")
+        if error:
+            self.send_error(*error)
+            return None
+        return params
+    
+    def handle_login_post(self, params):
         client_ip = self.client_address[0]
+        username = params.get('username', '')
+        password = params.get('password', '')
         
-        if self.path == '/login':
-            print(f"DEBUG: Login attempt from {client_ip}")
-            
-            # Parse form data first
-            params = urllib.parse.parse_qs(post_data)
-            username = params.get('username', [''])[0]
-            password = params.get('password', [''])[0]
-            
-            # Always check and clear expired rate limits first
-            now = time.time()
-            if client_ip in self.FAILED_ATTEMPTS:
-                attempts, last_attempt = self.FAILED_ATTEMPTS[client_ip]
-                # Clear old attempts if window expired
-                window_seconds = Config.RATE_LIMIT_WINDOW_MINUTES * 60
-                if now - last_attempt > window_seconds:
-                    print(f"DEBUG: Clearing expired attempts for {client_ip} (timeout reached)")
-                    del self.FAILED_ATTEMPTS[client_ip]
-                elif attempts >= Config.RATE_LIMIT_ATTEMPTS:
-                    time_remaining = int(120 - (now - last_attempt))
-                    print(f"DEBUG: Rate limit active for {client_ip} - {attempts} attempts, {time_remaining}s remaining")
-                    self.send_auth_page(f'🚫 Too many failed attempts. Please wait {time_remaining} seconds before trying again.')
-                    return
-            
-            print(f"DEBUG: Attempting login for username='{username}' from {client_ip}")
-            success, message = self.verify_user(username, password)
-            print(f"DEBUG: Login result: success={success}, message='{message}'")
-            
-            if success:
-                # Clear any failed attempts on successful login
-                if client_ip in self.FAILED_ATTEMPTS:
-                    print(f"DEBUG: Clearing failed attempts for {client_ip} after successful login")
-                    del self.FAILED_ATTEMPTS[client_ip]
-                token = self.generate_token(username)
-                print(f"DEBUG: Generated token for {username}, redirecting to main page")
-                self.send_response(302)
-                self.send_header('Location', f'/?token={token}')
-                self.end_headers()
-            else:
-                print(f"DEBUG: Login failed for {username}: {message}")
-                self.record_failed_attempt(client_ip)
-                self.send_auth_page(f'❌ {message}')
-        
-        elif self.path == '/register':
-            params = urllib.parse.parse_qs(post_data)
-            username = params.get('username', [''])[0]
-            password = params.get('password', [''])[0]
-            
-            print(f"DEBUG: Registration attempt for username='{username}' from {client_ip}")
-            
-            if len(username) < 3 or len(password) < 6:
-                self.send_register_page('Username must be at least 3 characters and password at least 6 characters')
+        # Always check and clear expired rate limits first
+        now = time.time()
+        if client_ip in self.FAILED_ATTEMPTS:
+            attempts, last_attempt = self.FAILED_ATTEMPTS[client_ip]
+            # Clear old attempts if window expired
+            window_seconds = Config.RATE_LIMIT_WINDOW_MINUTES * 60
+            if now - last_attempt > window_seconds:
+                del self.FAILED_ATTEMPTS[client_ip]
+            elif attempts >= Config.RATE_LIMIT_ATTEMPTS:
+                time_remaining = int(120 - (now - last_attempt))
+                ACCESS_LOG.event('login_rate_limited', ip=client_ip, user=username, attempts=attempts)
+                self.send_auth_page(f'🚫 Too many failed attempts. Please wait {time_remaining} seconds before trying again.')
                 return
-            
-            if self.create_user(username, password):
-                print(f"DEBUG: User '{username}' created successfully - showing success popup")
-                # Show dedicated success page with popup-style message
-                self.send_registration_success_page(username)
-            else:
-                print(f"DEBUG: Failed to create user '{username}' - username already exists")
-                self.send_register_page('❌ Username already exists. Please choose another.')
+        
+        success, message = self.verify_user(username, password)
+        
+        if success:
+            # Clear any failed attempts on successful login
+            if client_ip in self.FAILED_ATTEMPTS:
+                del self.FAILED_ATTEMPTS[client_ip]
+            token = self.generate_token(username)
+            self.auth_user = username
+            ACCESS_LOG.event('login_succeeded', ip=client_ip, user=username)
+            self.send_response(302)
+            self.send_header('Location', f'/?token={token}')
+            self.end_headers()
         else:
-            self.send_error(404)
+            ACCESS_LOG.event('login_failed', ip=client_ip, user=username, reason=message)
+            self.record_failed_attempt(client_ip)
+            self.send_auth_page(f'❌ {message}')
+    
+    def handle_register_post(self, params):
+        client_ip = self.client_address[0]
+        username = params.get('username', '')
+        password = params.get('password', '')
+        
+        if len(username) < 3 or len(password) < 6:
+            ACCESS_LOG.event('registration_rejected', ip=client_ip, user=username, reason='too short')
+            self.send_register_page('Username must be at least 3 characters and password at least 6 characters')
+            return
+        
+        if self.create_user(username, password):
+            # Show dedicated success page with popup-style message
+            self.send_registration_success_page(username)
+        else:
+            ACCESS_LOG.event('registration_rejected', ip=client_ip, user=username, reason='username exists')
+            self.send_register_page('❌ Username already exists. Please choose another.')
     
     def do_HEAD(self):
         """Handle HEAD requests for video streaming"""
@@ -510,15 +1146,16 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
     
     def do_GET(self):
         # Clean up expired tokens first
-        self.cleanup_expired_tokens()
+        with self.timing.phase('sweep'):
+            self.cleanup_expired_tokens()
         
         # Handle rate limit clearing BEFORE token auth to avoid triggering rate limits
         if self.path.startswith('/admin/clear-rate-limit'):
             # Check token authentication for admin routes
-            user = self.check_token_auth()
+            with self.timing.phase('auth'):
+                user = self.check_token_auth()
             if user == 'admin':
                 if self.path == '/admin/clear-rate-limit':
-                    print("Admin clearing ALL rate limits")
                     self.clear_rate_limit()
                     current_token = None
                     for token, data in self.VALID_TOKENS.items():
@@ -536,7 +1173,6 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                     else:
                         ip_to_clear = urllib.parse.unquote(path_part)
                     
-                    print(f"Admin clearing rate limit for IP: {ip_to_clear}")
                     self.clear_rate_limit(ip_to_clear)
                     
                     current_token = None
@@ -554,7 +1190,8 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 return
         
         # Check token authentication for other routes
-        user = self.check_token_auth()
+        with self.timing.phase('auth'):
+            user = self.check_token_auth()
         
         if self.path == '/register':
             self.send_register_page()
@@ -629,6 +1266,34 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             self.send_rate_limits_page()
             return
         
+        if self.path == '/admin/metrics' and user == 'admin':
+            self.send_metrics()
+            return
+        
+        if self.path.startswith('/admin/profile') and user == 'admin':
+            self.handle_profile_request()
+            return
+        
+        if self.path.startswith('/admin/memory') and user == 'admin':
+            self.handle_memory_request()
+            return
+        
+        if self.path in ('/admin/bandwidth', '/admin/bandwidth/set') and user == 'admin':
+            self.send_bandwidth_page()
+            return
+        
+        if self.path in ('/admin/slow-requests', '/admin/slow-requests/clear') and user == 'admin':
+            self.send_slow_requests_page()
+            return
+        
+        if self.path == '/admin/storage' and user == 'admin':
+            self.send_storage_page()
+            return
+        
+        if self.path in ('/admin/duplicates', '/admin/duplicates/scan') and user == 'admin':
+            self.send_duplicates_page()
+            return
+        
 
         
         # Handle favicon requests without authentication
@@ -647,6 +1312,23 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 self.send_error(401, "Access denied")
             return
         
+        if self.path == '/search':
+            self.send_search_page(user)
+            return
+        
+        if self.path == '/grep':
+            self.send_grep_results(user)
+            return
+        
+        if self.path == '/api/changes':
+            self.send_changes(user)
+            return
+        
+        if self.path.startswith('/checksum/'):
+            # Links carry the absolute path after the prefix; normpath keeps '..' from escaping a share
+            self.send_checksum(os.path.normpath('/' + urllib.parse.unquote(self.path[10:]).lstrip('/')), user)
+            return
+        
         # File serving logic (same as before)
         if self.path.startswith('/download/'):
             file_path = self.path[10:]
@@ -659,16 +1341,50 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         else:
             path = urllib.parse.unquote(self.path)
             try:
-                if os.path.isdir(path):
+                if STAT_CACHE.isdir(path):
                     self.show_directory(path, user)
-                elif os.path.isfile(path):
+                elif STAT_CACHE.isfile(path):
                     self.serve_file(path)
                 else:
                     self.send_error(404, "File or directory not found")
             except (OSError, PermissionError):
                 self.send_error(403, "Permission denied")
     
+    CONTENT_TYPES = {
+        'html': 'text/html; charset=utf-8',
+        'css': 'text/css; charset=utf-8',
+        'json': 'application/json; charset=utf-8',
+        'xml': 'application/xml; charset=utf-8',
+        'jpg': 'image/jpeg',
+        'jpeg': 'image/jpeg',
+        'png': 'image/png',
+        'gif': 'image/gif',
+        'svg': 'image/svg+xml',
+        'ico': 'image/x-icon',
+        'avif': 'image/avif',
+        'webp': 'image/webp',
+        'pdf': 'application/pdf',
+        'mp4': 'video/mp4',
+        'webm': 'video/webm',
+        'avi': 'video/x-msvideo',
+        'mov': 'video/quicktime',
+        'wmv': 'video/x-ms-wmv',
+        'flv': 'video/x-flv',
+        'mkv': 'video/x-matroska',
+        'mp3': 'audio/mpeg',
+        'wav': 'audio/wav',
+        'ogg': 'audio/ogg',
+        'flac': 'audio/flac'
+    }
+    STREAMABLE_EXTENSIONS = frozenset(['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv', 'mp3', 'wav', 'flac'])
+    
+    def get_content_type(self, file_path):
+        """Return (extension, content type) for a file path"""
+        ext = file_path.lower().split('.')[-1]
+        return ext, self.CONTENT_TYPES.get(ext, 'text/plain; charset=utf-8')
+    
     def serve_file(self, file_path):
+        self.route_label = 'file'
         # Check access for non-admin users
         user = None
         for token, data in self.VALID_TOKENS.items():
@@ -681,57 +1397,49 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             return
             
         try:
-            if os.path.getsize(file_path) == 0:
-                self.send_error(400, "Cannot view empty file (0 bytes)")
-                return
-                
-            ext = file_path.lower().split('.')[-1]
-            content_types = {
-                'html': 'text/html; charset=utf-8',
-                'css': 'text/css; charset=utf-8',
-                'json': 'application/json; charset=utf-8',
-                'xml': 'application/xml; charset=utf-8',
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'png': 'image/png',
-                'gif': 'image/gif',
-                'svg': 'image/svg+xml',
-                'ico': 'image/x-icon',
-                'avif': 'image/avif',
-                'webp': 'image/webp',
-                'pdf': 'application/pdf',
-                'mp4': 'video/mp4',
-                'webm': 'video/webm',
-                'ogg': 'video/ogg',
-                'avi': 'video/x-msvideo',
-                'mov': 'video/quicktime',
-                'wmv': 'video/x-ms-wmv',
-                'flv': 'video/x-flv',
-                'mkv': 'video/x-matroska',
-                'mp3': 'audio/mpeg',
-                'wav': 'audio/wav',
-                'ogg': 'audio/ogg',
-                'flac': 'audio/flac'
-            }
-            
-            content_type = content_types.get(ext, 'text/plain; charset=utf-8')
+            ext, content_type = self.get_content_type(file_path)
             
             # Handle range requests for video streaming
-            if ext in ['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv', 'mp3', 'wav', 'flac']:
+            if ext in self.STREAMABLE_EXTENSIONS:
+                with self.timing.phase('fs'):
+                    file_size = STAT_CACHE.getsize(file_path)
+                if file_size == 0:
+                    self.send_error(400, "Cannot view empty file (0 bytes)")
+                    return
                 self.serve_video_stream(file_path, content_type)
             else:
-                with open(file_path, 'rb') as f:
-                    self.send_response(200)
-                    self.send_header("Content-type", content_type)
-                    self.end_headers()
-                    self.wfile.write(f.read())
+                # Small hot files come from memory after a single stat
+                with self.timing.phase('fs'):
+                    body, hit = FILE_CACHE.read(file_path, STAT_CACHE.stat(file_path))
+                (metrics.FILE_CACHE_HITS if hit else metrics.FILE_CACHE_MISSES).inc()
+                if not body:
+                    self.send_error(400, "Cannot view empty file (0 bytes)")
+                    return
+                self.send_response(200)
+                self.send_header("Content-type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
         except IOError:
             self.send_error(404, "File not found")
     
     def serve_video_stream(self, file_path, content_type):
         """Handle optimized video streaming with range requests"""
+        self.route_label = 'stream'
+        slot = self.acquire_stream_slot(file_path)
+        if slot is None:
+            return
+        metrics.ACTIVE_STREAMS.inc()
+        stream = BANDWIDTH.open(self.auth_user, self.client_address[0], 'media', os.path.basename(file_path))
+        handle = prefetch = None
         try:
-            file_size = os.path.getsize(file_path)
+            # Players send many Range requests per playback; they share one cached fd
+            with self.timing.phase('fs'):
+                handle, hit = FD_CACHE.acquire(file_path, STAT_CACHE.stat(file_path))
+            (metrics.FD_CACHE_HITS if hit else metrics.FD_CACHE_MISSES).inc()
+            file_size = handle.size
+            window = Config.READAHEAD_WINDOW_BYTES.get('stream', 0)
+            sequential = Config.READAHEAD_SEQUENTIAL.get('stream', False)
             range_header = self.headers.get('Range')
             
             # Optimal chunk size for streaming (1MB)
@@ -763,17 +1471,9 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Headers', 'Range')
                 self.end_headers()
                 
-                # Stream in smaller chunks for better performance
-                with open(file_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)  # 8KB chunks
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        self.wfile.write(chunk)
-                        remaining -= len(chunk)
+                # The window runs past this range: players ask for the next one right after
+                prefetch = Prefetcher(handle.fd, start, file_size, window, sequential)
+                self.send_file_body(handle.read, start, end + 1, stream, self.stream_chunks(), prefetch)
             else:
                 # No range request, send with chunked encoding for better streaming
                 self.send_response(200)
@@ -786,21 +1486,74 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 
-                # Stream entire file in chunks
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)  # 8KB chunks
-                        if not chunk:
-                            break
-                        self.wfile.write(chunk)
+                prefetch = Prefetcher(handle.fd, 0, file_size, window, sequential)
+                self.send_file_body(handle.read, 0, file_size, stream, self.stream_chunks(), prefetch)
         except (IOError, BrokenPipeError):
             # Client disconnected, stop streaming
             pass
+        finally:
+            if prefetch is not None:
+                prefetch.finish(drop=Config.READAHEAD_DROP_AFTER.get('stream', False))
+            if handle is not None:
+                FD_CACHE.release(handle)
+            BANDWIDTH.close(stream)
+            STREAM_LIMITS.release(slot)
+            metrics.ACTIVE_STREAMS.dec()
+    
+    def stream_chunks(self):
+        """Chunk sizer shared by the Range requests of one connection, so a player keeps what it learnt"""
+        if self.stream_chunk_sizer is None:
+            self.stream_chunk_sizer = ChunkSizer(Config.SMALL_CHUNK_SIZE, Config.MAX_CHUNK_SIZE,
+                                                 target_seconds=Config.CHUNK_TARGET_SECONDS)
+        return self.stream_chunk_sizer
+    
+    def send_file_body(self, read, start, end, stream, chunks, prefetch):
+        """Send bytes [start, end) of a file; returns the bytes sent.
+        
+        read(length, offset) returns up to length bytes from offset.
+        Chunks follow the client's pace between SMALL_CHUNK_SIZE and MAX_CHUNK_SIZE.
+        """
+        # Looked up once: at small chunk sizes the per-chunk attribute lookups add up
+        phase, write, acquire = self.timing.phase, self.wfile.write, BANDWIDTH.acquire
+        advance, observe, monotonic = prefetch.advance, chunks.observe, time.monotonic
+        position = start
+        while position < end:
+            with phase('fs'):
+                chunk = read(min(chunks.size, end - position), position)
+            if not chunk:
+                break  # File shrank since it was sized
+            sent = len(chunk)
+            position += sent
+            advance(position)
+            started = monotonic()
+            acquire(stream, sent)
+            write(chunk)
+            observe(sent, monotonic() - started)
+        return position - start
+    
+    def acquire_stream_slot(self, file_path):
+        """Reserve a concurrent stream slot, or answer 429/503 with Retry-After and return None"""
+        slot, reason = STREAM_LIMITS.try_acquire(self.auth_token, self.client_address[0], file_path)
+        if slot is not None:
+            return slot
+        
+        metrics.STREAMS_REJECTED.labels(reason).inc()
+        ACCESS_LOG.event('stream_rejected', reason=reason, user=self.auth_user, ip=self.client_address[0])
+        # Per-client caps are the client's doing; the server-wide cap means we are busy
+        code = 503 if reason == 'total' else 429
+        messages = {
+            'total': 'Server is busy streaming to other clients',
+            'session': 'Too many streams open for this session',
+            'ip': 'Too many streams open from this address',
+            'file': 'Too many connections to this file',
+        }
+        self.send_retry_later(code, f"{messages[reason]} - try again shortly")
+        return None
     
     def serve_raw(self, file_path):
         file_path = urllib.parse.unquote(file_path)
         try:
-            if os.path.getsize(file_path) == 0:
+            if STAT_CACHE.getsize(file_path) == 0:
                 self.send_error(400, "Cannot view empty file (0 bytes)")
                 return
                 
@@ -826,8 +1579,13 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             self.send_error(403, "Access denied - This file is not in a shared folder")
             return
             
+        slot = self.acquire_stream_slot(file_path)
+        if slot is None:
+            return
+        metrics.ACTIVE_STREAMS.inc()
+        stream = BANDWIDTH.open(self.auth_user, self.client_address[0], 'bulk', os.path.basename(file_path))
         try:
-            file_size = os.path.getsize(file_path)
+            file_size = STAT_CACHE.getsize(file_path)
             
             self.send_response(200)
             self.send_header("Content-type", "application/octet-stream")
@@ -836,26 +1594,92 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             self.send_header("Accept-Ranges", "bytes")
             self.send_header("Cache-Control", "public, max-age=0")
             self.send_header("Connection", "keep-alive")
+            if Config.CHECKSUM_DIGEST_HEADERS:
+                self.send_digest_headers(file_path)
             self.end_headers()
             
-            # Stream download in large chunks for speed
             with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(65536)  # 64KB chunks for fast downloads
-                    if not chunk:
-                        break
-                    self.wfile.write(chunk)
+                prefetch = Prefetcher(f.fileno(), 0, file_size, Config.READAHEAD_WINDOW_BYTES.get('download', 0),
+                                      Config.READAHEAD_SEQUENTIAL.get('download', False))
+                try:
+                    chunks = ChunkSizer(Config.SMALL_CHUNK_SIZE, Config.MAX_CHUNK_SIZE, 65536, Config.CHUNK_TARGET_SECONDS)
+                    self.send_file_body(lambda length, offset: f.read(length), 0, file_size, stream, chunks, prefetch)
+                finally:
+                    # Media that is also being streamed keeps its pages
+                    prefetch.finish(drop=Config.READAHEAD_DROP_AFTER.get('download', False) and file_path not in FD_CACHE)
         except (IOError, BrokenPipeError):
             pass  # Client disconnected
+        finally:
+            BANDWIDTH.close(stream)
+            STREAM_LIMITS.release(slot)
+            metrics.ACTIVE_STREAMS.dec()
+    
+    def send_digest_headers(self, file_path):
+        """Repr-Digest and legacy Digest fields for whichever digests are already stored; never hashes"""
+        try:
+            with self.timing.phase('db'):
+                stored = CHECKSUMS.lookup(file_path, DIGEST_FIELD_NAMES, STAT_CACHE.stat(file_path))
+        except (OSError, sqlite3.Error):
+            return
+        repr_digests, digests = [], []
+        for algo in DIGEST_FIELD_NAMES:
+            if algo in stored:
+                repr_digest, legacy = digest_fields(algo, stored[algo])
+                repr_digests.append(repr_digest)
+                digests.append(legacy)
+        if repr_digests:
+            self.send_header('Repr-Digest', ', '.join(repr_digests))
+            self.send_header('Digest', ', '.join(digests))
+    
+    def send_checksum(self, file_path, user):
+        """Checksum of a file as sha256sum-style text or JSON, computed once per version of the file"""
+        if user != 'admin' and not self.is_path_accessible(file_path, user):
+            self.send_error(403, "Access denied - This file is not shared with you")
+            return
+        params = self.get_query_params()
+        algo = params.get('algo', 'sha256').lower().replace('-', '')
+        if algo not in CHECKSUM_ALGORITHMS:
+            self.send_error(400, f"Unsupported algorithm - use one of {', '.join(CHECKSUM_ALGORITHMS)}")
+            return
+        if not STAT_CACHE.isfile(file_path):
+            self.send_error(404, "File not found")
+            return
+        try:
+            digest = CHECKSUMS.checksum(file_path, algo, timeout=Config.CHECKSUM_WAIT_SECONDS)
+        except TimeoutError:
+            body = b'Checksum is still being computed - retry shortly\n'
+            self.send_response(202)
+            self.send_header('Retry-After', str(max(1, Config.CHECKSUM_WAIT_SECONDS // 3)))
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        except OSError as e:
+            self.send_error(500, f"Cannot checksum file: {e}")
+            return
+        if params.get('format') == 'json':
+            body = json.dumps({'path': file_path, 'algo': algo, 'digest': digest}).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            body = f'{digest}  {os.path.basename(file_path)}\n'.encode('utf-8')  # Feeds sha256sum -c
+            content_type = 'text/plain; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def show_directory(self, path, user):
+        self.route_label = 'directory'
         # Check if non-admin user has access to this path
         if user != 'admin' and not self.is_path_accessible(path, user):
             self.send_error(403, "Access denied - This folder is not shared with you")
             return
             
         try:
-            files = os.listdir(path)
+            with self.timing.phase('fs'):
+                files = os.listdir(path)
             files.sort()
         except PermissionError:
             self.send_error(403, "Permission denied - cannot access this directory")
@@ -872,133 +1696,149 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 break
         
         try:
-            template_path = self.get_template_path('directory.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-            
-            # Build parent link
-            parent_link = ''
-            if path != '/':
-                parent = os.path.dirname(path)
-                if parent == '':
-                    parent = '/'
-                parent_link = f'<div class="file dir"><a href="{parent}?token={current_token}">📁 ..</a></div>'
-            
-            # Build file list - filter for non-admin users
-            file_list = ''
-            shared_paths = self.get_shared_paths()  # Get for both admin and non-admin
-            
-            for name in files:
-                full_path = os.path.join(path, name)
+            with self.timing.phase('render'):
+                template = self.load_template('directory.html')
                 
-                # For non-admin users, only show items that are accessible
-                if user != 'admin':
-                    if not self.is_path_accessible(full_path, user):
-                        continue  # Skip this item for non-admin users
+                # Build parent link
+                parent_link = ''
+                if path != '/':
+                    parent = os.path.dirname(path)
+                    if parent == '':
+                        parent = '/'
+                    parent_link = f'<div class="file dir"><a href="{parent}?token={current_token}">📁 ..</a></div>'
                 
-                try:
-                    if os.path.isdir(full_path):
-                        # Check if directory is accessible
-                        try:
-                            os.listdir(full_path)
-                            # Directory is accessible - show as clickable
+                # Build file list - filter for non-admin users
+                file_list = ''
+                shared_paths = self.get_shared_paths()  # Get for both admin and non-admin
+                folder_sizes = None  # Looked up at the first subfolder; many listings have none
+                
+                for name in files:
+                    full_path = os.path.join(path, name)
+                    
+                    # For non-admin users, only show items that are accessible
+                    if user != 'admin':
+                        if not self.is_path_accessible(full_path, user):
+                            continue  # Skip this item for non-admin users
+                    
+                    try:
+                        with self.timing.phase('fs'):
+                            is_dir = STAT_CACHE.isdir(full_path)
+                        if is_dir:
+                            # Check if directory is accessible
+                            try:
+                                with self.timing.phase('fs'):
+                                    os.listdir(full_path)
+                                # Directory is accessible - show as clickable
+                                encoded_path = urllib.parse.quote(full_path)
+                                copy_button = ''
+                                if user == 'admin':
+                                    copy_button = f' | <button onclick="copyToClipboard(\'{full_path}\')" style="background: #6c757d; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">📋 Copy Path</button>'
+                                if folder_sizes is None:
+                                    try:
+                                        with self.timing.phase('db'):
+                                            folder_sizes = FOLDER_SIZES.children(path)
+                                    except sqlite3.Error:
+                                        folder_sizes = {}  # Totals are an extra; the listing works without them
+                                size_note = ''
+                                if full_path in folder_sizes:
+                                    total_size, total_files = folder_sizes[full_path]
+                                    size_note = f' <span style="color: #666; font-size: 12px;">({self.format_size(total_size)}, {total_files} files)</span>'
+                                file_list += f'<div class="file dir"><a href="{encoded_path}?token={current_token}">📁 {name}/</a>{size_note}{copy_button}</div>'
+                            except (OSError, PermissionError):
+                                # Directory not accessible - show as disabled
+                                file_list += f'<div class="file dir" style="opacity: 0.5; color: #999;"><span style="cursor: not-allowed;">🔒 {name}/ (No access)</span></div>'
+                        else:
+                            with self.timing.phase('fs'):
+                                size = STAT_CACHE.getsize(full_path)
                             encoded_path = urllib.parse.quote(full_path)
+                            ext = name.lower().split('.')[-1]
+                            
                             copy_button = ''
+                            share_button = ''
                             if user == 'admin':
+                                # Check if file is already shared
+                                is_file_shared = full_path in shared_paths
+                                if not is_file_shared:
+                                    encoded_file = urllib.parse.quote(full_path)
+                                    share_button = f' | <button onclick="if(confirm(\'Share this file: {name}?\')){{window.location.href=\'/admin/share-path/{encoded_file}?token={current_token}\'}}" style="background: #28a745; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">📤 Share File</button>'
+                                else:
+                                    encoded_file = urllib.parse.quote(full_path)
+                                    share_button = f' | <button onclick="if(confirm(\'Stop sharing this file: {name}?\')){{window.location.href=\'/admin/unshare-path/{encoded_file}?token={current_token}\'}}" style="background: #fd7e14; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">🔒 Unshare File</button>'
                                 copy_button = f' | <button onclick="copyToClipboard(\'{full_path}\')" style="background: #6c757d; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">📋 Copy Path</button>'
-                            file_list += f'<div class="file dir"><a href="{encoded_path}?token={current_token}">📁 {name}/</a>{copy_button}</div>'
-                        except (OSError, PermissionError):
-                            # Directory not accessible - show as disabled
-                            file_list += f'<div class="file dir" style="opacity: 0.5; color: #999;"><span style="cursor: not-allowed;">🔒 {name}/ (No access)</span></div>'
-                    else:
-                        size = os.path.getsize(full_path)
-                        encoded_path = urllib.parse.quote(full_path)
-                        ext = name.lower().split('.')[-1]
-                        
-                        copy_button = ''
-                        share_button = ''
-                        if user == 'admin':
-                            # Check if file is already shared
-                            is_file_shared = full_path in shared_paths
-                            if not is_file_shared:
-                                encoded_file = urllib.parse.quote(full_path)
-                                share_button = f' | <button onclick="if(confirm(\'Share this file: {name}?\')){{window.location.href=\'/admin/share-path/{encoded_file}?token={current_token}\'}}" style="background: #28a745; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">📤 Share File</button>'
-                            else:
-                                encoded_file = urllib.parse.quote(full_path)
-                                share_button = f' | <button onclick="if(confirm(\'Stop sharing this file: {name}?\')){{window.location.href=\'/admin/unshare-path/{encoded_file}?token={current_token}\'}}" style="background: #fd7e14; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">🔒 Unshare File</button>'
-                            copy_button = f' | <button onclick="copyToClipboard(\'{full_path}\')" style="background: #6c757d; color: white; border: none; padding: 2px 6px; border-radius: 3px; cursor: pointer; font-size: 11px;">📋 Copy Path</button>'
-                        
-                        if size == 0:
-                            # 0-byte files - only allow download
-                            file_list += f'<div class="file" style="opacity: 0.7; color: #666;">📄 {name} (0 bytes) - <span style="color: #999;">Empty file</span> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
-                        else:
-                            parseable_files = ['html', 'htm', 'css', 'svg', 'xml']
-                            video_files = ['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv']
-                            audio_files = ['mp3', 'wav', 'ogg', 'flac']
                             
-                            if ext in video_files:
-                                file_list += f'<div class="file">🎬 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">Stream</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
-                            elif ext in audio_files:
-                                file_list += f'<div class="file">🎵 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">Play</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
-                            elif ext in parseable_files:
-                                file_list += f'<div class="file">📄 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/raw/{encoded_path}?token={current_token}">Raw</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
+                            if size == 0:
+                                # 0-byte files - only allow download
+                                file_list += f'<div class="file" style="opacity: 0.7; color: #666;">📄 {name} (0 bytes) - <span style="color: #999;">Empty file</span> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
                             else:
-                                file_list += f'<div class="file">📄 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
-                except (OSError, PermissionError):
-                    file_list += f'<div class="file" style="opacity: 0.5; color: #999;">❌ {name} (Permission denied)</div>'
-            
-            # For non-admin users in root directory, show shared folders as virtual links
-            if user != 'admin' and path == '/' and not file_list:
-                # Show shared folders as accessible links
-                for shared_path, is_file in shared_paths.items():
-                    if not is_file:  # Only show folders in root
-                        folder_name = os.path.basename(shared_path)
-                        encoded_path = urllib.parse.quote(shared_path)
-                        file_list += f'<div class="file dir"><a href="{encoded_path}?token={current_token}">📁 {folder_name}/ (Shared)</a></div>'
-                    else:  # Show individual shared files
-                        file_name = os.path.basename(shared_path)
-                        encoded_path = urllib.parse.quote(shared_path)
-                        file_size = os.path.getsize(shared_path) if os.path.exists(shared_path) else 0
-                        ext = file_name.lower().split('.')[-1] if '.' in file_name else ''
-                        
-                        if ext in ['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv']:
-                            file_list += f'<div class="file">🎬 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">Stream</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
-                        elif ext in ['mp3', 'wav', 'ogg', 'flac']:
-                            file_list += f'<div class="file">🎵 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">Play</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
-                        else:
-                            file_list += f'<div class="file">📄 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
+                                parseable_files = ['html', 'htm', 'css', 'svg', 'xml']
+                                video_files = ['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv']
+                                audio_files = ['mp3', 'wav', 'ogg', 'flac']
+                                
+                                if ext in video_files:
+                                    file_list += f'<div class="file">🎬 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">Stream</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
+                                elif ext in audio_files:
+                                    file_list += f'<div class="file">🎵 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">Play</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
+                                elif ext in parseable_files:
+                                    file_list += f'<div class="file">📄 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/raw/{encoded_path}?token={current_token}">Raw</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
+                                else:
+                                    file_list += f'<div class="file">📄 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{copy_button}{share_button}</div>'
+                    except (OSError, PermissionError):
+                        file_list += f'<div class="file" style="opacity: 0.5; color: #999;">❌ {name} (Permission denied)</div>'
                 
-                if not file_list:
+                # For non-admin users in root directory, show shared folders as virtual links
+                if user != 'admin' and path == '/' and not file_list:
+                    # Show shared folders as accessible links
+                    for shared_path, is_file in shared_paths.items():
+                        if not is_file:  # Only show folders in root
+                            folder_name = os.path.basename(shared_path)
+                            encoded_path = urllib.parse.quote(shared_path)
+                            file_list += f'<div class="file dir"><a href="{encoded_path}?token={current_token}">📁 {folder_name}/ (Shared)</a></div>'
+                        else:  # Show individual shared files
+                            file_name = os.path.basename(shared_path)
+                            encoded_path = urllib.parse.quote(shared_path)
+                            file_size = STAT_CACHE.getsize(shared_path) if STAT_CACHE.exists(shared_path) else 0
+                            ext = file_name.lower().split('.')[-1] if '.' in file_name else ''
+                            
+                            if ext in ['mp4', 'webm', 'ogg', 'avi', 'mov', 'wmv', 'flv', 'mkv']:
+                                file_list += f'<div class="file">🎬 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">Stream</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
+                            elif ext in ['mp3', 'wav', 'ogg', 'flac']:
+                                file_list += f'<div class="file">🎵 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">Play</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
+                            else:
+                                file_list += f'<div class="file">📄 {file_name} ({self.format_size(file_size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a></div>'
+                    
+                    if not file_list:
+                        file_list = '<div style="text-align: center; padding: 40px; color: #666;">🔒 No shared content available<br><small>Contact admin to share folders or files with you</small></div>'
+                elif not file_list and user != 'admin':
                     file_list = '<div style="text-align: center; padding: 40px; color: #666;">🔒 No shared content available<br><small>Contact admin to share folders or files with you</small></div>'
-            elif not file_list and user != 'admin':
-                file_list = '<div style="text-align: center; padding: 40px; color: #666;">🔒 No shared content available<br><small>Contact admin to share folders or files with you</small></div>'
-            
-            # Add admin panel and logout link
-            header_content = ''
-            if user == 'admin':
-                # Check if current path is shared as a folder (not a file)
-                is_shared = path in shared_paths and not shared_paths.get(path, False)
-                share_button = ''
-                if not is_shared and path != '/':
-                    encoded_current_path = urllib.parse.quote(path)
-                    share_button = f'<a href="/admin/share-path/{encoded_current_path}?token={current_token}" style="background: #28a745; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; margin-left: 5px;" onclick="return confirm(\'Share folder {path} with all users?\')">📤 Share This Folder</a>'
-                elif is_shared and path != '/':
-                    encoded_current_path = urllib.parse.quote(path)
-                    share_button = f'<a href="/admin/unshare-path/{encoded_current_path}?token={current_token}" style="background: #fd7e14; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; margin-left: 5px;" onclick="return confirm(\'Stop sharing folder {path}?\')">🔒 Unshare This Folder</a>'
                 
-                header_content = f'<div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;"><div><a href="/admin?token={current_token}" style="background: #dc3545; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px;">Admin Panel</a>{share_button}</div><a href="/login" style="color: #666;">Logout ({user})</a></div>'
-            else:
-                header_content = f'<div style="text-align: right; margin-bottom: 10px;"><a href="/login" style="color: #666;">Logout ({user})</a></div>'
-            
-            # Add current path copy button for admin
-            path_header = f"{header_content}<strong>Files in: {path}</strong>"
-            if user == 'admin':
-                path_header += f' <button onclick="copyToClipboard(\'{path}\')" style="background: #17a2b8; color: white; border: none; padding: 5px 10px; border-radius: 3px; cursor: pointer; font-size: 12px; margin-left: 10px;">📋 Copy Current Path</button>'
-            
-            # Replace placeholders
-            html = template.replace('{path}', path_header)
-            html = html.replace('{parent_link}', parent_link)
-            html = html.replace('{file_list}', file_list)
+                # Add admin panel and logout link
+                header_content = ''
+                if user == 'admin':
+                    # Check if current path is shared as a folder (not a file)
+                    is_shared = path in shared_paths and not shared_paths.get(path, False)
+                    share_button = ''
+                    if not is_shared and path != '/':
+                        encoded_current_path = urllib.parse.quote(path)
+                        share_button = f'<a href="/admin/share-path/{encoded_current_path}?token={current_token}" style="background: #28a745; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; margin-left: 5px;" onclick="return confirm(\'Share folder {path} with all users?\')">📤 Share This Folder</a>'
+                    elif is_shared and path != '/':
+                        encoded_current_path = urllib.parse.quote(path)
+                        share_button = f'<a href="/admin/unshare-path/{encoded_current_path}?token={current_token}" style="background: #fd7e14; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px; margin-left: 5px;" onclick="return confirm(\'Stop sharing folder {path}?\')">🔒 Unshare This Folder</a>'
+                    
+                    header_content = f'<div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;"><div><a href="/admin?token={current_token}" style="background: #dc3545; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; font-size: 12px;">Admin Panel</a>{share_button}</div><a href="/login" style="color: #666;">Logout ({user})</a></div>'
+                else:
+                    header_content = f'<div style="text-align: right; margin-bottom: 10px;"><a href="/login" style="color: #666;">Logout ({user})</a></div>'
+                
+                # Add current path copy button for admin
+                path_header = f"{header_content}{self.search_form(current_token)}<strong>Files in: {path}</strong>"
+                if path != '/':
+                    path_header += f' <a href="/grep?token={current_token}&path={urllib.parse.quote(path)}" style="font-size: 12px; margin-left: 10px;">🔎 Search inside files</a>'
+                if user == 'admin':
+                    path_header += f' <button onclick="copyToClipboard(\'{path}\')" style="background: #17a2b8; color: white; border: none; padding: 5px 10px; border-radius: 3px; cursor: pointer; font-size: 12px; margin-left: 10px;">📋 Copy Current Path</button>'
+                
+                # Replace placeholders
+                html = template.replace('{path}', path_header)
+                html = html.replace('{parent_link}', parent_link)
+                html = html.replace('{file_list}', file_list)
             
             self.send_response(200)
             self.send_header("Content-type", "text/html; charset=utf-8")
@@ -1007,16 +1847,176 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         except FileNotFoundError:
             self.send_error(500, "Template file not found")
     
+    def search_form(self, current_token, query=''):
+        # The token goes first so check_token_auth finds it in the submitted URL
+        return f'<form action="/search" method="get" style="margin-bottom: 15px;"><input type="hidden" name="token" value="{current_token}"><input type="search" name="q" value="{html_escape(query)}" placeholder="Search file names..." style="padding: 5px; width: 60%;"> <button type="submit" style="padding: 5px 10px;">🔍 Search</button></form>'
+    
+    def send_search_page(self, user):
+        """Search indexed file names, limited to what the user may access"""
+        query = self.get_query_params().get('q', '').strip()
+        allowed = None if user == 'admin' else self.get_shared_paths()
+        try:
+            with self.timing.phase('db'):
+                results = SEARCH_INDEX.search(query, allowed, Config.SEARCH_RESULTS_LIMIT)
+        except sqlite3.Error as e:
+            ACCESS_LOG.event('db_error', query='search', error=str(e))
+            self.send_error(503, "Search index unavailable")
+            return
+        if user != 'admin':
+            results = [row for row in results if self.is_path_accessible(row[0], user)]
+        
+        if self.get_query_params().get('format') == 'json':
+            body = json.dumps({
+                'query': query,
+                'indexing': SEARCH_INDEX.indexing,
+                'results': [{'path': path, 'name': os.path.basename(path) or path, 'is_dir': bool(is_dir),
+                             'size': size, 'mtime': mtime} for path, is_dir, size, mtime in results],
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        current_token = self.auth_token
+        file_list = ''
+        for path, is_dir, size, mtime in results:
+            encoded_path = urllib.parse.quote(path)
+            name = html_escape(os.path.basename(path) or path)
+            location = f'<br><small style="color: #666;">{html_escape(os.path.dirname(path))}</small>'
+            if is_dir:
+                file_list += f'<div class="file dir"><a href="{encoded_path}?token={current_token}">📁 {name}/</a>{location}</div>'
+            else:
+                file_list += f'<div class="file">📄 {name} ({self.format_size(size)}) - <a href="{encoded_path}?token={current_token}">View</a> | <a href="/download/{encoded_path}?token={current_token}">Download</a>{location}</div>'
+        if query and not results:
+            note = ' (the index is still being built)' if SEARCH_INDEX.indexing else ''
+            file_list = f'<div style="text-align: center; padding: 40px; color: #666;">No file names match “{html_escape(query)}”{note}</div>'
+        
+        try:
+            template = self.load_template('directory.html')
+        except FileNotFoundError:
+            self.send_error(500, "Template file not found")
+            return
+        header = f'<div style="text-align: right; margin-bottom: 10px;"><a href="/login" style="color: #666;">Logout ({user})</a></div>'
+        summary = f'<strong>{len(results)} result{"" if len(results) == 1 else "s"} for: {html_escape(query)}</strong>' if query else ''
+        html = template.replace('{path}', f'{header}{self.search_form(current_token, query)}{summary}')
+        html = html.replace('{parent_link}', f'<div class="file dir"><a href="/?token={current_token}">📁 Back to files</a></div>')
+        html = html.replace('{file_list}', file_list)
+        
+        self.send_response(200)
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+    
+    def send_grep_results(self, user):
+        """Stream lines matching a pattern in the files under a shared path, as NDJSON or HTML"""
+        params = self.get_query_params()
+        root = os.path.normpath(params.get('path') or '/')  # No '..' past the shared folder
+        query = params.get('q', '')
+        as_ndjson = params.get('format') == 'ndjson'
+        current_token = self.auth_token
+        
+        # Everyone may list '/', but only the admin may search all of it
+        if (user != 'admin' and root == '/') or not self.is_path_accessible(root, user):
+            self.send_error(403, "Access denied - This folder is not shared with you")
+            return
+        if not os.path.exists(root):
+            self.send_error(404, "File or directory not found")
+            return
+        if query:
+            try:
+                pattern, flags = GREP.compile(query, regex=params.get('regex') == '1',
+                                              ignore_case=params.get('case') != '1')
+            except re.error as e:
+                self.send_error(400, f"Invalid pattern: {e}")
+                return
+        elif as_ndjson:
+            self.send_error(400, "Missing q parameter")
+            return
+        
+        try:
+            template = self.load_template('directory.html')
+        except FileNotFoundError:
+            self.send_error(500, "Template file not found")
+            return
+        checked = {name: ' checked' if params.get(name) == '1' else '' for name in ('regex', 'case')}
+        form = f'<form action="/grep" method="get" style="margin-bottom: 15px;"><input type="hidden" name="token" value="{current_token}"><input type="hidden" name="path" value="{html_escape(root)}"><input type="search" name="q" value="{html_escape(query)}" placeholder="Text to find..." style="padding: 5px; width: 50%;"> <label><input type="checkbox" name="regex" value="1"{checked["regex"]}> Regex</label> <label><input type="checkbox" name="case" value="1"{checked["case"]}> Match case</label> <button type="submit" style="padding: 5px 10px;">🔎 Search</button></form>'
+        header = f'<div style="text-align: right; margin-bottom: 10px;"><a href="/login" style="color: #666;">Logout ({user})</a></div>{form}<strong>Search inside: {html_escape(root)}</strong>'
+        head, _, tail = template.replace('{path}', header).replace(
+            '{parent_link}', f'<div class="file dir"><a href="{urllib.parse.quote(root)}?token={current_token}">📁 Back to folder</a></div>'
+        ).partition('{file_list}')
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson' if as_ndjson else 'text/html; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.close_connection = True  # No length up front; the body ends when the connection closes
+        if not as_ndjson:
+            self.wfile.write(head.encode('utf-8'))
+            if not query:
+                self.wfile.write(tail.encode('utf-8'))
+                return
+            self.wfile.flush()
+        
+        outcome = 'disconnected'
+        results = GREP.search(root, pattern, flags)
+        try:
+            for item in results:
+                if item[0] == 'match':
+                    _, path, matches = item
+                    if as_ndjson:
+                        chunk = ''.join(json.dumps({'path': path, 'line': line, 'text': text}) + '\n' for line, text in matches)
+                    else:
+                        lines = ''.join(f'<div><span style="color: #999;">{line}:</span> {html_escape(text)}</div>' for line, text in matches)
+                        chunk = f'<div class="file"><a href="{urllib.parse.quote(path)}?token={current_token}">📄 {html_escape(path)}</a><div style="font-family: monospace; font-size: 12px; margin-top: 5px; white-space: pre-wrap;">{lines}</div></div>'
+                else:
+                    summary = item[1]
+                    outcome = summary['stopped'] or 'complete'
+                    if as_ndjson:
+                        chunk = json.dumps(dict(summary, done=True)) + '\n'
+                    else:
+                        reasons = {'time': 'time limit reached', 'cpu': 'CPU limit reached', 'matches': 'match limit reached', 'error': 'search failed'}
+                        note = f' - stopped early: {reasons[summary["stopped"]]}' if summary['stopped'] else ''
+                        chunk = f'<div style="padding: 10px; color: #666;">{summary["matches"]} matching lines in {summary["files"]} files searched ({summary["binary"]} binary files skipped) in {summary["seconds"]}s{note}</div>' + tail
+                self.wfile.write(chunk.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            results.close()  # Cancels batches not yet started
+            metrics.GREP_QUERIES.labels(outcome).inc()
+    
+    def send_changes(self, user):
+        """Changes under the user's shared paths since a cursor, so clients can fetch deltas instead of re-listing"""
+        if not Config.WATCHER_ENABLED:
+            self.send_error(503, "Change feed disabled")
+            return
+        cursor = self.get_query_params().get('since')
+        if cursor is None:
+            events, next_cursor, reset = [], WATCHER.feed.cursor(), False  # Start following from now
+        else:
+            events, next_cursor, reset = WATCHER.feed.since(cursor, Config.CHANGE_FEED_PAGE_SIZE)
+        more = len(events) == Config.CHANGE_FEED_PAGE_SIZE
+        if user != 'admin':
+            events = [event for event in events if self.is_path_accessible(event['path'], user)]
+        body = json.dumps({'cursor': next_cursor, 'reset': reset, 'more': more, 'events': events}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def send_admin_page(self):
         try:
-            template_path = self.get_template_path('admin.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template = f.read()
+            template = self.load_template('admin.html')
             
             conn = sqlite3.connect(self.DB_FILE)
             cursor = conn.cursor()
-            cursor.execute('SELECT id, username, is_approved, created_at FROM users ORDER BY is_approved DESC, created_at DESC')
-            users = cursor.fetchall()
+            with metrics.DB_QUERY_DURATION.labels('list_users').time(), self.timing.phase('db'):
+                cursor.execute('SELECT id, username, is_approved, created_at FROM users ORDER BY is_approved DESC, created_at DESC')
+                users = cursor.fetchall()
             conn.close()
             
             # Get current token for admin actions
@@ -1109,6 +2109,13 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 <a href="/admin/active-users?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #17a2b8; color: white; text-decoration: none; border-radius: 5px;">👥 View Active Users</a>
                 <a href="/admin/shared-paths?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #28a745; color: white; text-decoration: none; border-radius: 5px;">📁 Manage Shared Folders</a>
                 <a href="/admin/rate-limits?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #dc3545; color: white; text-decoration: none; border-radius: 5px;">🚫 Manage Rate Limits</a>
+                <a href="/admin/metrics?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #343a40; color: white; text-decoration: none; border-radius: 5px;">📈 Metrics</a>
+                <a href="/admin/profile?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #e8590c; color: white; text-decoration: none; border-radius: 5px;">🔥 Profiler</a>
+                <a href="/admin/memory?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #6f42c1; color: white; text-decoration: none; border-radius: 5px;">🧠 Memory</a>
+                <a href="/admin/slow-requests?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #ffc107; color: #212529; text-decoration: none; border-radius: 5px;">🐢 Slow Requests</a>
+                <a href="/admin/bandwidth?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #20c997; color: white; text-decoration: none; border-radius: 5px;">🚦 Bandwidth</a>
+                <a href="/admin/storage?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #6610f2; color: white; text-decoration: none; border-radius: 5px;">💾 Storage</a>
+                <a href="/admin/duplicates?token={current_token}" style="display: inline-block; padding: 10px 20px; margin: 5px; background: #d63384; color: white; text-decoration: none; border-radius: 5px;">👯 Duplicates</a>
             </div>
             '''
             
@@ -1167,7 +2174,6 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             username = result[0]
             cursor.execute('DELETE FROM users WHERE id = ? AND username != "admin"', (user_id,))
             conn.commit()
-            print(f"Admin deleted user: {username}")
             
             # Invalidate all tokens and active sessions for the deleted user
             tokens_to_remove = []
@@ -1179,7 +2185,7 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 del self.VALID_TOKENS[token]
                 if token in self.ACTIVE_USERS:
                     del self.ACTIVE_USERS[token]
-                print(f"Invalidated token for deleted user: {username}")
+            ACCESS_LOG.event('user_deleted', user=username, sessions=len(tokens_to_remove))
         conn.close()
         
         # Get current token for redirect
@@ -1208,14 +2214,13 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
             if result:
                 username = result[0]
                 if username == 'admin':
-                    print("Cannot reset admin password")
+                    ACCESS_LOG.event('password_reset_refused', user=username)
                     conn.close()
                     return
                 
                 # Update password (no plain text storage)
                 cursor.execute('UPDATE users SET password_hash = ?, salt = ? WHERE id = ?',
                              (password_hash.hex(), salt, user_id))
-                print(f"✅ Admin reset password for user: {username} -> {new_password}")
                 # Store notification for admin
                 AuthFileHandler.ADMIN_NOTIFICATIONS.append(f"Password reset for {username}: {new_password}")
                 
@@ -1229,13 +2234,13 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                     del AuthFileHandler.VALID_TOKENS[token]
                     if token in AuthFileHandler.ACTIVE_USERS:
                         del AuthFileHandler.ACTIVE_USERS[token]
-                print(f"🔒 Invalidated {len(tokens_to_remove)} sessions for {username}")
+                ACCESS_LOG.event('password_reset', user=username, sessions=len(tokens_to_remove))
                 
                 conn.commit()
             else:
-                print(f"❌ User with ID {user_id} not found")
+                ACCESS_LOG.event('password_reset_failed', user_id=user_id, error='user not found')
         except Exception as e:
-            print(f"❌ Password reset failed: {e}")
+            ACCESS_LOG.event('password_reset_failed', user_id=user_id, error=str(e))
         finally:
             conn.close()
         
@@ -1259,22 +2264,23 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         if path == '/':
             return True
         
-        # Get shared paths from database (now returns dict with is_file info)
-        shared_paths = self.get_shared_paths()
-        
-        # BLOCK EVERYTHING BY DEFAULT - only allow explicitly shared paths
-        if not shared_paths:
-            return False  # No access to anything if nothing is shared
-        
-        # Check if exact path is shared (for files)
-        if path in shared_paths:
-            return True
-        
-        # Check if path is within a shared folder
-        for shared_path, is_file in shared_paths.items():
-            if not is_file and path.startswith(shared_path):
+        with self.timing.phase('access'):
+            # Get shared paths from database (now returns dict with is_file info)
+            shared_paths = self.get_shared_paths()
+            
+            # BLOCK EVERYTHING BY DEFAULT - only allow explicitly shared paths
+            if not shared_paths:
+                return False  # No access to anything if nothing is shared
+            
+            # Check if exact path is shared (for files)
+            if path in shared_paths:
                 return True
-        return False
+            
+            # Check if path is within a shared folder
+            for shared_path, is_file in shared_paths.items():
+                if not is_file and path.startswith(shared_path):
+                    return True
+            return False
     
     def add_shared_path(self, path, force_type=None):
         """Add a path to shared paths in database"""
@@ -1293,17 +2299,20 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 cursor.execute('INSERT INTO shared_paths (path, shared_by, is_file) VALUES (?, ?, ?)', (path, 'admin', is_file))
                 conn.commit()
                 self.invalidate_shared_paths_cache()  # Clear cache
+                SEARCH_INDEX.refresh()
+                FOLDER_SIZES.refresh()
+                WATCHER.refresh()
                 item_type = "file" if is_file else "folder"
-                print(f"Admin shared {item_type}: {path}")
+                ACCESS_LOG.event('path_shared', path=path, kind=item_type)
                 self.ADMIN_NOTIFICATIONS.append(f"Shared {item_type}: {os.path.basename(path)}")
             except sqlite3.IntegrityError:
                 item_type = "file" if (force_type == 'file' or (force_type != 'folder' and os.path.isfile(path))) else "folder"
-                print(f"Path already shared: {path}")
+                ACCESS_LOG.event('path_already_shared', path=path, kind=item_type)
                 self.ADMIN_NOTIFICATIONS.append(f"{item_type.title()} already shared: {os.path.basename(path)}")
             finally:
                 conn.close()
         else:
-            print(f"Path does not exist: {path}")
+            ACCESS_LOG.event('path_not_found', path=path)
             self.ADMIN_NOTIFICATIONS.append(f"Path not found: {path}")
         
         # Get current token for redirect
@@ -1323,12 +2332,17 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         conn = sqlite3.connect(self.DB_FILE)
         cursor = conn.cursor()
         cursor.execute('DELETE FROM shared_paths WHERE path = ?', (path,))
-        if cursor.rowcount > 0:
-            self.invalidate_shared_paths_cache()  # Clear cache
-            print(f"Admin unshared path: {path}")
-            self.ADMIN_NOTIFICATIONS.append(f"Unshared: {path}")
+        removed = cursor.rowcount > 0
         conn.commit()
         conn.close()
+        if removed:
+            # Only once committed, or a concurrent reader would re-cache the old row
+            self.invalidate_shared_paths_cache()  # Clear cache
+            SEARCH_INDEX.refresh()
+            FOLDER_SIZES.refresh()
+            WATCHER.refresh()
+            ACCESS_LOG.event('path_unshared', path=path)
+            self.ADMIN_NOTIFICATIONS.append(f"Unshared: {path}")
         
         # Get current token for redirect
         current_token = None
@@ -1366,12 +2380,12 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
                 if data['user'] != 'admin':
                     active_count += 1
                     last_seen = int(current_time - data['last_activity'])
-                    active_users_html += f'<div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #28a745;"><h4 style="margin: 0 0 10px 0; color: #28a745;">🟢 {data["user"]}</h4><p><strong>IP:</strong> {data["ip"]}</p><p><strong>Device:</strong> {data["user_agent"]}</p><p><strong>Last Activity:</strong> {last_seen} seconds ago</p></div>'
+                    active_users_html += f'<div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #28a745;"><h4 style="margin: 0 0 10px 0; color: #28a745;">🟢 {data["user"]}</h4><p><strong>IP:</strong> {data["ip"]}</p><p><strong>Device:</strong> {data["user_agent"]}</p><p><strong>Last Activity:</strong> {last_seen} seconds ago</p><p><strong>Streams:</strong> {STREAM_LIMITS.session_count(token)} open (this IP: {STREAM_LIMITS.ip_count(data["ip"])})</p></div>'
             
             if not active_users_html:
                 active_users_html = '<div style="text-align: center; padding: 40px; color: #666;">No users currently active</div>'
             
-            html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Active Users</title><meta name="viewport" content="width=device-width, initial-scale=1"><meta http-equiv="refresh" content="10"><style>body{{font-family: Arial, sans-serif; max-width: 800px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}</style></head><body><h1>👥 Active Users ({active_count})</h1><div class="nav"><a href="/admin?token={current_token}">← Back</a><a href="/admin/shared-paths?token={current_token}">📁 Shared Folders</a></div>{active_users_html}</body></html>'
+            html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Active Users</title><meta name="viewport" content="width=device-width, initial-scale=1"><meta http-equiv="refresh" content="10"><style>body{{font-family: Arial, sans-serif; max-width: 800px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}</style></head><body><h1>👥 Active Users ({active_count})</h1><div class="nav"><a href="/admin?token={current_token}">← Back</a><a href="/admin/shared-paths?token={current_token}">📁 Shared Folders</a></div><p><strong>Streams in progress:</strong> {STREAM_LIMITS.active} (limits: {Config.MAX_STREAMS_PER_SESSION or "∞"} per session, {Config.MAX_STREAMS_PER_IP or "∞"} per IP, {Config.MAX_STREAMS_PER_FILE or "∞"} per file, {Config.MAX_STREAMS_TOTAL or "∞"} total)</p>{active_users_html}</body></html>'
             
             self.send_response(200)
             self.send_header('Content-type', 'text/html; charset=utf-8')
@@ -1424,7 +2438,7 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         
         for ip in expired_ips:
             del self.FAILED_ATTEMPTS[ip]
-            print(f"DEBUG: Cleared expired rate limit for {ip}")
+            ACCESS_LOG.event('rate_limit_expired', ip=ip)
         
         rate_limits_html = ''
         blocked_ips = 0
@@ -1455,6 +2469,417 @@ class AuthFileHandler(SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(html.encode('utf-8'))
 
+    def send_metrics(self):
+        """Expose server metrics in OpenMetrics text format"""
+        body = metrics.REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.REGISTRY.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.add_security_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_profile_request(self):
+        """Start, stop and show on-demand CPU profiles of request threads"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        action = self.path[len('/admin/profile'):].strip('/')
+        params = self.get_query_params()
+        route = params.get('route') or None
+        
+        if action == 'result':
+            body = (PROFILER.result or '# No profile captured yet\n').encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Disposition', 'inline; filename="profile.folded"')
+            self.send_header('Content-Length', str(len(body)))
+            self.add_security_headers()
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        if action in ('start', 'stop', 'timing'):
+            if action == 'timing':
+                try:
+                    rate = float(params.get('rate', 0))
+                except ValueError:
+                    self.send_error(400, "Invalid sample rate")
+                    return
+                AuthFileHandler.SERVER_TIMING_RATE = min(max(rate, 0.0), 1.0)
+                AuthFileHandler.SERVER_TIMING_ADMIN = params.get('admin') == '1'
+                self.ADMIN_NOTIFICATIONS.append(f'Server-Timing: {AuthFileHandler.SERVER_TIMING_RATE:.0%} of requests'
+                                                f'{", all admin requests" if AuthFileHandler.SERVER_TIMING_ADMIN else ""}')
+            elif action == 'start':
+                try:
+                    if params.get('mode') == 'cprofile':
+                        started = PROFILER.start_cprofile(route, int(params.get('requests', 10)))
+                    else:
+                        started = PROFILER.start_sampling(self.in_flight_routes, route,
+                                                          interval=float(params.get('interval_ms', 5)) / 1000,
+                                                          duration=float(params.get('seconds', 30)))
+                except ValueError:
+                    self.send_error(400, "Invalid profiler parameters")
+                    return
+                self.ADMIN_NOTIFICATIONS.append('Profiler started' if started else 'Profiler already running')
+            else:
+                PROFILER.stop()
+                self.ADMIN_NOTIFICATIONS.append('Profiler stopped')
+            self.send_response(302)
+            self.send_header('Location', f'/admin/profile?token={current_token}')
+            self.end_headers()
+            return
+        
+        if action:
+            self.send_error(404, "Unknown profiler action")
+            return
+        
+        status = PROFILER.status()
+        if status['mode'] == 'sample':
+            state = f'Sampling route <strong>{html_escape(status["route"] or "all")}</strong> for {status["running_seconds"]}s ({status["samples"]} samples)'
+        elif status['mode'] == 'cprofile':
+            state = f'cProfile on route <strong>{html_escape(status["route"] or "all")}</strong>, {status["remaining_requests"]} requests to go'
+        else:
+            state = 'Idle'
+        result_preview = ''
+        if status['has_result']:
+            preview = '\n'.join(PROFILER.result.splitlines()[:40])
+            result_preview = f'<h3>Last result ({status["result_mode"]})</h3><p><a href="/admin/profile/result?token={current_token}">Download full output</a></p><pre style="background: #f8f9fa; padding: 10px; overflow-x: auto; font-size: 12px;">{html_escape(preview)}</pre>'
+        routes = ''.join(f'<option value="{name}">{name}</option>' for name in ('', 'directory', 'file', 'stream', 'download', 'raw', 'login', 'admin', 'root', 'other'))
+        admin_checked = ' checked' if self.SERVER_TIMING_ADMIN else ''
+        timing_form = f'<form action="/admin/profile/timing" method="get"><input type="hidden" name="token" value="{current_token}"><strong>Server-Timing</strong><br><br>Sample rate <input name="rate" value="{self.SERVER_TIMING_RATE:g}" size="4"> <label><input type="checkbox" name="admin" value="1"{admin_checked}> Always for my requests</label><button type="submit">Apply</button><br><small>Timed responses carry a Server-Timing header (auth, sweep, access, db, fs, render) shown in the browser devtools; the access log also gets the body write time.</small></form>'
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Profiler</title><meta name="viewport" content="width=device-width, initial-scale=1"><style>body{{font-family: Arial, sans-serif; max-width: 900px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}form{{background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0;}}input,select{{padding: 5px; margin-right: 8px;}}button{{padding: 6px 14px; background: #e8590c; color: white; border: none; border-radius: 4px; cursor: pointer;}}</style></head><body><h1>🔥 Profiler</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/metrics?token={current_token}">📈 Metrics</a></div><div style="background: #d1ecf1; padding: 10px; border-radius: 5px; margin: 20px 0;"><strong>Status:</strong> {state} <a href="/admin/profile/stop?token={current_token}" style="margin-left: 10px;">Stop</a></div><form action="/admin/profile/start" method="get"><input type="hidden" name="token" value="{current_token}"><input type="hidden" name="mode" value="sample"><strong>Stack sampling</strong><br><br>Route <select name="route">{routes}</select> Seconds <input name="seconds" value="30" size="4"> Interval ms <input name="interval_ms" value="5" size="4"><button type="submit">Start</button></form><form action="/admin/profile/start" method="get"><input type="hidden" name="token" value="{current_token}"><input type="hidden" name="mode" value="cprofile"><strong>cProfile</strong><br><br>Route <select name="route">{routes}</select> Requests <input name="requests" value="10" size="4"><button type="submit">Start</button></form><p><small>Sampling output is in collapsed-stack format for flamegraph.pl or speedscope.</small></p>{timing_form}{result_preview}</body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+
+    def handle_memory_request(self):
+        """Registry sizes, tracemalloc snapshots and a per-thread memory view"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        action = self.path[len('/admin/memory'):].strip('/')
+        params = self.get_query_params()
+        
+        if action == 'json':
+            current, peak = MEMORY.traced_memory()
+            report = {
+                'rss_bytes': process_rss(),
+                'tracing': MEMORY.tracing,
+                'traced_current_bytes': current,
+                'traced_peak_bytes': peak,
+                'registries': [{'name': name, 'entries': entries, 'bytes': size}
+                               for name, entries, size in self.registry_sizes()],
+                'threads': MEMORY.thread_breakdown(self.in_flight_routes),
+                'top_allocations': [{'site': site, 'bytes': size, 'count': count}
+                                    for site, size, count in MEMORY.top_allocations()],
+                'diff': [{'site': site, 'bytes_diff': size_diff, 'bytes': size, 'count_diff': count_diff}
+                         for site, size_diff, size, count_diff in MEMORY.diff()],
+            }
+            body = json.dumps(report, indent=2).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.add_security_headers()
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        if action in ('start', 'stop', 'snapshot'):
+            if action == 'start':
+                try:
+                    MEMORY.start(max(1, int(params.get('frames', 1))))
+                except ValueError:
+                    self.send_error(400, "Invalid frame count")
+                    return
+                MEMORY.take_snapshot('baseline')
+                self.ADMIN_NOTIFICATIONS.append('Memory tracing started')
+            elif action == 'stop':
+                MEMORY.stop()
+                self.ADMIN_NOTIFICATIONS.append('Memory tracing stopped')
+            elif MEMORY.take_snapshot(params.get('label') or None):
+                self.ADMIN_NOTIFICATIONS.append('Memory snapshot taken')
+            else:
+                self.ADMIN_NOTIFICATIONS.append('Start memory tracing before taking snapshots')
+            self.send_response(302)
+            self.send_header('Location', f'/admin/memory?token={current_token}')
+            self.end_headers()
+            return
+        
+        if action:
+            self.send_error(404, "Unknown memory action")
+            return
+        
+        rss = process_rss()
+        current, peak = MEMORY.traced_memory()
+        if MEMORY.tracing:
+            snapshots = ', '.join(html_escape(label) for label, _, _ in MEMORY.snapshots) or 'none'
+            state = f'Tracing - {self.format_size(current)} traced, peak {self.format_size(peak)}. Snapshots: {snapshots} <a href="/admin/memory/stop?token={current_token}" style="margin-left: 10px;">Stop</a>'
+        else:
+            state = 'Tracing off'
+        
+        registry_rows = ''.join(
+            f'<tr><td>{name}</td><td>{entries}</td><td>{self.format_size(size) if size is not None else "-"}</td></tr>'
+            for name, entries, size in self.registry_sizes())
+        thread_rows = ''.join(
+            f'<tr><td>{html_escape(entry["thread"])}</td><td>{entry["route"] or "-"}</td><td>{entry["stack_depth"]}</td><td>{self.format_size(entry["referenced_bytes"])}</td></tr>'
+            for entry in MEMORY.thread_breakdown(self.in_flight_routes))
+        
+        allocations = ''
+        diff = MEMORY.diff()
+        if diff:
+            rows = ''.join(f'<tr><td>{html_escape(site)}</td><td>{size_diff:+,}</td><td>{self.format_size(size)}</td><td>{count_diff:+,}</td></tr>'
+                           for site, size_diff, size, count_diff in diff)
+            allocations = f'<h3>Growth between the last two snapshots</h3><table><tr><th>Allocation site</th><th>Bytes</th><th>Now</th><th>Blocks</th></tr>{rows}</table>'
+        elif MEMORY.snapshots:
+            rows = ''.join(f'<tr><td>{html_escape(site)}</td><td>{self.format_size(size)}</td><td>{count:,}</td></tr>'
+                           for site, size, count in MEMORY.top_allocations())
+            allocations = f'<h3>Top allocation sites</h3><table><tr><th>Allocation site</th><th>Size</th><th>Blocks</th></tr>{rows}</table>'
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Memory</title><meta name="viewport" content="width=device-width, initial-scale=1"><style>body{{font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}form{{background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0;}}input{{padding: 5px; margin-right: 8px;}}button{{padding: 6px 14px; background: #6f42c1; color: white; border: none; border-radius: 4px; cursor: pointer;}}table{{width: 100%; border-collapse: collapse; margin: 10px 0; font-size: 13px;}}th,td{{padding: 6px; border: 1px solid #ddd; text-align: left; word-break: break-all;}}th{{background: #f8f9fa;}}</style></head><body><h1>🧠 Memory</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/profile?token={current_token}">🔥 Profiler</a><a href="/admin/memory/json?token={current_token}">JSON</a></div><div style="background: #d1ecf1; padding: 10px; border-radius: 5px; margin: 20px 0;"><strong>RSS:</strong> {self.format_size(rss) if rss else "unknown"}<br><strong>tracemalloc:</strong> {state}</div><form action="/admin/memory/start" method="get"><input type="hidden" name="token" value="{current_token}">Traceback frames <input name="frames" value="1" size="3"><button type="submit">Start tracing</button></form><form action="/admin/memory/snapshot" method="get"><input type="hidden" name="token" value="{current_token}">Label <input name="label" size="12"><button type="submit">Take snapshot</button></form>{allocations}<h3>Registries and caches</h3><table><tr><th>Name</th><th>Entries</th><th>Approx. size</th></tr>{registry_rows}</table><h3>Threads</h3><p><small>Bytes reachable from each thread&#39;s stack frames; CPython does not attribute heap allocations to threads.</small></p><table><tr><th>Thread</th><th>Route</th><th>Frames</th><th>Referenced</th></tr>{thread_rows}</table></body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+    
+    def send_slow_requests_page(self):
+        """Show stacks captured from requests that ran past the slow-request threshold"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        if self.path == '/admin/slow-requests/clear':
+            WATCHDOG.clear()
+            self.ADMIN_NOTIFICATIONS.append('Slow request captures cleared')
+            self.send_response(302)
+            self.send_header('Location', f'/admin/slow-requests?token={current_token}')
+            self.end_headers()
+            return
+        
+        now = time.perf_counter()
+        running_html = ''
+        for started, route, user, path in self.in_flight_requests().values():
+            running_html += f'<tr><td>{route}</td><td>{html_escape(str(user or "-"))}</td><td>{html_escape(path)}</td><td>{now - started:.1f}s</td></tr>'
+        
+        captures_html = ''
+        for capture in WATCHDOG.recent():
+            captured_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture['captured_at']))
+            captures_html += f'<div style="background: #fff3cd; padding: 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #ffc107;"><h4 style="margin: 0 0 10px 0;">🐢 {capture["route"]} - {html_escape(capture["path"])}</h4><p><strong>User:</strong> {html_escape(str(capture["user"] or "-"))} | <strong>Running for:</strong> {capture["elapsed"]:.1f}s | <strong>Captured:</strong> {captured_at}</p><pre style="background: #f8f9fa; padding: 10px; overflow-x: auto; font-size: 12px;">{html_escape(capture["stack"])}</pre></div>'
+        if not captures_html:
+            captures_html = f'<div style="text-align: center; padding: 40px; color: #666;">No requests have run longer than {WATCHDOG.threshold:g}s</div>'
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Slow Requests</title><meta name="viewport" content="width=device-width, initial-scale=1"><meta http-equiv="refresh" content="10"><style>body{{font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}table{{width: 100%; border-collapse: collapse; margin: 10px 0; font-size: 13px;}}th,td{{padding: 6px; border: 1px solid #ddd; text-align: left; word-break: break-all;}}th{{background: #f8f9fa;}}</style></head><body><h1>🐢 Slow Requests</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/profile?token={current_token}">🔥 Profiler</a><a href="/admin/slow-requests/clear?token={current_token}">Clear</a></div><div style="background: #d1ecf1; padding: 10px; border-radius: 5px; margin: 20px 0;">Stacks are captured once per request running longer than <strong>{WATCHDOG.threshold:g}s</strong> (ignoring {", ".join(sorted(WATCHDOG.ignore_routes)) or "nothing"}). The newest {WATCHDOG.captures.maxlen} are kept.</div><h3>In flight now</h3><table><tr><th>Route</th><th>User</th><th>Path</th><th>Elapsed</th></tr>{running_html}</table><h3>Captured</h3>{captures_html}</body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+
+    def send_storage_page(self):
+        """Largest shared folders and files, read from the background size aggregates"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        roots, folders, files = FOLDER_SIZES.report(Config.STORAGE_REPORT_LIMIT)
+        
+        def folder_rows(rows):
+            return ''.join(f'<tr><td><a href="{urllib.parse.quote(path)}?token={current_token}">{html_escape(path)}</a></td><td>{self.format_size(size)}</td><td>{file_count}</td><td>{folder_count}</td></tr>' for path, size, file_count, folder_count in rows)
+        
+        files_html = ''.join(f'<tr><td>{html_escape(path)}</td><td>{self.format_size(size)}</td></tr>' for path, size in files)
+        if FOLDER_SIZES.last_pass:
+            finished, seconds, listed = FOLDER_SIZES.last_pass
+            status = f'Last full pass {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished))}: {listed} folders listed in {seconds:.1f}s'
+        else:
+            status = 'The first pass is still running; totals fill in as it goes'
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Storage</title><meta name="viewport" content="width=device-width, initial-scale=1"><style>body{{font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}table{{width: 100%; border-collapse: collapse; margin: 10px 0; font-size: 13px;}}th,td{{padding: 6px; border: 1px solid #ddd; text-align: left; word-break: break-all;}}th{{background: #f8f9fa;}}</style></head><body><h1>💾 Storage</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/shared-paths?token={current_token}">📁 Manage Shared Folders</a><a href="/admin/duplicates?token={current_token}">👯 Duplicates</a></div><div style="background: #d1ecf1; padding: 10px; border-radius: 5px; margin: 20px 0;">{status}</div><h3>Shared folders</h3><table><tr><th>Folder</th><th>Size</th><th>Files</th><th>Folders</th></tr>{folder_rows(roots)}</table><h3>Largest folders</h3><table><tr><th>Folder</th><th>Size</th><th>Files</th><th>Folders</th></tr>{folder_rows(folders)}</table><h3>Largest files</h3><table><tr><th>File</th><th>Size</th></tr>{files_html}</table></body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+
+    def send_duplicates_page(self):
+        """Start a duplicate scan, or show its progress and the groups found by the last one"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        if self.path == '/admin/duplicates/scan':
+            if DUPLICATES.start_scan():
+                self.ADMIN_NOTIFICATIONS.append('Duplicate scan started')
+            self.send_response(302)
+            self.send_header('Location', f'/admin/duplicates?token={current_token}')
+            self.end_headers()
+            return
+        
+        refresh = ''
+        progress = DUPLICATES.progress
+        if progress:
+            stage, done, total = progress
+            refresh = '<meta http-equiv="refresh" content="3">'
+            status = f'Scanning: {stage} {done}' + (f' of {total}' if total else '')
+        elif DUPLICATES.error:
+            status = f'The last scan failed: {html_escape(DUPLICATES.error)}'
+        elif DUPLICATES.last_scan:
+            finished, seconds, seen, hashed = DUPLICATES.last_scan
+            status = f'Last scan {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished))}: {seen} files in {seconds:.1f}s, {hashed} hashes computed (unique sizes and unchanged files need none)'
+        else:
+            status = 'No scan since the server started; groups below are from the stored hashes'
+        
+        groups, reclaimable = DUPLICATES.groups(Config.DUPLICATES_REPORT_LIMIT)
+        groups_html = ''
+        for size, paths in groups:
+            paths_html = ''.join(f'<li>{html_escape(path)}</li>' for path in paths)
+            groups_html += f'<div style="background: #f8f9fa; padding: 10px 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #d63384;"><strong>{len(paths)} copies of {self.format_size(size)}</strong> - {self.format_size(size * (len(paths) - 1))} reclaimable<ul style="margin: 5px 0; font-size: 13px; word-break: break-all;">{paths_html}</ul></div>'
+        if not groups_html:
+            groups_html = '<div style="text-align: center; padding: 40px; color: #666;">No duplicates found</div>'
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Duplicates</title><meta name="viewport" content="width=device-width, initial-scale=1">{refresh}<style>body{{font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}</style></head><body><h1>👯 Duplicate Files</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/storage?token={current_token}">💾 Storage</a><a href="/admin/duplicates/scan?token={current_token}">🔄 Scan Now</a></div><div style="background: #d1ecf1; padding: 10px; border-radius: 5px; margin: 20px 0;">{status}</div><h3>{self.format_size(reclaimable)} reclaimable by keeping one copy of each file</h3>{groups_html}</body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+
+    def send_bandwidth_page(self):
+        """Show active streams and adjust bandwidth caps live"""
+        current_token = None
+        for token, data in self.VALID_TOKENS.items():
+            if data['user'] == 'admin':
+                current_token = token
+                break
+        
+        if self.path == '/admin/bandwidth/set':
+            params = self.get_query_params()
+            try:
+                # Caps are entered in MB/s; blank or 0 means unlimited
+                caps = {name: float(params.get(name) or 0) for name in ('global_rate', 'user_rate', 'ip_rate')}
+                if not all(math.isfinite(cap) and cap >= 0 for cap in caps.values()):
+                    raise ValueError('caps must be finite and non-negative')
+                rates = {name: int(cap * 1024 * 1024) for name, cap in caps.items()}
+                weights = {kind: max(1, int(params.get(f'{kind}_weight') or BANDWIDTH.weights[kind]))
+                           for kind in ('media', 'bulk')}
+            except (ValueError, OverflowError):
+                self.send_error(400, "Invalid bandwidth limits")
+                return
+            BANDWIDTH.configure(weights=weights, **rates)
+            ACCESS_LOG.event('bandwidth_limits', **rates, weights=weights)
+            self.ADMIN_NOTIFICATIONS.append('Bandwidth limits updated')
+            self.send_response(302)
+            self.send_header('Location', f'/admin/bandwidth?token={current_token}')
+            self.end_headers()
+            return
+        
+        def mb(rate):
+            return f'{rate / (1024 * 1024):g}' if rate else ''
+        
+        now = time.time()
+        streams_html = ''
+        for stream in sorted(BANDWIDTH.active_streams(), key=lambda s: s.started):
+            elapsed = max(now - stream.started, 0.001)
+            icon = '🎬' if stream.kind == 'media' else '📦'
+            streams_html += f'<tr><td>{icon} {stream.kind}</td><td>{html_escape(str(stream.user or "-"))}</td><td>{stream.ip}</td><td>{html_escape(stream.label)}</td><td>{self.format_size(stream.bytes_sent)}</td><td>{self.format_size(stream.bytes_sent / elapsed)}/s</td><td>{stream.throttled:.1f}s</td></tr>'
+        if not streams_html:
+            streams_html = '<tr><td colspan="7" style="text-align: center; color: #666;">No active streams</td></tr>'
+        lanes_html = ''.join(f'<tr><td>{name}</td><td>{active} / {limit or "∞"}</td><td>{waiting}</td><td>{rejected}</td></tr>'
+                             for name, active, limit, waiting, rejected in LANES.status())
+        
+        html = f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>Bandwidth</title><meta name="viewport" content="width=device-width, initial-scale=1"><style>body{{font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px;}}.nav a{{display: inline-block; padding: 8px 16px; margin: 5px; background: #007bff; color: white; text-decoration: none; border-radius: 4px;}}form{{background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0;}}input{{padding: 5px; margin: 0 12px 0 4px;}}button{{padding: 6px 14px; background: #20c997; color: white; border: none; border-radius: 4px; cursor: pointer;}}table{{width: 100%; border-collapse: collapse; margin: 10px 0; font-size: 13px;}}th,td{{padding: 6px; border: 1px solid #ddd; text-align: left;}}th{{background: #f8f9fa;}}</style></head><body><h1>🚦 Bandwidth</h1><div class="nav"><a href="/admin?token={current_token}">← Back to Admin Panel</a><a href="/admin/bandwidth?token={current_token}">🔄 Refresh</a></div><form action="/admin/bandwidth/set" method="get"><input type="hidden" name="token" value="{current_token}"><strong>Caps in MB/s</strong> (blank = unlimited)<br><br>Global<input name="global_rate" value="{mb(BANDWIDTH.global_rate)}" size="5">Per user<input name="user_rate" value="{mb(BANDWIDTH.user_rate)}" size="5">Per IP<input name="ip_rate" value="{mb(BANDWIDTH.ip_rate)}" size="5"><br><br><strong>Fair-share weights</strong> Media<input name="media_weight" value="{BANDWIDTH.weights["media"]}" size="3">Downloads<input name="bulk_weight" value="{BANDWIDTH.weights["bulk"]}" size="3"><button type="submit">Apply</button><br><small>When a cap is contended, each stream gets bandwidth in proportion to its weight, so video keeps playing while bulk downloads slow down.</small></form><h3>Active streams</h3><table><tr><th>Type</th><th>User</th><th>IP</th><th>File</th><th>Sent</th><th>Average</th><th>Throttled</th></tr>{streams_html}</table><h3>Request lanes</h3><table><tr><th>Lane</th><th>Running</th><th>Waiting</th><th>Refused</th></tr>{lanes_html}</table></body></html>'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(html.encode('utf-8'))
+
+def record_slow_request(capture):
+    metrics.SLOW_REQUESTS.labels(capture['route']).inc()
+    ACCESS_LOG.event('slow_request', route=capture['route'], user=capture['user'], path=capture['path'],
+                     elapsed=capture['elapsed'], stack=capture['stack'])
+
+WATCHDOG = SlowRequestWatchdog(AuthFileHandler.in_flight_requests,
+                               threshold=Config.SLOW_REQUEST_SECONDS,
+                               interval=Config.SLOW_REQUEST_CHECK_INTERVAL,
+                               capacity=Config.SLOW_REQUEST_HISTORY,
+                               ignore_routes=Config.SLOW_REQUEST_IGNORE_ROUTES,
+                               on_capture=record_slow_request)
+
+def search_roots():
+    """Shared paths plus the admin-only roots, as {path: is_file} for the search indexer"""
+    roots = dict(AuthFileHandler.get_shared_paths())
+    for path in Config.SEARCH_INDEX_ADMIN_ROOTS:
+        roots.setdefault(path, False)
+    return roots
+
+SEARCH_INDEX = SearchIndex(Config.get_search_index_path(), search_roots,
+                           interval=Config.SEARCH_INDEX_INTERVAL_SECONDS)
+
+def count_changes(events):
+    for event in events:
+        metrics.FS_CHANGES.labels(event['type']).inc()
+
+def index_changes(events):
+    """Point the search index at exactly the folders and files that changed"""
+    folders, files = set(), set()
+    for event in events:
+        if event['type'] == 'rescan':
+            SEARCH_INDEX.refresh()  # The watcher lost events
+            return
+        if event['type'] == 'modified' and not event['is_dir']:
+            files.add(event['path'])
+        else:
+            folders.add(os.path.dirname(event['path']))  # The parent's listing changed
+    SEARCH_INDEX.changed(folders, files)
+
+FOLDER_SIZES = FolderSizes(Config.get_folder_sizes_path(), search_roots,
+                           interval=Config.FOLDER_SIZES_INTERVAL_SECONDS,
+                           keep_largest=Config.STORAGE_REPORT_LIMIT)
+
+DUPLICATES = DuplicateFinder(Config.get_duplicates_path(), search_roots,
+                             workers=Config.DUPLICATES_WORKERS, min_size=Config.DUPLICATES_MIN_BYTES)
+
+def size_changes(events):
+    """Re-list the folders whose direct contents changed; totals above them follow"""
+    if any(event['type'] == 'rescan' for event in events):
+        FOLDER_SIZES.refresh()
+        return
+    FOLDER_SIZES.changed({os.path.dirname(event['path']) for event in events})
+
+WATCHER = FileWatcher(search_roots,
+                      interval=Config.WATCHER_INTERVAL_SECONDS,
+                      debounce=Config.WATCHER_DEBOUNCE_SECONDS,
+                      capacity=Config.CHANGE_FEED_CAPACITY,
+                      on_fallback=lambda reason: ACCESS_LOG.event('watcher_fallback', reason=reason))
+def stat_changes(events):
+    """Drop cached stats for changed paths and their parents, whose mtimes moved too"""
+    if any(event['type'] == 'rescan' for event in events):
+        STAT_CACHE.clear()
+        return
+    paths = {event['path'] for event in events} | {os.path.dirname(event['path']) for event in events}
+    STAT_CACHE.invalidate(paths, [event['path'] for event in events if event['type'] == 'deleted' and event['is_dir']])
+
+WATCHER.subscribe(count_changes)
+WATCHER.subscribe(stat_changes)
+WATCHER.subscribe(index_changes)
+WATCHER.subscribe(size_changes)
+
 def cleanup_admin_password():
     """Clear admin password from memory for security"""
     AuthFileHandler.ADMIN_PASSWORD = None
@@ -1465,6 +2890,14 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
     allow_reuse_address = True
     
+    def server_activate(self):
+        self.socket.listen(SOCKET_PROFILE.backlog)
+    
+    def get_request(self):
+        connection, address = super().get_request()
+        SOCKET_PROFILE.configure_connection(connection)
+        return connection, address
+    
     def handle_error(self, request, client_address):
         """Handle errors - suppress common video streaming connection errors"""
         import sys
@@ -1494,18 +2927,35 @@ def create_server(port=None, host=None):
     """Create and return threaded HTTP server instance without starting it"""
     port = port or Config.DEFAULT_PORT
     host = host or Config.HOST
+    # Fork the worker pools up front; their initializer releases whatever fds the process holds by now
+    GREP.start()
+    CHECKSUMS.start()
+    WATCHDOG.start()
+    SEARCH_INDEX.start()
+    FOLDER_SIZES.start()
+    if Config.WATCHER_ENABLED:
+        WATCHER.start()
     return ThreadedHTTPServer((host, port), AuthFileHandler)
 
+def shutdown_workers():
+    """Stop the worker process pools started by create_server"""
+    GREP.shutdown()
+    CHECKSUMS.shutdown()
+    DUPLICATES.shutdown()
+
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt  # Same clean shutdown as Ctrl+C
+
 def main():
     # Initialize database
     AuthFileHandler.init_db()
     
+    server = create_server()
+    
     # Initialize remote control if available
     if RemoteControl:
         remote_control = RemoteControl()
         remote_control.start_background_check()
-    
-    server = create_server()
     local_ip = get_local_ip()
     PORT = Config.DEFAULT_PORT
     
@@ -1514,6 +2964,7 @@ def main():
     print("="*60)
     print(f"📱 MOBILE ACCESS: http://{local_ip}:{PORT}")
     print(f"💻 COMPUTER ACCESS: http://localhost:{PORT}")
+    print(f"📝 ACCESS LOG: {os.path.abspath(ACCESS_LOG.path)}")
     print("\n🔑 ADMIN LOGIN:")
     print("   Username: admin")
     print("   Password: Check Desktop file 'FileShare_Admin_Password.txt'")
@@ -1528,6 +2979,7 @@ def main():
     print("   • Or close this window")
     print("="*60)
     
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
     try:
         print("\n⚠️  To stop server: Press Ctrl+C or close this window")
         print("🔒 Server will stop automatically when this window closes\n")
@@ -1540,7 +2992,9 @@ def main():
             except:
                 pass
         server.shutdown()
+        shutdown_workers()
         cleanup_admin_password()
+        ACCESS_LOG.close()
         print("✅ Server stopped successfully")
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+In-process metrics registry with OpenMetrics text exposition
+"""
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from fast cached pages to multi-minute downloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager observing elapsed wall time into a histogram child"""
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> child
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Return the child series for the given label values, creating it once"""
+        child = self._series.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._series.get(values)
+                if child is None:
+                    child = self._series[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def series(self):
+        with self._lock:
+            return list(self._series.items())
+
+    def render(self):
+        lines = [f'# TYPE {self.name} {self.metric_type}', f'# HELP {self.name} {self.help}']
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_samples(self):
+        for values, child in self.series():
+            yield f'{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        self.callback = callback  # Sampled at scrape time when set
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def _render_samples(self):
+        if self.callback is not None:
+            self._default.set(self.callback())
+        for values, child in self.series():
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return _Timer(self._default)
+
+    def _render_samples(self):
+        for values, child in self.series():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ('le', _format_value(float(bound))))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_count{labels} {cumulative}'
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together"""
+
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), callback=None):
+        return self.register(Gauge(name, help_text, labelnames, callback))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def series_count(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return sum(len(metric.series()) for metric in metrics)
+
+    def render(self):
+        """Render every metric in OpenMetrics text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# File-share server instruments
+REQUEST_DURATION = REGISTRY.histogram(
+    'fileshare_request_duration_seconds', 'Time spent handling a request', ('route',))
+REQUESTS = REGISTRY.counter(
+    'fileshare_requests', 'Requests handled', ('route', 'status'))
+RESPONSE_BYTES = REGISTRY.counter(
+    'fileshare_response_bytes', 'Bytes written to clients including headers', ('route',))
+ACTIVE_STREAMS = REGISTRY.gauge(
+    'fileshare_active_streams', 'Downloads and media streams in progress')
+THREADS = REGISTRY.gauge(
+    'fileshare_threads', 'Live threads in the server process', callback=threading.active_count)
+LOGIN_KDF_DURATION = REGISTRY.histogram(
+    'fileshare_login_kdf_seconds', 'Time spent deriving PBKDF2 password hashes')
+DB_QUERY_DURATION = REGISTRY.histogram(
+    'fileshare_db_query_seconds', 'Time spent in SQLite queries', ('query',))
+LOG_EVENTS_DROPPED = REGISTRY.counter(
+    'fileshare_log_events_dropped', 'Log entries dropped because the writer queue was full')
+SLOW_REQUESTS = REGISTRY.counter(
+    'fileshare_slow_requests', 'Requests that ran past the slow-request threshold', ('route',))
+STREAMS_REJECTED = REGISTRY.counter(
+    'fileshare_streams_rejected', 'Streams refused by a concurrency cap', ('reason',))
+LANE_ACTIVE = REGISTRY.gauge(
+    'fileshare_lane_active_requests', 'Requests running in each lane', ('lane',))
+LANE_WAIT = REGISTRY.histogram(
+    'fileshare_lane_wait_seconds', 'Time requests waited for a lane slot', ('lane',))
+LANE_REJECTED = REGISTRY.counter(
+    'fileshare_lane_rejected', 'Requests refused because their lane stayed full', ('lane',))
+CONNECTION_TIMEOUTS = REGISTRY.counter(
+    'fileshare_connection_timeouts', 'Connections closed for being idle or too slow', ('phase',))
+GREP_QUERIES = REGISTRY.counter(
+    'fileshare_grep_queries', 'Content searches by how they ended', ('outcome',))
+FS_CHANGES = REGISTRY.counter(
+    'fileshare_fs_changes', 'Filesystem changes seen by the watcher under shared paths', ('type',))
+STAT_CACHE_ENTRIES = REGISTRY.gauge(
+    'fileshare_stat_cache_entries', 'Paths with a cached stat result, including missing ones')
+FILE_CACHE_EVICTIONS = REGISTRY.counter(
+    'fileshare_file_cache_evictions', 'Small-file bodies evicted to stay within the cache budget')
+FILE_CACHE_BYTES = REGISTRY.gauge(
+    'fileshare_file_cache_bytes', 'Bytes of file bodies held in the small-file cache')
+FD_CACHE_EVICTIONS = REGISTRY.counter(
+    'fileshare_fd_cache_evictions', 'Idle file descriptors closed to stay under the fd cache ceiling')
+FD_CACHE_OPEN = REGISTRY.gauge(
+    'fileshare_fd_cache_open', 'File descriptors held open by the fd cache')
+CACHE_LOOKUPS = REGISTRY.counter(
+    'fileshare_cache_lookups', 'Cache lookups by outcome', ('cache', 'result'))
+
+# Pre-bound series for the hottest cache lookups
+SHARED_PATHS_CACHE_HITS = CACHE_LOOKUPS.labels('shared_paths', 'hit')
+SHARED_PATHS_CACHE_MISSES = CACHE_LOOKUPS.labels('shared_paths', 'miss')
+TEMPLATE_CACHE_HITS = CACHE_LOOKUPS.labels('templates', 'hit')
+TEMPLATE_CACHE_MISSES = CACHE_LOOKUPS.labels('templates', 'miss')
+FILE_CACHE_HITS = CACHE_LOOKUPS.labels('file_bodies', 'hit')
+FILE_CACHE_MISSES = CACHE_LOOKUPS.labels('file_bodies', 'miss')
+FD_CACHE_HITS = CACHE_LOOKUPS.labels('fds', 'hit')
+FD_CACHE_MISSES = CACHE_LOOKUPS.labels('fds', 'miss')
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Readahead hints - tell the kernel how streams and downloads will read a file
+"""
+import os
+
+# posix_fadvise is missing on Windows and macOS; hints are then skipped
+SUPPORTED = hasattr(os, 'posix_fadvise')
+
+
+def advise(fd, offset, length, advice_name):
+    """posix_fadvise by advice name, ignoring platforms and filesystems that don't take hints"""
+    if not SUPPORTED:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+    except (OSError, AttributeError):
+        pass
+
+
+class Prefetcher:
+    """Keep a readahead window requested ahead of a sequential reader.
+
+    With sequential, the range being served is marked SEQUENTIAL, which
+    widens the kernel's own readahead; that costs nothing up front and
+    stands apart from the window. As the reader advances, the window
+    after it is requested each time the reader gets within half a window
+    of the end of what was asked for, so slow devices have the next reads
+    queued before the reader needs them. The first window is never
+    requested up front: WILLNEED queues its reads in the caller, which
+    would only delay the first bytes of every Range request.
+    finish(drop=True) evicts the pages read, so one big download doesn't
+    push hot media out of the page cache.
+    """
+
+    def __init__(self, fd, start, end, window, sequential=False):
+        self.fd = fd
+        self.start = start
+        self.end = end  # Exclusive
+        self.window = window
+        self.position = start
+        self.requested = min(end, start + max(window, 0))  # Left to the kernel's readahead
+        if sequential:
+            advise(fd, start, end - start, 'POSIX_FADV_SEQUENTIAL')
+
+    def _request(self):
+        length = min(self.window, self.end - self.requested)
+        if length > 0:
+            advise(self.fd, self.requested, length, 'POSIX_FADV_WILLNEED')
+            self.requested += length
+
+    def advance(self, position):
+        """Note that the reader has consumed everything before position"""
+        self.position = position
+        if self.window > 0 and self.requested - position < self.window // 2:
+            self._request()
+
+    def finish(self, drop=False):
+        if drop and self.position > self.start:
+            advise(self.fd, self.start, self.position - self.start, 'POSIX_FADV_DONTNEED')
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Filename search index - a background crawler keeps names, sizes and mtimes of shared trees in SQLite
+"""
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+try:
+    from app.tree_paths import roots_top_level, subtree_condition
+except ImportError:
+    from tree_paths import roots_top_level, subtree_condition
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        parent TEXT NOT NULL,
+        name TEXT NOT NULL,
+        is_dir BOOLEAN NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+    CREATE TABLE IF NOT EXISTS dirs (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS roots (
+        path TEXT PRIMARY KEY
+    );
+'''
+
+# Trigram tokens let FTS5 answer substring queries, not just whole words
+FTS_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, content='entries', content_rowid='id', tokenize='trigram');
+    CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO names (rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+        INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name);
+    END;
+'''
+
+COMMIT_EVERY = 5000  # Rows written per transaction while crawling
+SCOPE_SCAN_ROWS = 5000  # Entries of a user's shares scanned directly before falling back to FTS
+
+
+class SearchIndex:
+    """Name index over the shared folders, refreshed incrementally in the background.
+
+    Each pass stats every indexed directory and only lists the ones whose
+    mtime changed, since adding, removing or renaming an entry always bumps
+    the mtime of its parent. Size and mtime changes made in place to existing
+    files are picked up the next time their directory changes, or straight
+    away when a watcher reports them through changed().
+    """
+
+    def __init__(self, db_path, roots, interval=60.0):
+        self.db_path = db_path
+        self.roots = roots  # Callable returning {path: is_file} to crawl
+        self.interval = interval
+        self.fts = True
+        self.last_pass = None  # (finished, seconds, directories listed, entries changed)
+        self.indexing = False
+        self._full = True  # Next wake-up runs a full pass rather than only the changed paths
+        self._dirty_folders = set()
+        self._dirty_files = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')  # Searches keep reading while the crawler writes
+        conn.execute('PRAGMA synchronous=NORMAL')  # The index can always be rebuilt from disk
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                conn = self.connect()
+                try:
+                    conn.executescript(SCHEMA)
+                    try:
+                        conn.executescript(FTS_SCHEMA)
+                    except sqlite3.OperationalError:
+                        self.fts = False  # SQLite built without FTS5 or trigram; searches scan names
+                finally:
+                    conn.close()
+                self._thread = threading.Thread(target=self._run, name='search-indexer', daemon=True)
+                self._thread.start()
+        return self
+
+    def refresh(self):
+        """Run a full pass now instead of waiting for the interval"""
+        self._full = True
+        self._wake.set()
+
+    def changed(self, folders=(), files=()):
+        """Re-list these folders and re-stat these files soon, without a full pass"""
+        with self._lock:
+            self._dirty_folders.update(folders)
+            self._dirty_files.update(files)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                if self._full:
+                    self._full = False
+                    self.update()
+                else:
+                    self.update_changed()
+            except (OSError, sqlite3.Error):
+                pass  # Try again next interval
+            if not self._wake.wait(self.interval):
+                self._full = True
+            self._wake.clear()
+
+    def update(self):
+        """Bring the index in line with the current roots and the filesystem"""
+        started = time.perf_counter()
+        self.indexing = True
+        conn = self.connect()
+        try:
+            roots = roots_top_level(self.roots())
+            stored = {row[0] for row in conn.execute('SELECT path FROM roots')}
+            for path in stored - set(roots):
+                self._forget(conn, path)
+                conn.execute('DELETE FROM roots WHERE path = ?', (path,))
+            listed = changed = 0
+            for path, is_file in roots.items():
+                if path not in stored:
+                    conn.execute('INSERT INTO roots (path) VALUES (?)', (path,))
+                dirs, rows = self._crawl(conn, path, is_file)
+                listed += dirs
+                changed += rows
+            conn.commit()
+        finally:
+            conn.close()
+            self.indexing = False
+        self.last_pass = (time.time(), time.perf_counter() - started, listed, changed)
+
+    def update_changed(self):
+        """Apply the folders and files reported through changed()"""
+        with self._lock:
+            folders, self._dirty_folders = self._dirty_folders, set()
+            files, self._dirty_files = self._dirty_files, set()
+        if not folders and not files:
+            return
+        conn = self.connect()
+        try:
+            roots = [row[0] for row in conn.execute('SELECT path FROM roots')]
+
+            def indexed(path):
+                return any(path == root or path.startswith(root.rstrip('/') + '/') for root in roots)
+
+            for path in files:
+                if not indexed(path):
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    if path in roots:
+                        self._forget(conn, path)  # A shared file is gone; its parent isn't indexed
+                    continue
+                conn.execute('UPDATE entries SET size = ?, mtime = ? WHERE path = ? AND is_dir = 0',
+                             (st.st_size, st.st_mtime, path))
+            pending = []
+            for path in folders:
+                if indexed(path):
+                    conn.execute('DELETE FROM dirs WHERE path = ?', (path,))
+                    try:
+                        pending.append((path, os.stat(path).st_mtime_ns))
+                    except OSError:
+                        pass  # Removed too; its parent's listing drops it
+            self._walk(conn, pending, deep=False)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _crawl(self, conn, root, is_file):
+        try:
+            st = os.stat(root)
+        except OSError:
+            self._forget(conn, root)
+            return 0, 0
+        row = self._row(os.path.dirname(root), os.path.basename(root) or root, root, st)
+        known = conn.execute('SELECT is_dir, size, mtime FROM entries WHERE path = ?', (root,)).fetchone()
+        changed = 0
+        if known is None or known[0] != row[3]:
+            self._forget(conn, root)
+            conn.execute('INSERT INTO entries (parent, name, path, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?, ?)', row)
+            changed = 1
+        elif known[1:] != row[4:]:
+            conn.execute('UPDATE entries SET size = ?, mtime = ? WHERE path = ?', row[4:] + (root,))
+            changed = 1
+        is_dir = row[3]
+        if is_file or not is_dir:
+            return 0, changed
+        listed, rows = self._walk(conn, [(root, st.st_mtime_ns)])
+        return listed, changed + rows
+
+    def _walk(self, conn, pending, deep=True):
+        """Re-list changed folders in pending (path, mtime_ns) and below; unchanged ones are only descended when deep"""
+        listed = changed = uncommitted = 0
+        while pending:
+            path, mtime_ns = pending.pop()
+            known = conn.execute('SELECT mtime_ns FROM dirs WHERE path = ?', (path,)).fetchone()
+            if known and known[0] == mtime_ns:
+                if not deep:
+                    continue
+                # Unchanged listing; only the subdirectories need checking
+                children = conn.execute('SELECT path FROM entries WHERE parent = ? AND is_dir = 1', (path,)).fetchall()
+                for (child,) in children:
+                    try:
+                        pending.append((child, os.stat(child).st_mtime_ns))
+                    except OSError:
+                        self._forget(conn, child)
+                        changed += 1
+                continue
+            rows = self._list(conn, path, pending)
+            conn.execute('INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)', (path, mtime_ns))
+            listed += 1
+            changed += rows
+            uncommitted += rows
+            if uncommitted >= COMMIT_EVERY:
+                conn.commit()  # Searches see a large first crawl fill in as it goes
+                uncommitted = 0
+        return listed, changed
+
+    def _list(self, conn, path, pending):
+        """Reconcile one directory's entries with the filesystem"""
+        stored = {name: (is_dir, size, mtime) for name, is_dir, size, mtime in
+                  conn.execute('SELECT name, is_dir, size, mtime FROM entries WHERE parent = ?', (path,))}
+        added, updated = [], []
+        try:
+            scan = list(os.scandir(path))
+        except OSError:
+            scan = []  # Unreadable now; drop what was indexed below it
+        for entry in scan:
+            try:
+                entry.path.encode('utf-8')  # Undecodable names can't be stored or served
+                st = entry.stat(follow_symlinks=False)
+            except (OSError, UnicodeEncodeError):
+                continue
+            row = self._row(path, entry.name, entry.path, st)
+            known = stored.pop(entry.name, None)
+            if known is None:
+                added.append(row)
+            elif known[0] != row[3]:
+                self._forget(conn, entry.path)  # Swapped between file and folder
+                added.append(row)
+            elif known[1:] != row[4:]:
+                updated.append(row[4:] + (entry.path,))
+            if row[3]:
+                pending.append((entry.path, st.st_mtime_ns))
+        for name in stored:
+            self._forget(conn, os.path.join(path, name))
+        # The name never changes on update, so the FTS index only needs the inserts
+        conn.executemany('UPDATE entries SET size = ?, mtime = ? WHERE path = ?', updated)
+        conn.executemany('INSERT INTO entries (parent, name, path, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?, ?)', added)
+        return len(added) + len(updated) + len(stored)
+
+    @staticmethod
+    def _row(parent, name, path, st):
+        is_dir = stat.S_ISDIR(st.st_mode)
+        return parent, name, path, is_dir, 0 if is_dir else st.st_size, st.st_mtime
+
+    @staticmethod
+    def _forget(conn, path):
+        condition, params = subtree_condition(path)
+        conn.execute(f'DELETE FROM entries WHERE {condition}', params)
+        conn.execute(f'DELETE FROM dirs WHERE {condition}', params)
+
+    def search(self, query, allowed=None, limit=100):
+        """Entries whose name contains every word of query, as (path, is_dir, size, mtime) tuples.
+
+        allowed maps shared paths to is_file; only those files and entries
+        inside those folders are returned. None means no restriction. The
+        first `limit` matches are returned, folders and shorter names first.
+        """
+        words = query.split()
+        if not words or allowed == {}:
+            return []
+        columns = 'path, is_dir, size, mtime'
+        conn = self.connect()
+        try:
+            scope, scope_params = self._scope(allowed)
+            if scope:
+                # Scanning the first entries in the shared paths answers small shares and common
+                # words without an FTS pass over matches the user may mostly not see
+                likes, like_params = self._name_contains(words)
+                rows = conn.execute(f'SELECT {columns} FROM (SELECT * FROM entries WHERE {scope} LIMIT ?) '
+                                    f'WHERE {" AND ".join(likes)} LIMIT ?',
+                                    scope_params + [SCOPE_SCAN_ROWS] + like_params + [limit]).fetchall()
+                if len(rows) < limit:
+                    scanned = conn.execute(f'SELECT COUNT(*) FROM (SELECT 1 FROM entries WHERE {scope} LIMIT ?)',
+                                           scope_params + [SCOPE_SCAN_ROWS]).fetchone()[0]
+                    if scanned >= SCOPE_SCAN_ROWS:
+                        rows = None  # More to search than the scan covered
+                if rows is not None:
+                    return self._ranked(rows)
+            long_words = [word for word in words if len(word) >= 3]  # Shorter words are below one trigram
+            if self.fts and long_words:
+                sql = f'SELECT {columns} FROM names JOIN entries ON entries.id = names.rowid WHERE names MATCH ?'
+                params = [' '.join('"' + word.replace('"', '""') + '"' for word in long_words)]
+                conditions, like_params = self._name_contains([word for word in words if len(word) < 3])
+            else:
+                sql = f'SELECT {columns} FROM entries WHERE 1'
+                params = []
+                conditions, like_params = self._name_contains(words)
+            params += like_params
+            if scope:
+                conditions.append(scope)
+                params += scope_params
+            # No ORDER BY: sorting every match would defeat the LIMIT on common words
+            sql += ''.join(' AND ' + condition for condition in conditions) + ' LIMIT ?'
+            return self._ranked(conn.execute(sql, params + [limit]).fetchall())
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _ranked(rows):
+        return sorted(rows, key=lambda row: (not row[1], len(os.path.basename(row[0])), row[0]))
+
+    @staticmethod
+    def _name_contains(words):
+        conditions, params = [], []
+        for word in words:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append('%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        return conditions, params
+
+    @staticmethod
+    def _scope(allowed):
+        """SQL condition limiting entries to the allowed paths, using the path index"""
+        if allowed is None:
+            return '', []
+        scopes, params = [], []
+        for path, is_file in allowed.items():
+            if is_file:
+                scopes.append('path = ?')
+                params.append(path)
+            else:
+                # Same prefix rule as is_path_accessible, as a range the path index can walk
+                scopes.append('(path >= ? AND path < ?)')
+                params.extend((path, path + '\U0010ffff'))
+        return '(' + ' OR '.join(scopes) + ')', params
+
+    def count(self):
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        finally:
+            conn.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Socket tuning - TCP options for the listening socket and each connection, in named profiles
+"""
+import socket
+
+# Linux only; elsewhere headers and body are simply written separately
+TCP_CORK = getattr(socket, 'TCP_CORK', None)
+
+
+def _setsockopt(sock, level, option, value):
+    """setsockopt that ignores sockets and platforms without the option; returns whether it applied"""
+    try:
+        sock.setsockopt(level, option, value)
+    except (OSError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def set_nodelay(sock, enabled):
+    return _setsockopt(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if enabled else 0)
+
+
+def set_cork(sock, enabled):
+    if TCP_CORK is None:
+        return False
+    return _setsockopt(sock, socket.IPPROTO_TCP, TCP_CORK, 1 if enabled else 0)
+
+
+class SocketProfile:
+    """A named set of socket options.
+
+    Responses in nodelay_lanes are sent with Nagle's algorithm off, so a
+    small page is never held back waiting for the client to ACK the
+    headers. With cork, the header write is held until the first body
+    bytes join it in the same segment. send_buffer sets SO_SNDBUF on each
+    connection (0 leaves the kernel's autotuning alone; Linux caps it at
+    net.core.wmem_max). backlog is the listen queue length.
+    """
+
+    def __init__(self, name, nodelay_lanes=(), cork=False, send_buffer=0, backlog=5):
+        self.name = name
+        self.nodelay_lanes = tuple(nodelay_lanes)
+        self.cork = cork
+        self.send_buffer = send_buffer
+        self.backlog = backlog
+
+    def with_options(self, **options):
+        """A copy with some options replaced"""
+        unknown = set(options) - set(vars(self))
+        if unknown:
+            raise ValueError(f"Unknown socket options: {', '.join(sorted(unknown))}")
+        return SocketProfile(**{**vars(self), **options})
+
+    def configure_connection(self, sock):
+        if self.send_buffer:
+            _setsockopt(sock, socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+
+
+PROFILES = {
+    # Python's own defaults, as the server ran before profiles existed
+    'default': SocketProfile('default'),
+    # Pages answer without Nagle delays; transfers keep kernel buffer autotuning
+    'balanced': SocketProfile('balanced', nodelay_lanes=('interactive',), cork=True, backlog=128),
+    # Fast wired networks: large send buffers keep a long, fat pipe full
+    'lan': SocketProfile('lan', nodelay_lanes=('interactive', 'bulk'), cork=True,
+                         send_buffer=4 * 1024 * 1024, backlog=256),
+}
+
+
+def get_profile(name, options=None):
+    try:
+        profile = PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown socket profile {name!r}; choose from {', '.join(PROFILES)}") from None
+    return profile.with_options(**options) if options else profile
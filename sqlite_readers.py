@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+SQLite readers - a few read connections shared by request threads
+"""
+import contextlib
+import sqlite3
+import threading
+
+
+class ReadConnections:
+    """Idle read connections to one database, lent to one thread at a time.
+
+    The server starts a thread per request, so a connection kept per
+    thread would be opened again for almost every request. Connections
+    here outlive the threads that borrow them; at most max_idle are kept,
+    extra ones opened under load are closed on return. A borrower must
+    consume its query results before giving the connection back, so no
+    statement is left holding an old read snapshot.
+    """
+
+    def __init__(self, db_path, max_idle=4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._idle)
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        try:
+            yield conn
+        except sqlite3.Error:
+            conn.close()  # Possibly broken; the next borrower opens a fresh one
+            raise
+        else:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
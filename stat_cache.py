@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Stat cache - answer repeated stat() calls for the same paths from memory for a short time
+"""
+import os
+import stat
+import threading
+import time
+
+
+class StatCache:
+    """Short-lived cache of os.stat() results, including misses.
+
+    Results live for `ttl` seconds in a cache shared by all threads, and
+    the watcher can drop them sooner through invalidate(). Between
+    begin_request() and end_request() a thread also keeps its own layer,
+    so one request sees a single consistent answer per path however many
+    handlers ask. Only "doesn't exist" errors are cached; anything else,
+    such as a permission error, is raised and asked again next time.
+    """
+
+    _MISSING = (FileNotFoundError, NotADirectoryError)
+
+    def __init__(self, ttl=1.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # path -> (expires, stat_result or None when missing)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def begin_request(self):
+        self._local.entries = {}
+
+    def end_request(self):
+        self._local.entries = None
+
+    def stat(self, path):
+        """os.stat(path), possibly from cache; raises FileNotFoundError for cached misses"""
+        scoped = getattr(self._local, 'entries', None)
+        if scoped is not None and path in scoped:
+            result = scoped[path]
+        else:
+            result = self._lookup(path)
+            if scoped is not None:
+                scoped[path] = result
+        if result is None:
+            raise FileNotFoundError(2, 'No such file or directory', path)
+        return result
+
+    def _lookup(self, path):
+        if self.ttl > 0:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        try:
+            result = os.stat(path)
+        except self._MISSING:
+            result = None
+        if self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._prune()
+                self._entries[path] = (time.monotonic() + self.ttl, result)
+        return result
+
+    def _prune(self):
+        now = time.monotonic()
+        for path in [path for path, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[path]
+        if len(self._entries) >= self.max_entries:
+            # Still full of live entries: drop the oldest half rather than growing
+            for path in list(self._entries)[:len(self._entries) - self.max_entries // 2]:
+                del self._entries[path]
+
+    def isdir(self, path):
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def isfile(self, path):
+        try:
+            return stat.S_ISREG(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def exists(self, path):
+        try:
+            self.stat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def getsize(self, path):
+        return self.stat(path).st_size
+
+    def invalidate(self, paths, subtrees=()):
+        """Forget the given paths, and everything below the given folders"""
+        with self._lock:
+            for path in paths:
+                self._entries.pop(path, None)
+            prefixes = tuple(path.rstrip('/') + '/' for path in subtrees)
+            if prefixes:
+                for path in [path for path in self._entries if path.startswith(prefixes)]:
+                    del self._entries[path]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Connection deadlines - stop slow or stalled clients from holding request threads
+"""
+import socket
+import threading
+import time
+
+
+class DeadlineReaper:
+    """Shut down the read side of sockets whose deadline has passed.
+
+    Socket timeouts bound a single recv(), so a client trickling one byte at
+    a time can stretch a read forever. A background thread checks armed
+    deadlines and shuts the socket down for reading instead. Blocked reads
+    then see end-of-file, and disarm() tells the owner that this happened.
+    """
+
+    def __init__(self, interval=0.5, on_expire=None):
+        self.interval = interval
+        self.on_expire = on_expire
+        self._armed = {}  # key -> (deadline, socket, phase)
+        self._expired = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='deadline-reaper', daemon=True)
+                self._thread.start()
+        return self
+
+    def arm(self, key, sock, seconds, phase):
+        if not seconds:
+            return
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._armed[key] = (time.monotonic() + seconds, sock, phase)
+
+    def disarm(self, key):
+        """Stop watching key; returns True if its deadline had already expired"""
+        with self._lock:
+            self._armed.pop(key, None)
+            if key in self._expired:
+                self._expired.discard(key)
+                return True
+        return False
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            expired = []
+            with self._lock:
+                for key, (deadline, sock, phase) in list(self._armed.items()):
+                    if now >= deadline:
+                        del self._armed[key]
+                        self._expired.add(key)
+                        expired.append((sock, phase))
+            for sock, phase in expired:
+                try:
+                    sock.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass  # Already closed
+                if self.on_expire:
+                    self.on_expire(phase)
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Tree paths - helpers shared by the background crawlers that walk the shared paths
+"""
+
+
+def subtree_condition(path):
+    """SQL condition and parameters matching path and everything below it"""
+    prefix = path.rstrip('/') + '/'
+    return '(path = ? OR substr(path, 1, ?) = ?)', (path, len(prefix), prefix)
+
+
+def roots_top_level(roots):
+    """{path: is_file} without the roots that sit inside another root folder, so no tree is walked twice"""
+    prefixes = [path.rstrip('/') + '/' for path, is_file in roots.items() if not is_file]
+    return {path: is_file for path, is_file in roots.items()
+            if not any(path.startswith(prefix) and path.rstrip('/') + '/' != prefix for prefix in prefixes)}
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Filesystem change watcher - inotify on Linux with an mtime-polling fallback, feeding in-process
+subscribers and a cursor-based change feed
+"""
+import collections
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+try:
+    from app.tree_paths import roots_top_level
+except ImportError:
+    from tree_paths import roots_top_level
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+class ChangeFeed:
+    """Numbered change events kept in a bounded window for cursor-based readers.
+
+    Cursors carry an epoch so a client holding one from before a restart,
+    or one older than the window, is told to re-list instead of silently
+    missing changes.
+    """
+
+    def __init__(self, capacity=10000):
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self.seq = 0
+        self.events = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def publish(self, changes):
+        """Number (type, path, is_dir) changes and return them as event dicts"""
+        now = time.time()
+        published = []
+        with self._lock:
+            for kind, path, is_dir in changes:
+                self.seq += 1
+                published.append({'seq': self.seq, 'time': now, 'type': kind, 'path': path, 'is_dir': is_dir})
+            self.events.extend(published)
+        return published
+
+    def cursor(self, seq=None):
+        return f'{self.epoch}-{self.seq if seq is None else seq}'
+
+    def since(self, cursor, limit=1000):
+        """Return (events after cursor, next cursor, reset); reset means changes were missed"""
+        epoch, _, seq = cursor.partition('-')
+        with self._lock:
+            latest = self.seq
+            oldest = self.events[0]['seq'] if self.events else latest + 1
+            if epoch != self.epoch or not seq.isdigit() or not oldest - 1 <= int(seq) <= latest:
+                return [], self.cursor(latest), True
+            start = int(seq) - oldest + 1
+            events = list(itertools.islice(self.events, start, start + limit))
+        return events, self.cursor(events[-1]['seq'] if events else int(seq)), False
+
+
+class _Inotify:
+    """Recursive watches through the Linux inotify API, called via ctypes"""
+
+    name = 'inotify'
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is Linux only')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.roots = {}
+        self.paths = {}  # watch descriptor -> path
+        self.watches = {}  # path -> watch descriptor
+
+    def add_tree(self, root, is_file):
+        self.roots[root] = is_file
+        if is_file:
+            self._watch(root)
+        else:
+            self._watch_tree(root, report=False)
+
+    def remove_tree(self, root):
+        self.roots.pop(root, None)
+        self._unwatch_tree(root)
+
+    def _watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, 'inotify watch limit reached (fs.inotify.max_user_watches)')
+            return False  # Vanished or unreadable
+        self.paths[wd] = path
+        self.watches[path] = wd
+        return True
+
+    def _watch_tree(self, root, report=True):
+        """Watch root and every folder below it; returns what was already inside when report is set"""
+        found = []
+        if not self._watch(root):
+            return found
+        for folder, dirs, files in os.walk(root):
+            for name in dirs:
+                path = os.path.join(folder, name)
+                self._watch(path)
+                if report:
+                    found.append(('created', path, True))
+            if report:
+                found.extend(('created', os.path.join(folder, name), False) for name in files)
+        return found
+
+    def _unwatch_tree(self, root):
+        prefix = root.rstrip('/') + '/'
+        for path in [path for path in self.watches if path == root or path.startswith(prefix)]:
+            wd = self.watches.pop(path)
+            self.paths.pop(wd, None)
+            self._rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        changes = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; subscribers must rescan everything
+                changes.extend(('rescan', root, not is_file) for root, is_file in self.roots.items())
+                continue
+            watched = self.paths.get(wd)
+            if watched is None:
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                if self.watches.get(watched) == wd:
+                    del self.watches[watched]
+                continue
+            path = os.path.join(watched, os.fsdecode(name)) if name else watched
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                changes.append(('created', path, is_dir))
+                if is_dir:
+                    # Anything created before the new watch was in place
+                    changes.extend(self._watch_tree(path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.append(('deleted', path, is_dir))
+                if is_dir:
+                    self._unwatch_tree(path)
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                changes.append(('modified', path, False))
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF) and watched in self.roots:
+                changes.append(('deleted', watched, not self.roots[watched]))
+        return changes
+
+
+class _Poller:
+    """Fallback that snapshots size and mtime of every entry and compares each interval"""
+
+    name = 'polling'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.roots = {}
+        self.snapshots = {}
+        self._next_scan = time.monotonic() + interval
+
+    def add_tree(self, root, is_file):
+        self.roots[root] = is_file
+        self.snapshots[root] = self._snapshot(root)
+
+    def remove_tree(self, root):
+        self.roots.pop(root, None)
+        self.snapshots.pop(root, None)
+
+    @staticmethod
+    def _snapshot(root):
+        entries = {}
+        try:
+            st = os.stat(root)
+        except OSError:
+            return entries
+        pending = [root] if os.path.isdir(root) else []
+        if not pending:
+            entries[root] = (False, st.st_size, st.st_mtime_ns)
+        while pending:
+            try:
+                scan = list(os.scandir(pending.pop()))
+            except OSError:
+                continue
+            for entry in scan:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                entries[entry.path] = (is_dir, 0 if is_dir else st.st_size, 0 if is_dir else st.st_mtime_ns)
+                if is_dir:
+                    pending.append(entry.path)
+        return entries
+
+    def read(self, timeout):
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self.interval
+        changes = []
+        for root in list(self.roots):
+            old, new = self.snapshots.get(root, {}), self._snapshot(root)
+            self.snapshots[root] = new
+            changes.extend(('deleted', path, old[path][0]) for path in old.keys() - new.keys())
+            for path, state in new.items():
+                if path not in old:
+                    changes.append(('created', path, state[0]))
+                elif state != old[path]:
+                    changes.append(('modified', path, state[0]))
+        return changes
+
+
+class FileWatcher:
+    """Watch the shared paths and publish batches of changes.
+
+    Changes are collected for `debounce` seconds, de-duplicated, numbered in
+    the feed and handed to each subscriber as a list of event dicts. The
+    set of roots is re-read every `interval` seconds or after refresh().
+    """
+
+    def __init__(self, roots, interval=5.0, debounce=0.5, capacity=10000, on_fallback=None):
+        self.roots = roots  # Callable returning {path: is_file}
+        self.interval = interval
+        self.debounce = debounce
+        self.on_fallback = on_fallback
+        self.feed = ChangeFeed(capacity)
+        self.subscribers = []
+        self.backend = None
+        self._watched = {}
+        self._resync = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+                self._thread.start()
+        return self
+
+    def refresh(self):
+        """Pick up added or removed roots now"""
+        self._resync.set()
+
+    def _fall_back(self, error):
+        if isinstance(self.backend, _Inotify):
+            os.close(self.backend.fd)
+        self.backend = _Poller(self.interval)
+        self._watched = {}
+        if self.on_fallback:
+            self.on_fallback(str(error))
+
+    def _sync_roots(self):
+        roots = roots_top_level(self.roots())
+        for root in list(self._watched):
+            if root not in roots:
+                self.backend.remove_tree(root)
+                del self._watched[root]
+        for root, is_file in roots.items():
+            if root not in self._watched:
+                try:
+                    self.backend.add_tree(root, is_file)
+                except OSError as e:
+                    self._fall_back(e)  # Out of inotify watches; poll every root instead
+                    return self._sync_roots()
+                self._watched[root] = is_file
+
+    def _run(self):
+        try:
+            self.backend = _Inotify()
+        except (OSError, AttributeError) as e:
+            self._fall_back(e)
+        batch = []
+        batch_started = next_sync = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= next_sync or self._resync.is_set():
+                self._resync.clear()
+                try:
+                    self._sync_roots()
+                except OSError:
+                    pass  # Roots unavailable; try again next interval
+                next_sync = now + self.interval
+            timeout = max(0.0, batch_started + self.debounce - now) if batch else 1.0
+            try:
+                changes = self.backend.read(timeout)
+            except OSError as e:
+                self._fall_back(e)  # Watch limit hit while following a new folder
+                self._resync.set()
+                continue
+            if changes and not batch:
+                batch_started = time.monotonic()
+            batch.extend(changes)
+            if batch and time.monotonic() >= batch_started + self.debounce:
+                self._publish(batch)
+                batch = []
+
+    def _publish(self, batch):
+        # Repeats of the same change collapse; the order of different changes is kept
+        events = self.feed.publish(dict.fromkeys(batch))
+        for callback in self.subscribers:
+            try:
+                callback(events)
+            except Exception:
+                pass  # One broken subscriber must not stop the others or the watcher
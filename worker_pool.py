@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Worker pools - long-lived process pools that don't hold on to the server's sockets and files
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import signal
+import stat
+import threading
+import time
+
+PARENT_POLL_SECONDS = 1.0
+
+
+def release_inherited_fds():
+    """Point inherited sockets, files and other handles at /dev/null.
+
+    A worker forked from the running server would otherwise keep its
+    listening and client sockets, cached media fds, the inotify fd and
+    the access log open for as long as it lives. dup2 keeps each number
+    taken, so an inherited object closing "its" fd later can never hit
+    one the worker opened since. Pipes, which carry the pool's own
+    queues, and character devices are left alone.
+    """
+    for listing in ('/proc/self/fd', '/dev/fd'):
+        try:
+            fds = [int(name) for name in os.listdir(listing)]
+            break
+        except OSError:
+            continue
+    else:
+        return  # Nothing cheap to enumerate (Windows); spawned workers inherit nothing anyway
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        for fd in fds:
+            if fd <= 2 or fd == devnull:
+                continue
+            try:
+                mode = os.fstat(fd).st_mode
+            except OSError:
+                continue  # The directory fd used for the listing, closed since
+            if stat.S_ISFIFO(mode) or stat.S_ISCHR(mode):
+                continue
+            os.dup2(devnull, fd)
+    finally:
+        os.close(devnull)
+
+
+def _exit_with_parent(parent):
+    """Worker thread: end the worker once the server that forked it is gone.
+
+    A killed server never shuts its pools down, and its orphaned workers
+    would otherwise wait on their call queue forever. Polling getppid()
+    works everywhere, unlike PR_SET_PDEATHSIG, which fires when the
+    forking thread exits rather than the process.
+    """
+    while os.getppid() == parent:
+        time.sleep(PARENT_POLL_SECONDS)
+    os._exit(0)
+
+
+def init_worker():
+    """Pool initializer: detach a worker from the server's signals, lifetime and fds.
+
+    Ctrl+C reaches the whole process group; the server shuts its pools
+    down itself, so workers ignore SIGINT instead of each printing a
+    KeyboardInterrupt traceback.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    release_inherited_fds()
+    threading.Thread(target=_exit_with_parent, args=(os.getppid(),), name='parent-watch', daemon=True).start()
+
+
+class WorkerPool:
+    """A ProcessPoolExecutor created on first use and replaced if a worker dies.
+
+    Workers are forked where the platform allows it, since spawned ones
+    would re-import the server's main module. A fork pool forks all its
+    workers on the first submit, so start() forks them up front, and
+    init_worker() gives each a clean fd table whatever the server had
+    open at the time. The owner calls shutdown() when the server stops;
+    workers of a server that was killed exit on their own.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Fork the workers now; returns once they are running"""
+        self.get().submit(os.getpid).result()
+
+    def get(self):
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                self._pool = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context,
+                                                                    initializer=init_worker)
+            return self._pool
+
+    def discard(self, pool):
+        """Shut down a pool found broken; the next get() creates a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)